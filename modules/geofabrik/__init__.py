@@ -2,7 +2,17 @@ from .file_downloader import FileDownloader
 from .link_extractor import LinkExtractor
 from .page_fetcher import PageFetcher
 from .date_extractor import DateExtractor
+from .geofabrik_page import GeofabrikPage
+from .replication import ReplicationUpdater
+from .catalog import GeofabrikCatalog
+from modules.osmtools.osm_convert import OSMConvert
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from typing import Optional
+import subprocess
+import requests
 import json
+import time
 import os
 
 class ProtobufDownloader:
@@ -14,8 +24,13 @@ class ProtobufDownloader:
         path_folder (str): The directory path where the downloaded file will be saved.
         path_file (str): The full path of the downloaded file.
         fetcher (PageFetcher): An instance of PageFetcher to fetch HTML content.
+        cache_dir (str or None): Directory of the conditional-GET page cache, None if disabled.
         extractor (LinkExtractor): An instance of LinkExtractor to extract download links.
         downloader (FileDownloader): An instance of FileDownloader to handle file downloads.
+        catalog (GeofabrikCatalog or None): Resolves the region without scraping HTML when given.
+        region (dict or None): The catalog entry of `country`, used as Geofabrik region id.
+        updater (ReplicationUpdater or None): Applies replication diffs when `update_mode` is on.
+        status (str): Outcome of the last run: "downloaded", "updated", "up-to-date" or "failed".
     """
     def __init__(self,
             url: str        = "https://download.geofabrik.de/south-america/brazil.html",
@@ -23,7 +38,13 @@ class ProtobufDownloader:
             path_data: str  = "data",
             path_output: str= "external",
             path_module: str= "pbf",
-            timeout: int    = 10
+            timeout: int    = 10,
+            fetcher: Optional[PageFetcher]      = None,
+            downloader: Optional[FileDownloader]= None,
+            update_mode: bool                   = False,
+            updates_url: Optional[str]          = None,
+            use_cache: bool                     = True,
+            catalog: Optional[GeofabrikCatalog] = None
         ):
         self.url            = url
         self.country        = country
@@ -31,10 +52,30 @@ class ProtobufDownloader:
         os.makedirs(self.path_folder, exist_ok=True)
         self.path_file      = os.path.join(self.path_folder, f"{country}-latest.osm.pbf")
 
-        self.fetcher        = PageFetcher()
+        self.cache_dir      = os.path.join(path_data, "interim", "http_cache") if use_cache else None
+        self.fetcher        = fetcher or PageFetcher(cache_dir=self.cache_dir)
         self.dtextract      = DateExtractor()
         self.extractor      = LinkExtractor(self.country)
-        self.downloader     = FileDownloader(timeout=timeout)
+        self.downloader     = downloader or FileDownloader(timeout=timeout, session=self.fetcher.session)
+        self.status         = ""
+
+        # COM O INDICE GEOFABRIK, URLS VEM DO CATALOGO E NAO DA PAGINA HTML
+        self.catalog        = catalog
+        self.region         = catalog.resolve(country) if catalog is not None else None
+        if updates_url is None and self.region is not None:
+            updates_url     = self.region["updates"]
+
+        # MODO DE ATUALIZACAO POR DIFFS: brazil.html -> brazil-updates
+        if updates_url is None and url.endswith(".html"):
+            updates_url     = url[:-len(".html")] + "-updates"
+        self.updater        = None
+        if update_mode and updates_url:
+            self.updater    = ReplicationUpdater(
+                updates_url,
+                self.path_file,
+                session=self.fetcher.session,
+                timeout=timeout
+            )
 
     def run(self) -> None:
         """
@@ -42,11 +83,21 @@ class ProtobufDownloader:
         downloading the file, and saving it to the specified path.
 
         This method performs the following steps:
-        1. Fetches the HTML content from the specified URL using the fetcher.
+        1. Fetches the HTML content from the specified URL using the fetcher. When the
+           file was already downloaded and the page answers 304 Not Modified, the run
+           stops here without parsing any HTML.
         2. Extracts the download URL from the HTML content using the extractor.
-        3. Downloads the file from the extracted URL using the downloader.
+        3. Downloads the file from the extracted URL using the downloader, resuming a
+           previously interrupted transfer and checking it against the published `.md5`.
         4. Saves the downloaded file to the specified file path.
 
+        With a catalog, steps 1 and 2 are replaced by the catalog URLs and the change check
+        uses the published `.md5` instead of the page timestamp.
+
+        In update mode the local extract is first brought up to date with the replication
+        diffs; the steps above only run, as a forced full download, when the diff chain
+        is broken.
+
         Prints a confirmation message upon successful download and save.
 
         Returns:
@@ -54,23 +105,272 @@ class ProtobufDownloader:
         """
         date_save               = ""
         name_data               = f"{os.path.basename(self.path_file)}.json"
-        if os.path.exists(self.path_file):
+        if self.updater is not None:
+            self.status         = self.updater.update() or ""
+            if self.status:
+                print(f"Arquivo atualizado por diffs ({self.status}): {self.path_file}")
+                return self.path_file
+            print(f"Cadeia de diffs indisponível, baixando arquivo completo: {self.path_file}")
+        elif os.path.exists(self.path_file):
             if os.path.exists(name_data):
                 with open(name_data, "r", encoding="utf-8") as file:
                     date_save   = json.load(file)
-        html_content            = self.fetcher.fetch(self.url)
-        date_now                = self.dtextract.extract(html_content)
-        if date_now != date_save:
+        latest                  = self._latest(conditional=bool(date_save))
+        if latest is None:
+            self.status         = "up-to-date"
+            print(f"Página sem alterações, arquivo já existe: {self.path_file}")
+            return self.path_file
+        date_now, download_url, expected_md5 = latest
+        if not date_now or date_now != date_save:
             print(f"Baixando arquivo: {self.path_file}")
-            download_url = self.extractor.extract(html_content, self.url)
-            status, path = self.downloader.download(download_url, self.path_file)
+            try:
+                replication_state = self.updater.latest_state() if self.updater is not None else None
+                status, path = self.downloader.download(
+                    download_url,
+                    self.path_file,
+                    md5_url=f"{download_url}.md5",
+                    expected_md5=expected_md5
+                )
+            except Exception:
+                # SEM ISSO O PROXIMO 304 ESCONDERIA O DOWNLOAD QUE FALHOU
+                self.fetcher.invalidate(self.url)
+                raise
             if status:
                 with open(name_data, "w", encoding="utf-8") as file:
                     json.dump(date_now, file, ensure_ascii=False, indent=4)
+                if self.updater is not None:
+                    self.updater.record_state(replication_state)
+                self.status = "downloaded"
                 print(f"Download concluído e salvo como {self.path_file}")
             else:
+                self.status = "failed"
+                self.fetcher.invalidate(self.url)
                 print(f"Erro ao baixar o arquivo: {self.path_file}")
             return path if status else None
         else:
+            self.status = "up-to-date"
             print(f"Arquivo já existe: {self.path_file}")
             return self.path_file
+
+    def _latest(self, conditional: bool = False) -> Optional[tuple]:
+        """
+        Resolves the current version and download URL of the extract.
+
+        Args:
+            conditional (bool): Use a conditional GET for the region page.
+
+        Returns:
+            tuple or None: (version, download URL, expected MD5 or None), where the version is
+            the page timestamp, or the published MD5 when a catalog is used. None when the
+            page answered 304 Not Modified.
+        """
+        if self.region is not None:
+            # A VERSAO DO ARQUIVO E O MD5 PUBLICADO, SEM NENHUMA PAGINA HTML
+            md5 = self.downloader.fetch_md5(self.region["md5"])
+            return md5 or "", self.region["pbf"], md5
+
+        if conditional:
+            html_content = self.fetcher.fetch_if_modified(self.url)
+            if html_content is None:
+                return None
+        else:
+            html_content = self.fetcher.fetch(self.url)
+        try:
+            page = GeofabrikPage(html_content, self.url)
+            return self.dtextract.extract(page), self.extractor.extract(page, self.url), None
+        except ValueError:
+            self.fetcher.invalidate(self.url)
+            raise
+
+    def run_stream(self, converter: OSMConvert, keep_pbf: bool = False) -> Optional[str]:
+        """
+        Downloads the extract straight into osmconvert, overlapping transfer and conversion.
+
+        The bytes are piped into `converter` as they arrive, so its output (e.g. the .o5m)
+        is written while the transfer is in progress and the PBF is never written to and
+        read back from disk. The published `.md5` is still checked; on a mismatch the
+        partial output is removed.
+
+        The version of the converted extract is saved next to the output (`<output>.json`);
+        while it matches the published one the stream is skipped, like `run` skips a
+        download that is up to date.
+
+        Args:
+            converter (OSMConvert): The configured converter (flags, output type).
+            keep_pbf (bool): Also save the raw PBF to `path_file`, as `run` would.
+
+        Returns:
+            str or None: The path of the converted file, or None if the stream failed.
+        """
+        date_now, download_url, expected_md5 = self._latest()
+        path_output = converter.output_path(os.path.basename(self.path_file))
+        path_stamp  = f"{path_output}.json"
+        if date_now and os.path.exists(path_output) and os.path.exists(path_stamp):
+            with open(path_stamp, "r", encoding="utf-8") as file:
+                if json.load(file) == date_now:
+                    self.status = "up-to-date"
+                    print(f"Arquivo já convertido na versão atual: {path_output}")
+                    return path_output
+        print(f"Baixando e convertendo em fluxo: {download_url}")
+        chunks = self.downloader.iter_download(
+            download_url,
+            md5_url=f"{download_url}.md5",
+            expected_md5=expected_md5,
+            tee_path=self.path_file if keep_pbf else None
+        )
+        try:
+            converter.run_stream(chunks, os.path.basename(self.path_file))
+        except (requests.exceptions.RequestException, ValueError, subprocess.CalledProcessError,
+                subprocess.TimeoutExpired) as e:
+            self.status = "failed"
+            self.fetcher.invalidate(self.url)
+            print(f"Erro ao baixar e converter o arquivo: {e}")
+            return None
+
+        if keep_pbf and date_now:
+            name_data = f"{os.path.basename(self.path_file)}.json"
+            with open(name_data, "w", encoding="utf-8") as file:
+                json.dump(date_now, file, ensure_ascii=False, indent=4)
+        if date_now:
+            with open(path_stamp, "w", encoding="utf-8") as file:
+                json.dump(date_now, file, ensure_ascii=False, indent=4)
+        self.status = "downloaded"
+        print(f"Conversão concluída e salva como {path_output}")
+        return path_output
+
+
+class MultiProtobufDownloader:
+    """
+    Downloads the Protobuf (.osm.pbf) extracts of several Geofabrik regions concurrently.
+
+    Every region is handled by its own ProtobufDownloader, but all of them share a single
+    PageFetcher (and therefore one pooled HTTP session) for the pages and the downloads.
+    The number of regions processed at the same time, the size of the connection pool and
+    the aggregate bandwidth are capped, so N regions take roughly as long as the largest
+    one instead of the sum of all of them.
+    Attributes:
+        regions (list[tuple[str, str]]): Pairs of (Geofabrik region page URL, country name).
+        max_workers (int): Maximum number of regions processed at the same time.
+        max_connections (int): Size of the HTTP connection pool shared by all regions; it also
+            caps `max_workers`, since every running download holds one connection.
+        max_bandwidth (int): Aggregate transfer cap in bytes per second; <= 0 disables it.
+        update_mode (bool): Refresh existing extracts from replication diffs when possible.
+        catalog (GeofabrikCatalog or None): Shared region index; the countries are then
+            Geofabrik region ids and the URLs of the pairs are ignored.
+        fetcher (PageFetcher): Shared PageFetcher used by every region.
+        downloaders (dict[str, ProtobufDownloader]): One downloader per country.
+        report (dict[str, dict]): Per-region status of the last run.
+    Example:
+        multi = MultiProtobufDownloader([
+            ("https://download.geofabrik.de/south-america/brazil.html", "brazil"),
+            ("https://download.geofabrik.de/south-america/paraguay.html", "paraguay"),
+        ], max_workers=2)
+        report = multi.run()
+    """
+    def __init__(self,
+            regions: list[tuple[str, str]],
+            max_workers: int    = 4,
+            max_connections: int= 8,
+            max_bandwidth: int  = -1,
+            path_data: str      = "data",
+            path_output: str    = "external",
+            path_module: str    = "pbf",
+            timeout: int        = 10,
+            update_mode: bool   = False,
+            catalog: Optional[GeofabrikCatalog] = None
+        ):
+        if not regions:
+            raise ValueError("regions must contain at least one (url, country) pair")
+        countries = [country for _, country in regions]
+        if len(set(countries)) != len(countries):
+            raise ValueError("regions must not repeat a country")
+
+        self.regions        = list(regions)
+        self.max_connections= max(1, max_connections)
+        self.max_workers    = max(1, min(max_workers, len(self.regions), self.max_connections))
+        self.max_bandwidth  = max_bandwidth
+        self.update_mode    = update_mode
+        self.report         = {}
+
+        # UMA SESSAO COMPARTILHADA, COM POOL DIMENSIONADO PARA OS WORKERS
+        session             = requests.Session()
+        adapter             = HTTPAdapter(pool_maxsize=self.max_connections)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        self.fetcher        = PageFetcher(
+            session=session,
+            cache_dir=os.path.join(path_data, "interim", "http_cache")
+        )
+
+        # DIVIDE A BANDA IGUALMENTE ENTRE OS DOWNLOADS SIMULTANEOS
+        speed_limit         = self.max_bandwidth // self.max_workers if self.max_bandwidth > 0 else -1
+
+        self.downloaders    = {
+            country: ProtobufDownloader(
+                url=url,
+                country=country,
+                path_data=path_data,
+                path_output=path_output,
+                path_module=path_module,
+                timeout=timeout,
+                fetcher=self.fetcher,
+                downloader=FileDownloader(
+                    timeout=timeout,
+                    speed_limit=speed_limit,
+                    session=session
+                ),
+                update_mode=self.update_mode,
+                catalog=catalog
+            )
+            for url, country in self.regions
+        }
+
+    def _run_region(self, country: str) -> dict:
+        """
+        Runs the download of a single region and summarises its outcome.
+
+        Args:
+            country (str): The country whose downloader should run.
+
+        Returns:
+            dict: The region status with the keys "status", "path", "error" and "elapsed".
+        """
+        downloader  = self.downloaders[country]
+        t_start     = time.time()
+        try:
+            path    = downloader.run()
+            error   = None if path else f"Erro ao baixar o arquivo: {downloader.path_file}"
+            status  = downloader.status
+        except Exception as e:
+            path, error, status = None, str(e), "failed"
+        return {
+            "url": downloader.url,
+            "status": status,
+            "path": path,
+            "error": error,
+            "elapsed": time.time() - t_start,
+        }
+
+    def run(self) -> dict[str, dict]:
+        """
+        Downloads every region concurrently and reports the outcome of each one.
+
+        A failing region never aborts the others; its error is recorded in the report.
+
+        Returns:
+            dict[str, dict]: The status of each region keyed by country, as produced by
+            `_run_region`, in the same order the regions were given.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._run_region, country): country
+                for country in self.downloaders
+            }
+            for future in as_completed(futures):
+                country             = futures[future]
+                results[country]    = future.result()
+                print(f"[{country}] {results[country]['status']} em {results[country]['elapsed']:.1f}s")
+
+        self.report = {country: results[country] for country in self.downloaders}
+        return self.report
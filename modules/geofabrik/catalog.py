@@ -0,0 +1,176 @@
+from typing import Optional
+import requests
+import time
+import json
+import os
+
+class GeofabrikCatalog:
+    """
+    This module provides the `GeofabrikCatalog` class, which resolves Geofabrik regions
+    through the machine-readable index (`index-v1.json`) instead of scraping HTML pages.
+    Classes:
+        GeofabrikCatalog: Downloads the region index once, caches it locally with a TTL and
+        resolves region ids to their download URLs and polygons in constant time.
+    Dependencies:
+        - requests: Used to download the index.
+    Attributes:
+        url (str): The URL of the Geofabrik index.
+        cache_path (str): Local copy of the index.
+        ttl (int): Maximum age in seconds of the local copy before it is downloaded again.
+        regions (dict[str, dict]): The index keyed by region id, e.g. "brazil" or "sao-paulo".
+    Exceptions:
+        - KeyError: Raised when a region id is not in the index.
+    Example:
+        catalog = GeofabrikCatalog()
+        region = catalog.resolve("brazil")
+        region["pbf"], region["md5"], region["updates"]
+        catalog.write_poly("brazil", "data/interim/poly/brazil.poly")
+    """
+    def __init__(self,
+            url: str                            = "https://download.geofabrik.de/index-v1.json",
+            cache_path: str                     = os.path.join("data", "interim", "geofabrik", "index-v1.json"),
+            ttl: int                            = 24 * 60 * 60,
+            timeout: int                        = 60,
+            session: Optional[requests.Session] = None
+        ):
+        self.url        = url
+        self.cache_path = cache_path
+        self.ttl        = ttl
+        self.timeout    = timeout
+        self.session    = session or requests.Session()
+        self._regions: Optional[dict] = None
+
+    def _is_fresh(self) -> bool:
+        if not os.path.exists(self.cache_path):
+            return False
+        return time.time() - os.path.getmtime(self.cache_path) < self.ttl
+
+    def _download(self) -> None:
+        response = self.session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        path_tmp = f"{self.cache_path}.tmp"
+        with open(path_tmp, "wb") as file:
+            file.write(response.content)
+        os.replace(path_tmp, self.cache_path)
+
+    def load(self, force: bool = False) -> dict:
+        """
+        Loads the index, downloading it when the local copy is missing or expired.
+
+        When the download fails but an expired copy exists, the expired copy is used.
+
+        Args:
+            force (bool): Download the index even if the local copy is still fresh.
+
+        Returns:
+            dict: The regions keyed by id.
+
+        Raises:
+            requests.exceptions.RequestException: If the index cannot be downloaded and
+            there is no local copy.
+        """
+        if force or not self._is_fresh():
+            try:
+                self._download()
+            except requests.exceptions.RequestException as e:
+                if not os.path.exists(self.cache_path):
+                    raise
+                print(f"Índice Geofabrik indisponível, usando cópia local: {e}")
+
+        with open(self.cache_path, "r", encoding="utf-8") as file:
+            index = json.load(file)
+
+        regions = {}
+        for feature in index.get("features", []):
+            properties  = feature.get("properties", {})
+            urls        = properties.get("urls", {})
+            pbf         = urls.get("pbf")
+            regions[properties["id"]] = {
+                "id": properties["id"],
+                "name": properties.get("name", properties["id"]),
+                "parent": properties.get("parent"),
+                "pbf": pbf,
+                "md5": f"{pbf}.md5" if pbf else None,
+                "updates": urls.get("updates"),
+                "geometry": feature.get("geometry"),
+            }
+        self._regions = regions
+        return regions
+
+    @property
+    def regions(self) -> dict:
+        if self._regions is None:
+            self.load()
+        return self._regions
+
+    def resolve(self, region_id: str) -> dict:
+        """
+        Return the URLs of a region.
+
+        Args:
+            region_id (str): The Geofabrik region id, e.g. "brazil" or "centro-oeste".
+
+        Returns:
+            dict: The keys "id", "name", "parent", "pbf", "md5" and "updates".
+
+        Raises:
+            KeyError: If the region is not in the index.
+        """
+        region = self.regions.get(region_id)
+        if region is None:
+            raise KeyError(f"Region not found in the Geofabrik index: {region_id}")
+        return {key: value for key, value in region.items() if key != "geometry"}
+
+    def polygon(self, region_id: str) -> Optional[dict]:
+        """
+        Return the boundary of a region as a GeoJSON geometry (Polygon or MultiPolygon).
+
+        Args:
+            region_id (str): The Geofabrik region id.
+
+        Returns:
+            dict or None: The geometry, or None if the index has no geometry for the region
+            (e.g. when the "nogeom" index is used).
+
+        Raises:
+            KeyError: If the region is not in the index.
+        """
+        if region_id not in self.regions:
+            raise KeyError(f"Region not found in the Geofabrik index: {region_id}")
+        return self.regions[region_id]["geometry"]
+
+    def write_poly(self, region_id: str, path: str) -> str:
+        """
+        Writes the boundary of a region in the Osmosis `.poly` format used by osmconvert `-B=`.
+
+        Args:
+            region_id (str): The Geofabrik region id.
+            path (str): The output `.poly` file.
+
+        Returns:
+            str: The path of the written file.
+
+        Raises:
+            KeyError: If the region is not in the index.
+            ValueError: If the region has no polygon.
+        """
+        geometry = self.polygon(region_id)
+        if not geometry or geometry.get("type") not in ("Polygon", "MultiPolygon"):
+            raise ValueError(f"Region has no polygon in the Geofabrik index: {region_id}")
+        polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+
+        lines, section = [region_id], 0
+        for rings in polygons:
+            for position, ring in enumerate(rings):
+                section += 1
+                # O PRIMEIRO ANEL E O CONTORNO, OS DEMAIS SAO BURACOS ("!")
+                lines.append(f"{'!' if position else ''}{section}")
+                lines.extend(f"   {lon:.7f}   {lat:.7f}" for lon, lat, *_ in ring)
+                lines.append("END")
+        lines.append("END")
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        return path
@@ -1,7 +1,5 @@
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-import re
-from typing import Any
+from .geofabrik_page import GeofabrikPage
+from typing import Union
 
 class DateExtractor:
     """
@@ -11,36 +9,26 @@ class DateExtractor:
         LinkExtractor: A class that extracts a specific download link for a given country
         from an HTML page.
     Dependencies:
-        - BeautifulSoup from bs4: Used for parsing HTML content.
-        - re: Used for regular expression matching.
-        - urljoin from urllib.parse: Used to construct absolute URLs from relative links.
+        - GeofabrikPage: The single-pass parsed page shared by both extractors.
     Exceptions:
         - ValueError: Raised when no matching download link is found in the HTML content.
     """
     def __init__(self) -> None:
         pass
 
-    def extract(self, html: str) -> str:
+    def extract(self, html: Union[str, GeofabrikPage]) -> str:
         """
         Extracts a date in the specified ISO 8601 format (YYYY-MM-DDTHH:MM:SSZ) from the given HTML content.
         Args:
-            html (str): The HTML content as a string.
+            html (str or GeofabrikPage): The HTML content as a string, or the page already parsed.
         Returns:
             str: The extracted date in ISO 8601 format.
         Raises:
             ValueError: If no date in the specified format is found in the HTML content.
         """
-        
-        soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
 
-        # Extract all text from the HTML
-        text_content = soup.get_text()
-
-        # Search for the date in the specified format
-        date_pattern = r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z"
-        match = re.search(date_pattern, text_content)
-
-        if not match:
+        page = html if isinstance(html, GeofabrikPage) else GeofabrikPage(html)
+        if page.date is None:
             raise ValueError("No date in the specified format found in the HTML content.")
 
-        return match.group(0)
+        return page.date
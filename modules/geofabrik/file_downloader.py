@@ -1,40 +1,323 @@
-from pySmartDL import SmartDL
+from typing import Iterator, Optional
+import requests
+import hashlib
+import json
+import time
+import os
+import re
 
 class FileDownloader:
     """
-    This module provides the `FileDownloader` class, which facilitates downloading 
-    files from a given URL to a specified local path using the SmartDL library.
+    This module provides the `FileDownloader` class, which facilitates downloading
+    files from a given URL to a specified local path using a streamed HTTP transfer.
     Classes:
-        FileDownloader: A class for downloading files with a configurable timeout.
+        FileDownloader: A class for resumable, integrity-checked downloads.
     Dependencies:
-        - SmartDL: Ensure the `pySmartDL` library is installed to use this module.
+        - requests: Used to stream the file content over HTTP.
+    Attributes:
+        timeout (int): Connection timeout in seconds.
+        speed_limit (int): Transfer cap in bytes per second; values <= 0 disable the cap.
+        retries (int): How many times an interrupted transfer is resumed before giving up.
+        chunk_size (int): Size in bytes of each chunk read from the response.
+        checkpoint_every (int): How many bytes are written between two checkpoints.
+        session (requests.Session): The HTTP session used for every request.
+    Notes:
+        The bytes are written to `<download_path>.part` and a checkpoint with the
+        number of bytes safely flushed to disk is kept in `<download_path>.part.json`.
+        An interrupted download resumes from the checkpoint with an HTTP Range request,
+        as long as the server still reports the same ETag/Last-Modified. The MD5 digest
+        is updated while the bytes stream in, so the file is never read back to be hashed;
+        only the already downloaded prefix is re-hashed when a previous run is resumed.
     Example:
         downloader = FileDownloader(timeout=15)
         downloader.download("https://example.com/file.zip", "/path/to/save/file.zip")
     """
-    def __init__(self, timeout: int = 10):
-        self.timeout = timeout
+    def __init__(self,
+            timeout: int            = 10,
+            speed_limit: int        = -1,
+            retries: int            = 3,
+            chunk_size: int         = 1024 * 1024,
+            checkpoint_every: int   = 64 * 1024 * 1024,
+            session: Optional[requests.Session] = None
+        ):
+        self.timeout            = timeout
+        self.speed_limit        = speed_limit
+        self.retries            = max(0, retries)
+        self.chunk_size         = chunk_size
+        self.checkpoint_every   = checkpoint_every
+        self.session            = session or requests.Session()
 
-    def download(self, url: str, download_path: str) -> str:
+    def fetch_md5(self, md5_url: str) -> Optional[str]:
+        """
+        Fetches the MD5 checksum published next to a file (e.g. Geofabrik's `.md5` files).
+
+        Args:
+            md5_url (str): The URL of the checksum file, in the `md5sum` output format.
+
+        Returns:
+            str or None: The lowercase hex digest, or None if the checksum is not available.
+        """
+        try:
+            response = self.session.get(md5_url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"MD5 indisponível em {md5_url}: {e}")
+            return None
+        fields = response.text.split()
+        return fields[0].lower() if fields else None
+
+    @staticmethod
+    def _load_checkpoint(path_checkpoint: str) -> dict:
+        if not os.path.exists(path_checkpoint):
+            return {}
+        try:
+            with open(path_checkpoint, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_checkpoint(path_checkpoint: str, checkpoint: dict) -> None:
+        path_tmp = f"{path_checkpoint}.tmp"
+        with open(path_tmp, "w", encoding="utf-8") as file:
+            json.dump(checkpoint, file, ensure_ascii=False, indent=4)
+        os.replace(path_tmp, path_checkpoint)
+
+    def _resume_state(self, url: str, path_part: str, path_checkpoint: str) -> dict:
+        """
+        Restores the offset, validators and hash of a previous interrupted transfer.
+
+        Returns:
+            dict: The transfer state with the keys "offset", "checkpoint" and "md5",
+            where "md5" already covers the first "offset" bytes of the `.part` file.
+        """
+        state       = {"offset": 0, "checkpoint": {}, "md5": hashlib.md5()}
+        checkpoint  = self._load_checkpoint(path_checkpoint)
+        offset      = checkpoint.get("offset", 0) if checkpoint.get("url") == url else 0
+        if offset <= 0 or not os.path.exists(path_part) or os.path.getsize(path_part) < offset:
+            return state
+
+        # DESCARTA O QUE FOI ESCRITO APOS O ULTIMO CHECKPOINT E RECALCULA O HASH DO PREFIXO
+        with open(path_part, "r+b") as file:
+            file.truncate(offset)
+            for chunk in iter(lambda: file.read(self.chunk_size), b""):
+                state["md5"].update(chunk)
+        state["offset"], state["checkpoint"] = offset, checkpoint
+        return state
+
+    @staticmethod
+    def _part_complete(response: requests.Response, state: dict, expected_md5: Optional[str]) -> bool:
+        """
+        Tells whether the `.part` file answered with HTTP 416 already holds the whole file.
+
+        The server refuses a Range that starts at the end of the file, which happens when a
+        previous run flushed the last byte but stopped before moving the file into place.
+        The part counts as complete only if its size matches the total in `Content-Range`
+        (or the size recorded in the checkpoint), the validators still match and, when
+        known, its MD5 matches the expected one.
+        """
+        checkpoint  = state["checkpoint"]
+        match       = re.match(r"bytes \*/(\d+)$", response.headers.get("Content-Range", ""))
+        total       = int(match.group(1)) if match else checkpoint.get("size")
+        if total is None or state["offset"] != total:
+            return False
+        for header, key in (("ETag", "etag"), ("Last-Modified", "last_modified")):
+            if response.headers.get(header) and checkpoint.get(key) and response.headers[header] != checkpoint[key]:
+                return False
+        return not expected_md5 or state["md5"].hexdigest() == expected_md5
+
+    def _throttle(self, t_start: float, received: int) -> None:
+        if self.speed_limit > 0:
+            delay = received / self.speed_limit - (time.time() - t_start)
+            if delay > 0:
+                time.sleep(delay)
+
+    def _transfer(self, url: str, path_part: str, path_checkpoint: str, state: dict,
+                  expected_md5: Optional[str] = None) -> None:
+        """
+        Streams the remaining bytes of `url` into the `.part` file, hashing them on the way.
+
+        The transfer state is updated in place, so after an interruption it still
+        describes exactly the bytes flushed to the `.part` file. When the server answers
+        the resume request with HTTP 416 the `.part` file is kept if it is already
+        complete (see `_part_complete`); otherwise it and its checkpoint are deleted and
+        the transfer starts over.
+
+        Raises:
+            requests.exceptions.RequestException: If the transfer fails or is interrupted.
+        """
+        headers = {"Accept-Encoding": "identity"}
+        if state["offset"] > 0:
+            headers["Range"] = f"bytes={state['offset']}-"
+            validator = state["checkpoint"].get("etag") or state["checkpoint"].get("last_modified")
+            if validator:
+                headers["If-Range"] = validator
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if state["offset"] > 0 and response.status_code == 416:
+                if self._part_complete(response, state, expected_md5):
+                    return
+                # O .part NAO CONFERE COM O ARQUIVO ATUAL: DESCARTA E RECOMECA SEM Range
+                print(f"Arquivo parcial de {url} não confere, recomeçando do zero")
+                for path in (path_part, path_checkpoint):
+                    if os.path.exists(path):
+                        os.remove(path)
+                state["offset"], state["checkpoint"], state["md5"] = 0, {}, hashlib.md5()
+                response.close()
+                return self._transfer(url, path_part, path_checkpoint, state, expected_md5)
+            response.raise_for_status()
+            if state["offset"] > 0 and response.status_code != 206:
+                # SERVIDOR IGNOROU O RANGE OU O ARQUIVO MUDOU: RECOMECA DO ZERO
+                state["offset"], state["md5"] = 0, hashlib.md5()
+            if state["offset"] == 0:
+                length = response.headers.get("Content-Length")
+                state["checkpoint"] = {
+                    "url": url,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "size": int(length) if length else None,
+                    "offset": 0,
+                }
+
+            checkpoint, md5 = state["checkpoint"], state["md5"]
+            t_start, received = time.time(), 0
+            next_checkpoint = state["offset"] + self.checkpoint_every
+            with open(path_part, "r+b" if state["offset"] > 0 else "wb") as file:
+                file.seek(state["offset"])
+                try:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        if not chunk:
+                            continue
+                        file.write(chunk)
+                        md5.update(chunk)
+                        state["offset"]     += len(chunk)
+                        received            += len(chunk)
+                        if state["offset"] >= next_checkpoint:
+                            file.flush()
+                            os.fsync(file.fileno())
+                            checkpoint["offset"] = state["offset"]
+                            self._save_checkpoint(path_checkpoint, checkpoint)
+                            next_checkpoint = state["offset"] + self.checkpoint_every
+                        self._throttle(t_start, received)
+                finally:
+                    file.flush()
+                    os.fsync(file.fileno())
+                    checkpoint["offset"] = state["offset"]
+                    self._save_checkpoint(path_checkpoint, checkpoint)
+
+    def download(self, url: str, download_path: str, md5_url: Optional[str] = None,
+                 expected_md5: Optional[str] = None) -> tuple:
         """
         Downloads a file from the given URL to the specified download path.
 
+        The transfer is resumed from the last checkpoint when a previous run was
+        interrupted, and retried up to `retries` times. When `md5_url` is given the
+        streamed bytes are checked against the published checksum and a corrupt file
+        is discarded instead of being moved to `download_path`.
+
         Args:
             url (str): The URL of the file to be downloaded.
             download_path (str): The local path where the file will be saved.
+            md5_url (str, optional): The URL of the checksum file published next to the file.
+            expected_md5 (str, optional): The checksum itself, when already known; `md5_url`
+                is then not fetched.
 
         Returns:
             tuple: A tuple containing:
                 - bool: True if the download was successful, False otherwise.
                 - str or list: The destination path of the downloaded file if successful,
                   or a list of error messages if the download fails.
+        """
+        path_part       = f"{download_path}.part"
+        path_checkpoint = f"{path_part}.json"
+        if expected_md5 is None and md5_url:
+            expected_md5 = self.fetch_md5(md5_url)
+
+        errors = []
+        state  = self._resume_state(url, path_part, path_checkpoint)
+        if state["offset"] > 0:
+            print(f"Retomando download de {url} a partir de {state['offset']} bytes")
+
+        for _ in range(self.retries + 1):
+            try:
+                self._transfer(url, path_part, path_checkpoint, state, expected_md5)
+            except requests.exceptions.HTTPError as e:
+                errors.append(str(e))
+                return False, errors
+            except requests.exceptions.RequestException as e:
+                errors.append(str(e))
+                continue
+            size = state["checkpoint"].get("size")
+            if size is None or state["offset"] >= size:
+                break
+            errors.append(f"Transferência incompleta: {state['offset']} de {size} bytes")
+        else:
+            return False, errors
+
+        digest = state["md5"].hexdigest()
+        if expected_md5 and digest != expected_md5:
+            os.remove(path_part)
+            os.remove(path_checkpoint)
+            errors.append(f"MD5 inválido para {url}: esperado {expected_md5}, obtido {digest}")
+            return False, errors
+
+        os.replace(path_part, download_path)
+        os.remove(path_checkpoint)
+        return True, download_path
+
+    def iter_download(self, url: str, md5_url: Optional[str] = None,
+                      expected_md5: Optional[str] = None, tee_path: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Streams a file from the given URL chunk by chunk, for consumers that process the
+        bytes while the transfer is still in progress (e.g. `OSMConvert.run_stream`).
+
+        The MD5 is computed on the way and checked after the last chunk, so the consumer
+        must treat the exception raised at the end as a failed input. A stream cannot be
+        resumed, so an interrupted transfer raises instead of being retried.
+
+        Args:
+            url (str): The URL of the file to be downloaded.
+            md5_url (str, optional): The URL of the checksum file published next to the file.
+            expected_md5 (str, optional): The checksum itself, when already known.
+            tee_path (str, optional): Also save the raw bytes to this path; the file only
+                appears there once the transfer finished and the checksum matched.
+
+        Yields:
+            bytes: The file content, in order.
 
         Raises:
-            Exception: If an unexpected error occurs during the download process.
+            requests.exceptions.RequestException: If the transfer fails.
+            ValueError: If the streamed bytes do not match the published checksum.
         """
-        obj = SmartDL(url, download_path, timeout=self.timeout, verify=False, progress_bar=False)
-        obj.start(blocking=True)
-        if obj.isSuccessful():
-            return True, obj.get_dest()  # Return the path of the downloaded file
-        else:
-            return False, obj.get_errors()  # Return the error message if download fails
+        if expected_md5 is None and md5_url:
+            expected_md5 = self.fetch_md5(md5_url)
+
+        md5         = hashlib.md5()
+        path_part   = f"{tee_path}.part" if tee_path else None
+        tee         = open(path_part, "wb") if path_part else None
+        try:
+            headers = {"Accept-Encoding": "identity"}
+            with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                t_start, received = time.time(), 0
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if not chunk:
+                        continue
+                    md5.update(chunk)
+                    if tee is not None:
+                        tee.write(chunk)
+                    received += len(chunk)
+                    yield chunk
+                    self._throttle(t_start, received)
+
+            digest = md5.hexdigest()
+            if expected_md5 and digest != expected_md5:
+                raise ValueError(f"MD5 inválido para {url}: esperado {expected_md5}, obtido {digest}")
+            if tee is not None:
+                tee.close()
+                os.replace(path_part, tee_path)
+        finally:
+            if tee is not None and not tee.closed:
+                tee.close()
+            if path_part and os.path.exists(path_part):
+                os.remove(path_part)
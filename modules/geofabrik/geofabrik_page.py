@@ -0,0 +1,81 @@
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from typing import Optional
+import re
+
+class GeofabrikPage(HTMLParser):
+    """
+    This module provides the `GeofabrikPage` class, a parsed Geofabrik region page that is
+    built once per fetch and shared by `DateExtractor` and `LinkExtractor`.
+    Classes:
+        GeofabrikPage: Indexes every link and timestamp of a page in one streaming pass.
+    Dependencies:
+        - html.parser: Used to stream through the HTML without building a document tree.
+        - urljoin from urllib.parse: Used to construct absolute URLs from relative links.
+    Attributes:
+        base_url (str): The URL the page was fetched from, used to resolve relative links.
+        links (list[str]): Every absolute link of the page, in document order.
+        extracts (dict[str, str]): Extract download URLs keyed by lowercase region name,
+            e.g. {"brazil": ".../brazil-latest.osm.pbf"}; a continent page lists dozens.
+        timestamps (list[str]): Every ISO 8601 timestamp found in the page text, in order.
+    Example:
+        page = GeofabrikPage(html, "https://download.geofabrik.de/south-america.html")
+        page.date                # "2025-01-01T20:21:00Z"
+        page.extract("paraguay") # ".../south-america/paraguay-latest.osm.pbf"
+    """
+    DATE_PATTERN    = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z")
+    EXTRACT_PATTERN = re.compile(r"(?:^|/)([^/]+?)-latest.*\.(osm|pbf)$", flags=re.IGNORECASE)
+
+    def __init__(self, html: str, base_url: str = "") -> None:
+        super().__init__(convert_charrefs=True)
+        self.base_url: str          = base_url
+        self.links: list[str]       = []
+        self.extracts: dict[str, str] = {}
+        self.timestamps: list[str]  = []
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag != "a":
+            return
+        href = dict(attrs).get("href")
+        if not href:
+            return
+        url = urljoin(self.base_url, href)
+        self.links.append(url)
+        match = self.EXTRACT_PATTERN.search(href)
+        if match:
+            # MANTEM O PRIMEIRO LINK DE CADA REGIAO, COMO A BUSCA ORIGINAL
+            self.extracts.setdefault(match.group(1).lower(), url)
+
+    def handle_data(self, data: str) -> None:
+        self.timestamps.extend(self.DATE_PATTERN.findall(data))
+
+    @property
+    def date(self) -> Optional[str]:
+        """
+        Return the first timestamp of the page, i.e. the last modification of the extract.
+
+        Returns:
+            str or None: The date in ISO 8601 format, or None if the page has none.
+        """
+        return self.timestamps[0] if self.timestamps else None
+
+    def extract(self, country: str) -> Optional[str]:
+        """
+        Return the download URL of the latest OSM/PBF extract of a region.
+
+        The lookup is a dictionary hit; only names that are not a full region name
+        (e.g. a partial match) fall back to scanning the links in document order.
+
+        Args:
+            country (str): The region name as used in Geofabrik file names.
+
+        Returns:
+            str or None: The absolute download URL, or None if the page has no such link.
+        """
+        url = self.extracts.get(country.lower())
+        if url is not None:
+            return url
+        pattern = re.compile(rf"{country}-latest.*\.(osm|pbf)$", flags=re.IGNORECASE)
+        return next((link for link in self.links if pattern.search(link)), None)
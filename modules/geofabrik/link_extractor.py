@@ -1,7 +1,5 @@
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-import re
-from typing import Any
+from .geofabrik_page import GeofabrikPage
+from typing import Union
 
 class LinkExtractor:
     """
@@ -11,22 +9,21 @@ class LinkExtractor:
         LinkExtractor: A class that extracts a specific download link for a given country
         from an HTML page.
     Dependencies:
-        - BeautifulSoup from bs4: Used for parsing HTML content.
-        - re: Used for regular expression matching.
-        - urljoin from urllib.parse: Used to construct absolute URLs from relative links.
+        - GeofabrikPage: The single-pass parsed page shared by both extractors.
     Exceptions:
         - ValueError: Raised when no matching download link is found in the HTML content.
     """
     def __init__(self, country: str) -> None:
         self.country: str = country
 
-    def extract(self, html: str, base_url: str) -> str:
+    def extract(self, html: Union[str, GeofabrikPage], base_url: str) -> str:
         """
         Extracts a download link for a specific country's latest OSM or PBF 
         file from the provided HTML content.
 
         Args:
-            html (str): The HTML content to parse for the download link.
+            html (str or GeofabrikPage): The HTML content to parse for the download link,
+                or the page already parsed (then `base_url` is the one it was built with).
             base_url (str): The base URL to resolve relative links.
 
         Returns:
@@ -35,9 +32,8 @@ class LinkExtractor:
         Raises:
             ValueError: If no matching download link is found in the HTML content.
         """
-        soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
-        for a in soup.find_all("a", href=True):
-            href: str = a["href"]
-            if re.search(rf'{self.country}-latest.*\.(osm|pbf)$', href, flags=re.IGNORECASE):
-                return urljoin(base_url, href)
-        raise ValueError("Download link not found.")
+        page = html if isinstance(html, GeofabrikPage) else GeofabrikPage(html, base_url)
+        url = page.extract(self.country)
+        if url is None:
+            raise ValueError("Download link not found.")
+        return url
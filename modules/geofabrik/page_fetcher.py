@@ -1,5 +1,8 @@
 from typing import Optional
 import requests
+import hashlib
+import json
+import os
 
 class PageFetcher:
     """
@@ -11,13 +14,77 @@ class PageFetcher:
         - PageFetcher: A utility class for fetching web page content.
     Dependencies:
         - requests: A library for making HTTP requests.
+    Cache:
+        When `cache_dir` is given, every page is stored on disk together with its
+        ETag/Last-Modified headers, and the next request for the same URL is sent
+        with If-None-Match/If-Modified-Since. A 304 answer costs no body transfer:
+        `fetch` returns the cached content and `fetch_if_modified` returns None.
     Usage Example:
-        fetcher = PageFetcher()
+        fetcher = PageFetcher(cache_dir="data/interim/http_cache")
         content = fetcher.fetch("https://example.com")
         print(content)
     """
-    def __init__(self, session: Optional[requests.Session] = None) -> None:
+    def __init__(self, session: Optional[requests.Session] = None, cache_dir: Optional[str] = None) -> None:
         self.session: requests.Session = session or requests.Session()
+        self.cache_dir: Optional[str] = cache_dir
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _cache_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _load(self, url: str) -> Optional[dict]:
+        if not self.cache_dir or not os.path.exists(self._cache_path(url)):
+            return None
+        try:
+            with open(self._cache_path(url), "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    def _store(self, url: str, response: requests.Response) -> None:
+        etag            = response.headers.get("ETag")
+        last_modified   = response.headers.get("Last-Modified")
+        if not self.cache_dir or not (etag or last_modified):
+            return
+        entry = {"url": url, "etag": etag, "last_modified": last_modified, "text": response.text}
+        path_tmp = f"{self._cache_path(url)}.tmp"
+        with open(path_tmp, "w", encoding="utf-8") as file:
+            json.dump(entry, file, ensure_ascii=False)
+        os.replace(path_tmp, self._cache_path(url))
+
+    def invalidate(self, url: str) -> None:
+        """
+        Drops the cached copy of a URL, forcing the next request to be unconditional.
+
+        Args:
+            url (str): The URL whose cache entry should be removed.
+        """
+        if self.cache_dir and os.path.exists(self._cache_path(url)):
+            os.remove(self._cache_path(url))
+
+    def _get(self, url: str) -> tuple:
+        """
+        Performs a (conditional, when cached) GET request.
+
+        Returns:
+            tuple: (content, modified), where `modified` is False on a 304 answer.
+        """
+        entry   = self._load(url)
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response: requests.Response = self.session.get(url, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            return entry["text"], False
+        response.raise_for_status()
+        self._store(url, response)
+        return response.text, True
 
     def fetch(self, url: str) -> str:
         """
@@ -32,6 +99,20 @@ class PageFetcher:
         Raises:
             requests.exceptions.HTTPError: If the HTTP request returned an unsuccessful status code.
         """
-        response: requests.Response = self.session.get(url)
-        response.raise_for_status()
-        return response.text
\ No newline at end of file
+        return self._get(url)[0]
+
+    def fetch_if_modified(self, url: str) -> Optional[str]:
+        """
+        Fetches the content of a given URL only if it changed since the cached copy.
+
+        Args:
+            url (str): The URL to fetch.
+
+        Returns:
+            str or None: The response content, or None if the server answered 304 Not Modified.
+
+        Raises:
+            requests.exceptions.HTTPError: If the HTTP request returned an unsuccessful status code.
+        """
+        content, modified = self._get(url)
+        return content if modified else None
@@ -0,0 +1,225 @@
+from modules.osmtools.osm_convert import OSMConvert
+from typing import Optional
+import subprocess
+import requests
+import tempfile
+import shutil
+import json
+import os
+
+class ReplicationUpdater:
+    """
+    This module provides the `ReplicationUpdater` class, which keeps a local Geofabrik
+    extract up to date by applying the daily replication diffs (.osc.gz) published in
+    the `<region>-updates` directory, instead of downloading the whole extract again.
+    Classes:
+        ReplicationUpdater: Fetches the missing change files and merges them into the
+        local Protobuf (.osm.pbf) file with the bundled `osmconvert`.
+    Dependencies:
+        - requests: Used to fetch the replication state and the change files.
+        - OSMConvert: Used to merge the change files into the extract.
+    Attributes:
+        updates_url (str): The replication directory (e.g. ".../south-america/brazil-updates").
+        path_file (str): The local extract kept up to date.
+        path_state (str): JSON file holding the replication sequence of the local extract.
+        max_diffs (int): Maximum number of change files applied in one update; a longer gap
+            is treated as a broken chain.
+        session (requests.Session): The HTTP session used for every request.
+    Notes:
+        `update` returns None whenever the chain cannot be followed (no local state, a
+        missing change file, a sequence reset or an osmconvert failure). The caller is
+        expected to fall back to a full download and then call `record_state`.
+    Example:
+        updater = ReplicationUpdater(
+            "https://download.geofabrik.de/south-america/brazil-updates",
+            "data/external/pbf/brazil-latest.osm.pbf"
+        )
+        if updater.update() is None:
+            state = updater.latest_state()
+            ...  # full download, then updater.record_state(state)
+    """
+    def __init__(self,
+            updates_url: str,
+            path_file: str,
+            session: Optional[requests.Session]     = None,
+            converter: Optional[OSMConvert]         = None,
+            timeout: int                            = 10,
+            max_diffs: int                          = 60
+        ):
+        self.updates_url    = updates_url.rstrip("/")
+        self.path_file      = path_file
+        self.path_state     = f"{path_file}.state.json"
+        self.session        = session or requests.Session()
+        self.converter      = converter
+        self.timeout        = timeout
+        self.max_diffs      = max_diffs
+
+    @staticmethod
+    def sequence_path(sequence: int) -> str:
+        """
+        Converts a replication sequence number into its path on the replication server.
+
+        Args:
+            sequence (int): The sequence number, e.g. 4318.
+
+        Returns:
+            str: The relative path without extension, e.g. "000/004/318".
+        """
+        digits = f"{sequence:09d}"
+        return f"{digits[0:3]}/{digits[3:6]}/{digits[6:9]}"
+
+    def fetch_state(self, sequence: Optional[int] = None) -> dict:
+        """
+        Fetches and parses a replication `state.txt` file.
+
+        Args:
+            sequence (int, optional): The sequence whose state is wanted; the latest if None.
+
+        Returns:
+            dict: The state with the keys "sequence" (int) and "timestamp" (str).
+
+        Raises:
+            requests.exceptions.HTTPError: If the state file cannot be fetched.
+            ValueError: If the state file has no sequence number.
+        """
+        if sequence is None:
+            url = f"{self.updates_url}/state.txt"
+        else:
+            url = f"{self.updates_url}/{self.sequence_path(sequence)}.state.txt"
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+
+        values = {}
+        for line in response.text.splitlines():
+            if "=" in line and not line.startswith("#"):
+                key, value = line.split("=", 1)
+                values[key.strip()] = value.strip().replace("\\:", ":")
+        if "sequenceNumber" not in values:
+            raise ValueError(f"No sequenceNumber in {url}")
+        return {"sequence": int(values["sequenceNumber"]), "timestamp": values.get("timestamp", "")}
+
+    def local_state(self) -> Optional[dict]:
+        """
+        Returns the replication state of the local extract, if known.
+
+        Returns:
+            dict or None: The saved state, or None if the extract or its state is missing.
+        """
+        if not os.path.exists(self.path_file) or not os.path.exists(self.path_state):
+            return None
+        try:
+            with open(self.path_state, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def latest_state(self) -> Optional[dict]:
+        """
+        Fetches the latest remote replication state without raising.
+
+        Returns:
+            dict or None: The remote state, or None if it is unavailable.
+        """
+        try:
+            return self.fetch_state()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Estado de replicação indisponível em {self.updates_url}: {e}")
+            return None
+
+    def record_state(self, state: Optional[dict] = None) -> Optional[dict]:
+        """
+        Saves the replication state of the local extract.
+
+        Called after a full download, so the next update knows where the chain starts.
+        Passing the state fetched before the download is safer than the latest one: any
+        diff already contained in the extract is simply re-applied on the next update.
+
+        Args:
+            state (dict, optional): The state to save; the latest remote state if None.
+
+        Returns:
+            dict or None: The saved state, or None if the remote state is unavailable.
+        """
+        state = state or self.latest_state()
+        if state is None:
+            return None
+        with open(self.path_state, "w", encoding="utf-8") as file:
+            json.dump(state, file, ensure_ascii=False, indent=4)
+        return state
+
+    def _get_converter(self) -> OSMConvert:
+        if self.converter is None:
+            folder = os.path.dirname(self.path_file)
+            self.converter = OSMConvert(
+                base_path_in=os.path.dirname(folder),
+                base_path_out=os.path.dirname(folder),
+                type_osm_in=os.path.basename(folder),
+                type_osm_out="pbf",
+            )
+        self.converter.input_file = os.path.basename(self.path_file)
+        return self.converter
+
+    def _download_diffs(self, first: int, last: int, folder: str) -> Optional[list]:
+        diffs = []
+        for sequence in range(first, last + 1):
+            url = f"{self.updates_url}/{self.sequence_path(sequence)}.osc.gz"
+            response = self.session.get(url, timeout=self.timeout)
+            if response.status_code != 200:
+                print(f"Cadeia de replicação quebrada em {url}: HTTP {response.status_code}")
+                return None
+            path = os.path.join(folder, f"{sequence:09d}.osc.gz")
+            with open(path, "wb") as file:
+                file.write(response.content)
+            diffs.append(path)
+        return diffs
+
+    def update(self) -> Optional[str]:
+        """
+        Brings the local extract up to the latest replication sequence.
+
+        This method performs the following steps:
+        1. Compares the local sequence with the remote `state.txt`.
+        2. Downloads only the missing `.osc.gz` change files.
+        3. Merges them into the extract with osmconvert, writing to a temporary file.
+        4. Atomically replaces the extract and saves the new state.
+
+        Returns:
+            str or None: "up-to-date" or "updated", or None if the chain is broken and a
+            full download is required.
+        """
+        local = self.local_state()
+        if local is None:
+            return None
+        remote = self.latest_state()
+        if remote is None:
+            return None
+
+        missing = remote["sequence"] - local["sequence"]
+        if missing == 0:
+            return "up-to-date"
+        if missing < 0 or missing > self.max_diffs:
+            print(f"Sequência local {local['sequence']} incompatível com {remote['sequence']}")
+            return None
+
+        folder = tempfile.mkdtemp(prefix="diffs_", dir=os.path.dirname(self.path_file) or None)
+        try:
+            try:
+                diffs = self._download_diffs(local["sequence"] + 1, remote["sequence"], folder)
+            except requests.exceptions.RequestException as e:
+                print(f"Erro ao baixar diffs de {self.updates_url}: {e}")
+                return None
+            if diffs is None:
+                return None
+            print(f"Aplicando {len(diffs)} diffs em {self.path_file}")
+
+            path_tmp = os.path.join(folder, os.path.basename(self.path_file))
+            try:
+                self._get_converter().apply_changes(diffs, path_tmp)
+            except (subprocess.CalledProcessError, OSError) as e:
+                print(f"Erro ao aplicar diffs em {self.path_file}: {e}")
+                return None
+            os.replace(path_tmp, self.path_file)
+            self.record_state(remote)
+            return "updated"
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
@@ -0,0 +1,218 @@
+from typing import Optional
+import threading
+import hashlib
+import shutil
+import json
+import os
+
+class ArtifactStore:
+    """
+    Content-addressed store for the outputs of the OSM tool wrappers.
+
+    Every tool invocation is identified by a key derived from the digest of its input
+    files, the digest of the tool binary and its argument list (with the input and
+    output paths replaced by placeholders, so renaming a file does not miss the cache).
+    When the same key is seen again, the stored outputs are placed at the requested
+    paths by hardlink (or copy) instead of running the tool.
+    Attributes:
+        root (str): Directory of the store.
+        path_objects (str): Directory holding one folder per key with its outputs.
+        path_digests (str): JSON file caching file digests by (path, size, mtime).
+        tuning_args (tuple): Options that only tune memory/speed (set per host by
+            `MemoryPlanner`); they are left out of the key, since the output does not depend
+            on them. Options in `tuning_pairs` take their value in the next argument.
+    Notes:
+        Files digests are cached, so a multi-GB input is only hashed again when it
+        changes. Outputs that are later modified in place (e.g. a SpatiaLite DB that the
+        next stage writes into) must be stored and fetched with `link=False`.
+    Example:
+        store = ArtifactStore()
+        key = store.key(binary, args, inputs=[path_in], outputs=[path_out])
+        if not store.fetch(key, [path_out]):
+            ...  # run the tool
+            store.save(key, [path_out])
+    """
+    tuning_args     = ("--hash-memory=", "--max-objects=")
+    tuning_pairs    = ("-cs", "--cache-size")
+
+    def __init__(self, root: str = os.path.join("data", "interim", "artifacts")):
+        self.root           = root
+        self.path_objects   = os.path.join(self.root, "objects")
+        self.path_digests   = os.path.join(self.root, "digests.json")
+        os.makedirs(self.path_objects, exist_ok=True)
+        self._lock          = threading.Lock()
+        self._digests: dict = self._load_digests()
+
+    def _load_digests(self) -> dict:
+        if not os.path.exists(self.path_digests):
+            return {}
+        try:
+            with open(self.path_digests, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_digests(self) -> None:
+        path_tmp = f"{self.path_digests}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(path_tmp, "w", encoding="utf-8") as file:
+            json.dump(self._digests, file)
+        os.replace(path_tmp, self.path_digests)
+
+    def file_digest(self, path: str) -> str:
+        """
+        Return the SHA-256 of a file, reusing the cached value while the file is unchanged.
+
+        Args:
+            path (str): The file to hash.
+
+        Returns:
+            str: The hex digest.
+        """
+        stat        = os.stat(path)
+        path_abs    = os.path.abspath(path)
+        signature   = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            cached = self._digests.get(path_abs)
+            if cached and cached[:2] == signature:
+                return cached[2]
+
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(8 * 1024 * 1024), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+
+        with self._lock:
+            self._digests[path_abs] = signature + [digest]
+            self._save_digests()
+        return digest
+
+    def key(self, binary: str, args: list, inputs: list, outputs: list) -> str:
+        """
+        Computes the key of a tool invocation.
+
+        Args:
+            binary (str): Path of the tool binary.
+            args (list): The full argument list, paths included.
+            inputs (list): Files whose content the result depends on. Missing files count
+                as "absent", so a DB that does not exist yet is part of the key as well.
+            outputs (list): Files produced by the invocation. A tool that writes to
+                `<output>.part` and renames it gets the same key as one writing `<output>`.
+
+        Returns:
+            str: The hex key.
+        """
+        names = {}
+        for position, path in enumerate(inputs):
+            names.setdefault(os.path.abspath(path), f"<in{position}>")
+        for position, path in enumerate(outputs):
+            names.setdefault(os.path.abspath(path), f"<out{position}>")
+            names.setdefault(os.path.abspath(path) + ".part", f"<out{position}>")
+
+        def normalize(arg: str) -> str:
+            prefix, sep, value = arg.partition("=")
+            if sep and os.path.abspath(value) in names:
+                return f"{prefix}={names[os.path.abspath(value)]}"
+            return names.get(os.path.abspath(arg), arg) if arg and not arg.startswith("-") else arg
+
+        kept, skip = [], False
+        for arg in map(str, args[1:]):
+            if skip or arg.startswith(self.tuning_args):
+                skip = False
+                continue
+            skip = arg in self.tuning_pairs
+            if not skip:
+                kept.append(arg)
+
+        payload = {
+            "binary": self.file_digest(binary.removeprefix("./")),
+            "args": [normalize(arg) for arg in kept],
+            "inputs": [self.file_digest(path) if os.path.exists(path) else "absent" for path in inputs],
+            "outputs": len(outputs),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.path_objects, key[:2], key)
+
+    @staticmethod
+    def _place(source: str, target: str, link: bool) -> None:
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        path_tmp = f"{target}.artifact.tmp"
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+        try:
+            if not link:
+                raise OSError("copy requested")
+            os.link(source, path_tmp)
+        except OSError:
+            shutil.copyfile(source, path_tmp)
+        os.replace(path_tmp, target)
+
+    def fetch(self, key: str, outputs: list, link: bool = True) -> bool:
+        """
+        Places the stored outputs of a key at the given paths.
+
+        Args:
+            key (str): The invocation key.
+            outputs (list): Where the outputs should appear, in the order they were saved.
+            link (bool): Hardlink when possible; False always copies.
+
+        Returns:
+            bool: True on a cache hit, False if the key is unknown.
+        """
+        entry = self._entry(key)
+        if not os.path.exists(os.path.join(entry, "manifest.json")):
+            return False
+        with open(os.path.join(entry, "manifest.json"), "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+        if len(manifest["outputs"]) != len(outputs):
+            return False
+        for position, target in enumerate(outputs):
+            self._place(os.path.join(entry, str(position)), target, link)
+        return True
+
+    def save(self, key: str, outputs: list, link: bool = True) -> None:
+        """
+        Stores the outputs of a successful invocation under its key.
+
+        Args:
+            key (str): The invocation key.
+            outputs (list): The produced files.
+            link (bool): Hardlink when possible; False always copies.
+        """
+        entry       = self._entry(key)
+        path_tmp    = f"{entry}.{os.getpid()}.tmp"
+        shutil.rmtree(path_tmp, ignore_errors=True)
+        os.makedirs(path_tmp)
+        for position, source in enumerate(outputs):
+            self._place(source, os.path.join(path_tmp, str(position)), link)
+        manifest = {"outputs": [os.path.basename(path) for path in outputs]}
+        with open(os.path.join(path_tmp, "manifest.json"), "w", encoding="utf-8") as file:
+            json.dump(manifest, file, ensure_ascii=False, indent=4)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(path_tmp, entry)
+
+    def prepare(self, outputs: list) -> None:
+        """
+        Unlinks stale outputs before a tool runs, so a tool that truncates and rewrites
+        its output never writes through a hardlink into the store.
+
+        Args:
+            outputs (list): The files the tool is about to write.
+        """
+        for path in outputs:
+            if os.path.exists(path) and os.stat(path).st_nlink > 1:
+                os.remove(path)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """
+        Removes one entry, or the whole store when `key` is None.
+
+        Args:
+            key (str, optional): The invocation key to remove.
+        """
+        shutil.rmtree(self._entry(key) if key else self.root, ignore_errors=True)
+        if key is None:
+            os.makedirs(self.path_objects, exist_ok=True)
+            self._digests = {}
@@ -0,0 +1,106 @@
+from typing import Iterable
+import os
+
+class FilterProfile:
+    """
+    A named osmfilter configuration: which highway classes are kept and which of their
+    tags survive into the filtered file (and therefore into the SpatiaLite database).
+    Attributes:
+        name (str): The profile name, also used in the output file name.
+        highways (list[str]): The `highway=` values kept; an empty list keeps every value.
+        tags (list[str]): The only tag keys kept on the output (`--keep-tags=all ...`);
+            `highway` is always included.
+        drop_tags (list[str]): Tag keys dropped even if listed in `tags` (`--drop-tags=`).
+        drop_author (bool): Drops changeset/user data (`--drop-author`).
+        drop_relations (bool): Drops every relation (`--drop-relations`); the router only
+            uses ways and their nodes.
+    Example:
+        profile = PROFILES["truck"]
+        profile.arguments()   # ["--keep=highway=motorway =trunk ...", "--keep-tags=all ...", ...]
+        profile.write("data/interim/filter/truck.params")
+        custom = FilterProfile("bus", highways=["primary", "secondary"], tags=["name", "bus"])
+    """
+    def __init__(self,
+            name: str,
+            highways: Iterable[str]     = (),
+            tags: Iterable[str]         = (),
+            drop_tags: Iterable[str]    = (),
+            drop_author: bool           = True,
+            drop_relations: bool        = True
+        ):
+        if not name or not name.replace("_", "").replace("-", "").isalnum():
+            raise ValueError(f"Invalid profile name: {name!r}")
+        self.name           = name
+        self.highways       = list(highways)
+        self.tags           = ["highway"] + [tag for tag in tags if tag != "highway"]
+        self.drop_tags      = list(drop_tags)
+        self.drop_author    = drop_author
+        self.drop_relations = drop_relations
+
+    def arguments(self) -> list[str]:
+        """
+        Compiles the profile to osmfilter arguments.
+
+        Returns:
+            list[str]: One osmfilter argument per item.
+        """
+        # SINTAXE DO OSMFILTER PARA VARIOS VALORES: "highway=motorway =trunk =primary"
+        args = ["--keep=highway=" + " =".join(self.highways)]
+        args.append("--keep-tags=all " + " ".join(f"{tag}=" for tag in self.tags))
+        if self.drop_tags:
+            args.append("--drop-tags=" + " ".join(f"{tag}=" for tag in self.drop_tags))
+        if self.drop_author:
+            args.append("--drop-author")
+        if self.drop_relations:
+            args.append("--drop-relations")
+        return args
+
+    def write(self, path: str) -> str:
+        """
+        Writes the arguments to an osmfilter parameter file (`--parameter-file=`), where
+        parameters are separated by empty lines.
+
+        Args:
+            path (str): The parameter file to write.
+
+        Returns:
+            str: The path of the written file.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(f"// osmfilter profile: {self.name}\n\n")
+            file.write("\n\n".join(self.arguments()) + "\n")
+        return path
+
+    def __repr__(self) -> str:
+        return f"FilterProfile({self.name!r})"
+
+
+# TAGS LIDAS PELO spatialite_osm_net E PELO ROTEADOR (SENTIDO, NOME, VELOCIDADE, ACESSO)
+_ROUTING_TAGS = ["name", "ref", "oneway", "junction", "maxspeed", "access"]
+_ROAD_CLASSES = [
+    "motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link",
+    "secondary", "secondary_link", "tertiary", "tertiary_link",
+]
+
+PROFILES = {
+    "car": FilterProfile(
+        "car",
+        highways=_ROAD_CLASSES + ["unclassified", "residential", "living_street", "service"],
+        tags=_ROUTING_TAGS + ["motor_vehicle", "motorcar"],
+    ),
+    "truck": FilterProfile(
+        "truck",
+        highways=_ROAD_CLASSES + ["unclassified"],
+        tags=_ROUTING_TAGS + ["motor_vehicle", "hgv", "maxweight", "maxheight", "maxlength", "maxaxleload"],
+    ),
+    "walking": FilterProfile(
+        "walking",
+        highways=[
+            "primary", "primary_link", "secondary", "secondary_link", "tertiary", "tertiary_link",
+            "unclassified", "residential", "living_street", "service", "pedestrian", "footway",
+            "path", "steps", "track",
+        ],
+        tags=["name", "access", "foot", "sidewalk"],
+    ),
+}
@@ -0,0 +1,165 @@
+from typing import Optional
+import psutil
+import os
+
+MB = 1024 ** 2
+
+class MemoryPlanner:
+    """
+    Sizes the memory options of the OSM tools from the host RAM and the input file.
+
+    A global budget (a fraction of the available RAM, or a fixed amount) is divided by the
+    number of stages that may run at the same time, and each stage gets options that fit
+    its share:
+        - osmconvert/osmfilter `--hash-memory`: one bit per possible node/way/relation id,
+          so what is needed depends on the highest id, not on the extract size. It is
+          capped by the stage share and by the 4000 MiB the tools accept.
+        - osmconvert `--max-objects`: 16 bytes per way/relation, from `--out-statistics`
+          (with `use_statistics`) or estimated from the file size.
+        - SpatiaLite `-cs`: cache pages to hold the estimated database, which runs it fully
+          in RAM on big hosts.
+    Attributes:
+        total_mb (int): Host RAM.
+        available_mb (int): RAM available when the planner was created.
+        budget_mb (int): The global budget for all concurrent stages.
+        concurrency (int): How many stages share the budget.
+        stage_mb (int): The share of each stage.
+        use_statistics (bool): Reads the input counts with `--out-statistics` instead of
+            estimating them from the file size (exact, but reads the whole file).
+    Notes:
+        The options only tune speed, so `ArtifactStore` leaves them out of its keys and a
+        cached output is reused on any host.
+    Example:
+        PLAN = MemoryPlanner(concurrency=2)
+        OSMC.hash_memory = PLAN.osmconvert(path)["hash_memory"]
+        args += ["-cs", str(PLAN.spatialite(path_pbf)["cache_size"])]
+    """
+    # LIMITE ACEITO PELO osmconvert/osmfilter EM --hash-memory
+    hash_max_mb         = 4000
+    hash_min_mb         = 64
+    # MAIOR ID DE NO DO OSM (2025) COM FOLGA; EXTRATOS USAM IDS DE TODO O PLANETA
+    node_id_max         = 14_000_000_000
+    # BYTES POR OBJETO EM CADA FORMATO E FRACAO DE VIAS/RELACOES ENTRE OS OBJETOS
+    bytes_per_object    = {"pbf": 8, "o5m": 14, "osm": 120}
+    ways_fraction       = 0.12
+    # TAMANHO DO BANCO DO spatialite_osm_net EM RELACAO AO PBF FILTRADO
+    db_factor           = 6
+    page_size           = 4096
+    # PADRAO DO SQLITE (2000 PAGINAS) COMO PISO
+    cache_min_pages     = 2000
+
+    def __init__(self,
+            budget_mb: Optional[int]    = None,
+            fraction: float             = 0.75,
+            concurrency: int            = 1,
+            use_statistics: bool        = False
+        ):
+        if not 0 < fraction <= 1:
+            raise ValueError("fraction must be in (0, 1]")
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        memory              = psutil.virtual_memory()
+        self.total_mb       = memory.total // MB
+        self.available_mb   = memory.available // MB
+        self.budget_mb      = int(budget_mb or self.available_mb * fraction)
+        self.concurrency    = concurrency
+        self.stage_mb       = max(1, self.budget_mb // concurrency)
+        self.use_statistics = use_statistics
+        self._stats: dict   = {}
+
+    def split(self, parts: int) -> "MemoryPlanner":
+        """
+        Returns a planner for `parts` processes sharing the budget of one stage (e.g. the
+        shards of `OSMShard`).
+        """
+        planner = MemoryPlanner(budget_mb=self.stage_mb, concurrency=parts, use_statistics=self.use_statistics)
+        planner._stats = self._stats
+        return planner
+
+    def input_stats(self, path: Optional[str]) -> dict:
+        """
+        Counts of the input file: from `--out-statistics` when enabled, else estimated.
+
+        Args:
+            path (str or None): The OSM file; None (e.g. a stream) uses the defaults.
+
+        Returns:
+            dict: {"objects": ..., "ways": ..., "node id max": ...}.
+        """
+        if path is None or not os.path.exists(path):
+            return {"objects": 0, "ways": 0, "node id max": self.node_id_max}
+        if path in self._stats:
+            return self._stats[path]
+        if self.use_statistics:
+            # IMPORTADO AQUI PARA O PLANEJADOR NAO DEPENDER DO WRAPPER
+            from modules.osmtools.osm_convert import OSMConvert
+            OSMC = OSMConvert(
+                base_path_in=os.path.dirname(os.path.dirname(path)),
+                type_osm_in=os.path.basename(os.path.dirname(path)),
+            )
+            OSMC.input_file = os.path.basename(path)
+            result = OSMC.statistics()
+            ways = result.get("ways", 0) + result.get("relations", 0)
+            stats = {
+                "objects": result.get("nodes", 0) + ways,
+                "ways": ways,
+                "node id max": result.get("node id max", self.node_id_max),
+            }
+        else:
+            kind = next((k for k in self.bytes_per_object if f".{k}" in os.path.basename(path)), "pbf")
+            objects = os.path.getsize(path) // self.bytes_per_object[kind]
+            stats = {"objects": objects, "ways": int(objects * self.ways_fraction), "node id max": self.node_id_max}
+        self._stats[path] = stats
+        return stats
+
+    def _hash_memory(self, path: Optional[str], share: float) -> int:
+        # 1 BIT POR ID DE NO = 90% DA TABELA (O RESTO SAO VIAS E RELACOES)
+        needed = self.input_stats(path)["node id max"] / 8 / 0.9 / MB
+        return int(max(self.hash_min_mb, min(needed, self.hash_max_mb, self.stage_mb * share)))
+
+    def osmconvert(self, path: Optional[str]) -> dict:
+        """
+        Plans an osmconvert run.
+
+        Returns:
+            dict: {"hash_memory": MB, "max_objects": count}.
+        """
+        hash_memory = self._hash_memory(path, 0.6)
+        # 16 BYTES POR VIA/RELACAO, NO QUE SOBRA DA FATIA DA ETAPA
+        room        = max(0, self.stage_mb - hash_memory) * MB // 16
+        needed      = int(self.input_stats(path)["ways"] * 1.1)
+        return {"hash_memory": hash_memory, "max_objects": int(max(1_000_000, min(needed, room)))}
+
+    def osmfilter(self, path: Optional[str]) -> dict:
+        """
+        Plans an osmfilter run.
+
+        Returns:
+            dict: {"hash_memory": MB}.
+        """
+        return {"hash_memory": self._hash_memory(path, 0.8)}
+
+    def spatialite(self, path: Optional[str]) -> dict:
+        """
+        Plans a SpatiaLite tool run from its OSM input (e.g. the filtered PBF).
+
+        Returns:
+            dict: {"cache_size": pages, "in_memory": bool}; `in_memory` tells whether the
+            whole estimated database fits in half the stage share.
+        """
+        db_mb   = (os.path.getsize(path) * self.db_factor // MB) if path and os.path.exists(path) else 0
+        room_mb = self.stage_mb // 2
+        pages   = min(db_mb or room_mb, room_mb) * MB // self.page_size
+        return {"cache_size": int(max(self.cache_min_pages, pages)), "in_memory": 0 < db_mb <= room_mb}
+
+    def summary(self) -> dict:
+        """
+        Returns the budget figures, to log with a run.
+        """
+        return {
+            "total_mb": self.total_mb,
+            "available_mb": self.available_mb,
+            "budget_mb": self.budget_mb,
+            "concurrency": self.concurrency,
+            "stage_mb": self.stage_mb,
+        }
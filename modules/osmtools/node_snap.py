@@ -0,0 +1,283 @@
+"""
+Snapping de origem/destino em memória: os nós de `roads_nodes` em arrays NumPy contíguos,
+organizados em uma grade uniforme, com consultas unitárias e em lote.
+"""
+from typing import Optional, Tuple
+import numpy as np
+import threading
+import sqlite3
+import os
+
+# METROS POR GRAU DE LATITUDE (ESFERA MEDIA)
+METERS_PER_DEGREE = 111_320.0
+# BLOB DE PONTO DO SPATIALITE: 0x00, ORDEM DOS BYTES, SRID, MBR (4 DOUBLES), 0x7C, CLASSE, X, Y, 0xFE
+_POINT_BLOB_SIZE    = 60
+_POINT_XY_OFFSET    = 43
+
+def snap_path(db_path: str) -> str:
+    """
+    Arquivo do índice de snapping gravado ao lado do banco.
+    """
+    return f"{db_path}.nodes.npz"
+
+
+def point_blobs_xy(blobs: list) -> np.ndarray:
+    """
+    Lê X e Y de geometrias POINT no formato BLOB do SpatiaLite, sem `mod_spatialite`.
+    Returns:
+        np.ndarray: Array (N, 2) float64 com longitude e latitude.
+    Raises:
+        ValueError: Se algum BLOB não for um POINT 2D.
+    """
+    if not blobs:
+        return np.empty((0, 2), dtype=np.float64)
+    raw = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+    if raw.size != len(blobs) * _POINT_BLOB_SIZE:
+        raise ValueError("roads_nodes.geometry must hold 2D POINT geometries")
+    raw = raw.reshape(-1, _POINT_BLOB_SIZE)
+    little = raw[:, 1] == 1
+    kind = np.where(little, raw[:, 39], raw[:, 42])
+    if (raw[:, 0] != 0).any() or (raw[:, 38] != 0x7C).any() or (kind != 1).any():
+        raise ValueError("roads_nodes.geometry must hold 2D POINT geometries")
+    xy = np.ascontiguousarray(raw[:, _POINT_XY_OFFSET:_POINT_XY_OFFSET + 16])
+    result = xy.view("<f8").copy()
+    if not little.all():
+        result[~little] = xy[~little].view(">f8")
+    return result
+
+
+class NodeSnapIndex:
+    """
+    Índice do nó mais próximo sobre uma grade uniforme.
+
+    Os ids e as coordenadas dos nós ficam em arrays NumPy contíguos, ordenados por célula,
+    com o início de cada célula em `cell_start` (formato CSR). As longitudes são
+    multiplicadas pelo cosseno da latitude média, para que a distância euclidiana na
+    grade se aproxime da distância no terreno. A busca visita anéis de células em torno do
+    ponto e para quando nenhum nó fora dos anéis visitados pode estar mais perto: a janela
+    cresce até achar o nó, em vez de falhar como o `Box_LatLong` fixo das consultas SQL.
+
+    As consultas em lote (`nearest_many`) processam todos os pontos de um anel de uma vez,
+    com operações vetorizadas.
+
+    Atributos:
+        node_ids (np.ndarray): Ids dos nós (int64), na ordem da grade.
+        xy (np.ndarray): Coordenadas projetadas (N, 2) float64, na mesma ordem.
+        cell_start (np.ndarray): Início de cada célula em `node_ids`; tamanho nx * ny + 1.
+        origin (tuple): Canto inferior esquerdo da grade, projetado.
+        cell (float): Lado da célula, em graus projetados.
+        shape (tuple): (nx, ny).
+        scale (float): Cosseno da latitude média aplicado às longitudes.
+        source (dict): Tamanho e data do banco de origem, para detectar índice desatualizado.
+    Exemplo:
+        SNAP = NodeSnapIndex.open("data/processed/streets/streets.sqlite")
+        node_id, meters = SNAP.nearest(-49.2717158, -16.7802859)
+        ids, meters = SNAP.nearest_many(lons, lats)
+    """
+    # NOS POR CELULA NAS AREAS ONDE ESTAO OS NOS E LIMITE DE CELULAS POR NO (MEMORIA)
+    nodes_per_cell  = 4
+    cells_per_node  = 2
+
+    def __init__(self, node_ids: np.ndarray, lonlat: np.ndarray, source: Optional[dict] = None):
+        node_ids    = np.asarray(node_ids, dtype=np.int64)
+        lonlat      = np.asarray(lonlat, dtype=np.float64).reshape(-1, 2)
+        if len(node_ids) != len(lonlat):
+            raise ValueError("node_ids and lonlat must have the same length")
+        if not len(node_ids):
+            raise ValueError("Cannot build a snapping index without nodes")
+        self.scale  = float(np.cos(np.radians(lonlat[:, 1].mean())))
+        xy          = np.column_stack((lonlat[:, 0] * self.scale, lonlat[:, 1]))
+        low, high   = xy.min(axis=0), xy.max(axis=0)
+        self.origin = (float(low[0]), float(low[1]))
+        extent      = np.maximum(high - low, 1e-9)
+        area        = float(extent[0] * extent[1])
+        smallest    = max(np.sqrt(area / (self.cells_per_node * len(xy) + 1024)), 1e-9)
+        self.cell   = float(max(np.sqrt(area * self.nodes_per_cell / len(xy)), smallest))
+        for _ in range(3):
+            cell_id = self._grid(xy, extent)
+            # OCUPACAO VISTA PELOS NOS: NUMA MALHA CONCENTRADA (CIDADES) A MEDIA POR AREA ENGANA
+            occupancy = float((np.bincount(cell_id).astype(np.float64) ** 2).sum() / len(xy))
+            if occupancy <= 2 * self.nodes_per_cell or self.cell <= smallest:
+                break
+            self.cell = float(max(self.cell * np.sqrt(self.nodes_per_cell / occupancy), smallest))
+        cell_id     = self._grid(xy, extent)
+        nx, ny      = self.shape
+        order       = np.argsort(cell_id, kind="stable")
+        self.node_ids   = np.ascontiguousarray(node_ids[order])
+        self.xy         = np.ascontiguousarray(xy[order])
+        self.cell_start = np.zeros(nx * ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell_id, minlength=nx * ny), out=self.cell_start[1:])
+        self.source = dict(source or {})
+
+    def _grid(self, xy: np.ndarray, extent: np.ndarray) -> np.ndarray:
+        nx, ny      = (np.floor(extent / self.cell).astype(np.int64) + 1).tolist()
+        self.shape  = (nx, ny)
+        cx, cy      = self._cells(xy[:, 0], xy[:, 1])
+        return cy * nx + cx
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def _cells(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # CELULAS FORA DA GRADE SAO PERMITIDAS (PONTOS FORA DA MALHA); ELAS SO FICAM VAZIAS
+        cx = np.floor((x - self.origin[0]) / self.cell).astype(np.int64)
+        cy = np.floor((y - self.origin[1]) / self.cell).astype(np.int64)
+        return cx, cy
+
+    def _limit(self, cx, cy):
+        # RAIO A PARTIR DO QUAL O BLOCO JA COBRE A GRADE INTEIRA
+        nx, ny = self.shape
+        return np.maximum.reduce([np.abs(cx), np.abs(cx - nx + 1), np.abs(cy), np.abs(cy - ny + 1)])
+
+    def nearest_many(self, lons, lats) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nós mais próximos de vários pontos, em lote.
+        Args:
+            lons, lats (array-like): Coordenadas dos pontos, em graus.
+        Returns:
+            tuple: (ids int64, distâncias em metros float64), na ordem dos pontos.
+        """
+        lons    = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        lats    = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        qx, qy  = lons * self.scale, lats
+        cx, cy  = self._cells(qx, qy)
+        limit   = self._limit(cx, cy)
+        nx, ny  = self.shape
+        best    = np.full(len(qx), np.inf)
+        found   = np.full(len(qx), -1, dtype=np.int64)
+        pending = np.arange(len(qx))
+        radius  = 1
+        while len(pending):
+            # BLOCO (2 * radius + 1) CELULAS EM TORNO DE CADA PONTO; CADA LINHA DO BLOCO E
+            # UMA FATIA CONTIGUA DOS NOS, ENTAO OS CANDIDATOS SAO MONTADOS SEM LACO EM PYTHON
+            x0, x1  = np.maximum(cx[pending] - radius, 0), np.minimum(cx[pending] + radius, nx - 1)
+            y0, y1  = np.maximum(cy[pending] - radius, 0), np.minimum(cy[pending] + radius, ny - 1)
+            rows    = np.where(x0 <= x1, np.maximum(y1 - y0 + 1, 0), 0)
+            query   = np.repeat(pending, rows)
+            row     = np.repeat(y0, rows) + np.arange(len(query)) - np.repeat(np.cumsum(rows) - rows, rows)
+            starts  = self.cell_start[row * nx + np.repeat(x0, rows)]
+            counts  = self.cell_start[row * nx + np.repeat(x1, rows) + 1] - starts
+            total   = int(counts.sum())
+            if total:
+                query   = np.repeat(query, counts)
+                nodes   = np.repeat(starts, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                d2      = (self.xy[nodes, 0] - qx[query]) ** 2 + (self.xy[nodes, 1] - qy[query]) ** 2
+                # OS CANDIDATOS JA VEM AGRUPADOS POR PONTO: MINIMO E PRIMEIRO ARGMIN DE CADA GRUPO
+                first   = np.flatnonzero(np.r_[True, query[1:] != query[:-1]])
+                low     = np.minimum.reduceat(d2, first)
+                hits    = np.flatnonzero(d2 == np.repeat(low, np.diff(np.r_[first, total])))
+                group   = np.searchsorted(first, hits, side="right") - 1
+                hits    = hits[np.r_[True, group[1:] != group[:-1]]]
+                best[query[hits]]   = d2[hits]
+                found[query[hits]]  = nodes[hits]
+            # FORA DO BLOCO TODO NO ESTA A PELO MENOS radius CELULAS DE DISTANCIA
+            done    = ((found[pending] >= 0) & (best[pending] <= (radius * self.cell) ** 2)) | (radius >= limit[pending])
+            pending = pending[~done]
+            radius  *= 2
+        return self.node_ids[found], np.sqrt(best) * METERS_PER_DEGREE
+
+    def nearest(self, lon: float, lat: float) -> Tuple[int, float]:
+        """
+        Nó mais próximo de um ponto (o mesmo algoritmo de `nearest_many`, sem o custo de
+        montar arrays para um único ponto).
+        Returns:
+            tuple: (node_id, distância em metros).
+        """
+        x, y    = lon * self.scale, lat
+        cx, cy  = (int(c[0]) for c in self._cells(np.array([x]), np.array([y])))
+        limit   = int(self._limit(cx, cy))
+        nx, ny  = self.shape
+        radius  = 1
+        while True:
+            best, found = np.inf, -1
+            x0, x1  = max(cx - radius, 0), min(cx + radius, nx - 1)
+            for row in range(max(cy - radius, 0), min(cy + radius, ny - 1) + 1) if x0 <= x1 else ():
+                start, end = self.cell_start[row * nx + x0], self.cell_start[row * nx + x1 + 1]
+                if start < end:
+                    d2 = (self.xy[start:end, 0] - x) ** 2 + (self.xy[start:end, 1] - y) ** 2
+                    k = int(d2.argmin())
+                    if d2[k] < best:
+                        best, found = d2[k], start + k
+            if (found >= 0 and best <= (radius * self.cell) ** 2) or radius >= limit:
+                return int(self.node_ids[found]), float(np.sqrt(best) * METERS_PER_DEGREE)
+            radius *= 2
+
+    @staticmethod
+    def _source(db_path: str) -> dict:
+        stat = os.stat(db_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    @classmethod
+    def build(cls, db_path: str, batch: int = 500_000) -> "NodeSnapIndex":
+        """
+        Lê `roads_nodes` (id e geometria) do banco e monta o índice. Não precisa do
+        `mod_spatialite`: os pontos são lidos direto do BLOB.
+        """
+        connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            cursor = connection.execute("SELECT node_id, geometry FROM roads_nodes WHERE geometry IS NOT NULL")
+            ids, lonlat = [], []
+            while rows := cursor.fetchmany(batch):
+                ids.append(np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)))
+                lonlat.append(point_blobs_xy([row[1] for row in rows]))
+        finally:
+            connection.close()
+        if not ids:
+            raise ValueError(f"No nodes in roads_nodes: {db_path}")
+        return cls(np.concatenate(ids), np.concatenate(lonlat), cls._source(db_path))
+
+    def save(self, path: str) -> str:
+        """
+        Grava o índice em um .npz sem compressão (carga rápida) com rename atômico.
+        Returns:
+            str: `path`.
+        """
+        # NOME POR PROCESSO: VARIOS PROCESSOS PODEM GRAVAR O MESMO INDICE AO MESMO TEMPO
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(
+            temp,
+            node_ids=self.node_ids, xy=self.xy, cell_start=self.cell_start,
+            meta=np.array([*self.origin, self.cell, *self.shape, self.scale], dtype=np.float64),
+            source=np.array([self.source.get("size", -1), self.source.get("mtime_ns", -1)], dtype=np.int64),
+        )
+        os.replace(temp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "NodeSnapIndex":
+        """
+        Carrega um índice gravado por `save`.
+        """
+        with np.load(path) as data:
+            index = cls.__new__(cls)
+            index.node_ids      = data["node_ids"]
+            index.xy            = data["xy"]
+            index.cell_start    = data["cell_start"]
+            meta                = data["meta"]
+            source              = data["source"]
+        index.origin    = (float(meta[0]), float(meta[1]))
+        index.cell      = float(meta[2])
+        index.shape     = (int(meta[3]), int(meta[4]))
+        index.scale     = float(meta[5])
+        index.source    = {"size": int(source[0]), "mtime_ns": int(source[1])}
+        return index
+
+    @classmethod
+    def open(cls, db_path: str, rebuild: bool = False) -> "NodeSnapIndex":
+        """
+        Carrega o índice gravado ao lado do banco; se não existir ou o banco tiver mudado
+        desde a gravação, monta de novo e grava (em um volume somente leitura, só monta).
+        """
+        path = snap_path(db_path)
+        if not rebuild and os.path.exists(path):
+            index = cls.load(path)
+            if index.source == cls._source(db_path):
+                return index
+        index = cls.build(db_path)
+        try:
+            index.save(path)
+        except OSError as e:
+            print(f"Índice de snapping não gravado ({e}); usando só em memória")
+            return index
+        print(f"Índice de snapping gravado: {path} ({len(index)} nós)")
+        return index
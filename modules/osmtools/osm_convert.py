@@ -1,5 +1,8 @@
+from typing import Iterable, Optional
 from glob import glob
+from modules.pipeline.process_runner import ProcessRunner
 import subprocess
+import asyncio
 import platform
 import psutil
 import time
@@ -63,6 +66,18 @@ class OSMConvert:
         self.folder_out_data    = os.path.join(self.base_path_out, self.type_osm_out)
         os.makedirs(self.folder_out_data, exist_ok=True)
 
+        # CACHE DE ARTEFATOS (ArtifactStore), DESATIVADO POR PADRAO
+        self.artifact_store     = None
+
+        # TELEMETRIA DA ULTIMA EXECUCAO (ProcessRunner.summary)
+        self.telemetry: dict    = {}
+
+        # LIMITE EM SEGUNDOS DE CADA CHAMADA AO osmconvert; None = SEM LIMITE
+        self.timeout: Optional[float] = None
+
+        # SEM --verbose E SEM MENSAGENS ATE QUE verbose SEJA DEFINIDO
+        self._verbose           = False
+
     @property
     def input_file(self) -> str:
         """
@@ -199,6 +214,281 @@ class OSMConvert:
             raise TypeError("hash_memory must be an integer")
         self._hash_memory = ram
 
+    @property
+    def bounding_box(self) -> tuple:
+        """
+        Return the clipping box passed to osmconvert as `-b=`.
+
+        Returns:
+            tuple: (min_lon, min_lat, max_lon, max_lat).
+        """
+        return self._bounding_box
+
+    @bounding_box.setter
+    def bounding_box(self, box: tuple) -> None:
+        if not isinstance(box, (tuple, list)) or len(box) != 4:
+            raise TypeError("bounding_box must be a (min_lon, min_lat, max_lon, max_lat) tuple")
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in box)
+        if min_lon >= max_lon or min_lat >= max_lat:
+            raise ValueError("bounding_box must have min < max on both axes")
+        self._bounding_box = (min_lon, min_lat, max_lon, max_lat)
+
+    @property
+    def bounding_polygon(self) -> str:
+        """
+        Return the clipping polygon file (Osmosis .poly) passed to osmconvert as `-B=`.
+
+        Returns:
+            str: The path of the .poly file.
+        """
+        return self._bounding_polygon
+
+    @bounding_polygon.setter
+    def bounding_polygon(self, path: str) -> None:
+        if not isinstance(path, str):
+            raise TypeError("bounding_polygon must be a string")
+        if not os.path.exists(path):
+            raise FileExistsError(f"bounding_polygon not exists: {path}")
+        self._bounding_polygon = path
+
+    def _command_bin(self) -> str:
+        """
+        Return the binary path in the form expected by subprocess on the current system.
+
+        Returns:
+            str: The binary path, prefixed by "./" on Linux when it is relative.
+        """
+        if self.base_sys != "Linux" or os.path.isabs(self.file_bin) or self.file_bin.startswith("./"):
+            return self.file_bin
+        return f"./{self.file_bin}"
+
+    def _options(self, stdin: bool = False) -> list:
+        """
+        Builds the optional command-line flags from the attributes that were set.
+
+        Args:
+            stdin (bool): Whether the input is read from standard input. osmconvert refuses
+                --complete-ways/--complete-multipolygons on stdin; without -b/-B borders those
+                flags have no effect anyway, so they are left out.
+
+        Returns:
+            list: The flags, e.g. ["--drop-author", "--hash-memory=4096"].
+        """
+        options = []
+
+        # Para opções booleanas, incluímos o parâmetro somente se existir e for True.
+        if hasattr(self, "_drop_author") and self._drop_author:
+            options.append("--drop-author")
+        if hasattr(self, "_drop_version") and self._drop_version:
+            options.append("--drop-version")
+        if hasattr(self, "_verbose") and self._verbose:
+            options.append("--verbose")
+        if hasattr(self, "_complete_ways") and self._complete_ways and not stdin:
+            options.append("--complete-ways")
+        if hasattr(self, "_complete_multipolygons") and self._complete_multipolygons and not stdin:
+            options.append("--complete-multipolygons")
+
+        # Recorte geográfico: caixa (-b=) ou polígono (-B=)
+        if hasattr(self, "_bounding_box"):
+            options.append("-b=" + ",".join(f"{value:.7f}" for value in self._bounding_box))
+        if hasattr(self, "_bounding_polygon"):
+            options.append(f"-B={self._bounding_polygon}")
+
+        # Para opções numéricas, incluímos o parâmetro se estiver definido.
+        if hasattr(self, "_max_objects"):
+            options.append(f"--max-objects={self._max_objects}")
+        if hasattr(self, "_hash_memory"):
+            options.append(f"--hash-memory={self._hash_memory}")
+        return options
+
+    @staticmethod
+    def _replace(path_part: str, output_file: str) -> None:
+        # NOVO INODE NO LUGAR DA SAIDA: UM HARDLINK DO ArtifactStore NAO E TRUNCADO PELO -o=
+        os.replace(path_part, output_file)
+
+    def output_path(self, name: str) -> str:
+        """
+        Return the output path for an input file name, as `input_file` and `run_stream` name it.
+
+        Args:
+            name (str): The input file name.
+
+        Returns:
+            str: The path in `folder_out_data` with the `type_osm_out` extension.
+        """
+        return os.path.join(self.folder_out_data, os.path.splitext(name)[0] + f".{self.type_osm_out}")
+
+    def run_stream(self, chunks: Iterable[bytes], name: str) -> bool:
+        """
+        Converts data that is still arriving, feeding the chunks to osmconvert's stdin.
+
+        Used to overlap a download with the conversion: the output file is written while
+        the transfer is in progress and the input never touches the disk. If the chunk
+        iterator raises (e.g. a broken transfer or a checksum mismatch), osmconvert is
+        killed, the partial output is removed and the error is re-raised. The output is
+        written to `<output>.part` and moved into place at the end, so an output that is a
+        hardlink to an `ArtifactStore` object is replaced, never overwritten.
+
+        Args:
+            chunks (Iterable[bytes]): The input file content, in order.
+            name (str): The input file name, used to name the output like `input_file` does.
+
+        Returns:
+            bool: True if osmconvert finished successfully.
+
+        Raises:
+            subprocess.CalledProcessError: If osmconvert returns a non-zero exit status.
+            subprocess.TimeoutExpired: If osmconvert runs longer than `timeout`; it is killed.
+        """
+        self._output_file = self.output_path(name)
+        path_part = f"{self._output_file}.part"
+        self.args = [self._command_bin(), "-", *self._options(stdin=True), f"--out-{self.type_osm_out}"]
+        self.args.append(f"-o={path_part}")
+
+        t_start     = time.time()
+        runner      = ProcessRunner("osmconvert " + os.path.basename(self._output_file))
+        try:
+            result  = runner.run(self.args, timeout=self.timeout, input=chunks)
+        except BaseException:
+            if os.path.exists(path_part):
+                os.remove(path_part)
+            raise
+        finally:
+            self.telemetry = runner.summary
+        t_current   = time.time() - t_start
+
+        self._replace(path_part, self._output_file)
+        if hasattr(self, "_verbose") and self._verbose:
+            print(f"Tempo do Processamento: {t_current}s")
+            if result.stderr != "":
+                print("ERROR: ", result.stderr)
+        return True
+
+    def statistics(self) -> dict:
+        """
+        Reads the statistics of the input file (osmconvert `--out-statistics`).
+
+        Returns:
+            dict: The reported values keyed by name, e.g. {"lon min": -74.0, "ways": 123}.
+            Numeric values are converted to float/int, timestamps are kept as strings.
+
+        Raises:
+            subprocess.CalledProcessError: If osmconvert returns a non-zero exit status.
+            subprocess.TimeoutExpired: If osmconvert runs longer than `timeout`; it is killed.
+        """
+        runner = ProcessRunner("osmconvert statistics " + os.path.basename(self._input_file))
+        try:
+            result = runner.run([self._command_bin(), self._input_file, "--out-statistics"], timeout=self.timeout)
+        finally:
+            self.telemetry = runner.summary
+        stats = {}
+        for line in result.stdout.splitlines():
+            name, sep, value = line.partition(": ")
+            if not sep:
+                continue
+            value = value.strip()
+            try:
+                stats[name] = int(value)
+            except ValueError:
+                try:
+                    stats[name] = float(value)
+                except ValueError:
+                    stats[name] = value
+        return stats
+
+    def merge(self, input_files: list, output_file: str) -> bool:
+        """
+        Merges several files of the same region (e.g. geographic shards) into one.
+
+        osmconvert merges the sorted inputs object by object and writes every id once, so
+        ways and nodes that appear in more than one shard (those crossing a shard border,
+        kept whole by `--complete-ways`) are deduplicated. The output is written in
+        `type_osm_out` format regardless of its file extension, to `<output>.part` first
+        and then moved into place.
+
+        Args:
+            input_files (list): Paths of the files to merge, each sorted by type and id.
+            output_file (str): Path of the merged file to be written.
+
+        Returns:
+            bool: True if osmconvert finished successfully.
+
+        Raises:
+            ValueError: If `input_files` is empty.
+            subprocess.CalledProcessError: If osmconvert returns a non-zero exit status.
+            subprocess.TimeoutExpired: If osmconvert runs longer than `timeout`; it is killed.
+        """
+        if not input_files:
+            raise ValueError("input_files must contain at least one file")
+        path_part = f"{output_file}.part"
+        args = [self._command_bin(), *input_files, f"--out-{self.type_osm_out}", f"-o={path_part}"]
+
+        t_start     = time.time()
+        runner      = ProcessRunner("osmconvert " + os.path.basename(output_file))
+        try:
+            result  = runner.run(args, timeout=self.timeout)
+        except BaseException:
+            if os.path.exists(path_part):
+                os.remove(path_part)
+            raise
+        finally:
+            self.telemetry = runner.summary
+        self._replace(path_part, output_file)
+        t_current   = time.time() - t_start
+
+        if hasattr(self, "_verbose") and self._verbose:
+            print(f"Tempo do Processamento: {t_current}s")
+            if result.stderr != "":
+                print("ERROR: ", result.stderr)
+        return result.returncode == 0
+
+    def apply_changes(self, change_files: list, output_file: str) -> bool:
+        """
+        Applies OSM change files (.osc, .osc.gz, .o5c) on top of the input file.
+
+        The change files are first merged into a single .o5c change file (osmconvert
+        `--merge-versions`), which is then applied in one pass over the input, so several
+        daily diffs cost one rewrite of the extract. The output is written in
+        `type_osm_out` format regardless of its file extension, to `<output>.part` first
+        and then moved into place.
+
+        Args:
+            change_files (list): Paths of the change files, oldest first.
+            output_file (str): Path of the updated file to be written.
+
+        Returns:
+            bool: True if osmconvert finished successfully.
+
+        Raises:
+            subprocess.CalledProcessError: If osmconvert returns a non-zero exit status.
+            subprocess.TimeoutExpired: If osmconvert runs longer than `timeout`; it is killed.
+        """
+        path_changes = f"{output_file}.o5c"
+        path_part = f"{output_file}.part"
+        steps = [
+            [self._command_bin(), *change_files, "--merge-versions", "--out-o5c", f"-o={path_changes}"],
+            [self._command_bin(), self._input_file, path_changes, f"--out-{self.type_osm_out}", f"-o={path_part}"],
+        ]
+
+        t_start     = time.time()
+        try:
+            for args in steps:
+                runner = ProcessRunner("osmconvert " + os.path.basename(args[-1][len("-o="):]))
+                result = runner.run(args, timeout=self.timeout)
+                self.telemetry = runner.summary
+                if hasattr(self, "_verbose") and self._verbose and result.stderr != "":
+                    print("ERROR: ", result.stderr)
+            self._replace(path_part, output_file)
+        finally:
+            for path in (path_changes, path_part):
+                if os.path.exists(path):
+                    os.remove(path)
+        t_current   = time.time() - t_start
+
+        if hasattr(self, "_verbose") and self._verbose:
+            print(f"Tempo do Processamento: {t_current}s")
+        return result.returncode == 0
+
     def run(self):
         """
         Executes an external command by constructing and running a list of command-line arguments.
@@ -208,42 +498,102 @@ class OSMConvert:
             --complete-ways, --complete-multipolygons)
             if the corresponding instance attributes are present and True.
         3. Appends numeric options for max objects and hash memory if these attributes are defined.
-        4. Specifies the output file using the "-o=" option.
-        5. Executes the command using subprocess.run, capturing any stdout and stderr.
-        6. Measures the execution time and prints the command output along with the processing time.
+        4. Specifies the output file using the "-o=" option, pointing at `<output>.part`; the
+           part file is moved into place only when osmconvert exits with status 0 and is
+           removed on failure, so a killed run never leaves a truncated output behind and an
+           output that is a hardlink to an `ArtifactStore` object is replaced, never overwritten.
+        5. When an `artifact_store` is set, reuses the output of an identical previous run
+           (same input content, binary and arguments) instead of executing the command.
+        6. Executes the command with `ProcessRunner`, which streams stdout and stderr to the
+           logger and stores the resource telemetry in `telemetry`.
+        7. Measures the execution time and prints the command output along with the processing time.
         Raises:
              subprocess.CalledProcessError: If the subprocess execution fails (i.e., returns a 
              non-zero exit status).
+             subprocess.TimeoutExpired: If it runs longer than `timeout`; the process is killed.
         """
-        # Constroi a lista de argumentos com validação dos atributos
-        self.file_bin = f"./{self.file_bin}" if self.base_sys == "Linux" else self.file_bin
-        self.args = [self.file_bin, self._input_file]
+        key = self._prepare_run()
+        if key is True:
+            return True
 
-        # Para opções booleanas, incluímos o parâmetro somente se existir e for True.
-        if hasattr(self, "_drop_author") and self._drop_author:
-            self.args.append("--drop-author")
-        if hasattr(self, "_drop_version") and self._drop_version:
-            self.args.append("--drop-version")
-        if hasattr(self, "_verbose") and self._verbose:
-            self.args.append("--verbose")
-        if hasattr(self, "_complete_ways") and self._complete_ways:
-            self.args.append("--complete-ways")
-        if hasattr(self, "_complete_multipolygons") and self._complete_multipolygons:
-            self.args.append("--complete-multipolygons")
+        # Executa o comando formado
+        t_start     = time.time()
+        runner      = ProcessRunner("osmconvert " + os.path.basename(self._output_file))
+        try:
+            result  = runner.run(self.args, timeout=self.timeout)
+        except BaseException:
+            self._discard_part()
+            raise
+        return self._finish_run(runner, result, key, time.time() - t_start)
+
+    async def run_async(self, limit=None):
+        """
+        Async variant of `run`, for drivers that run many conversions from one event loop.
 
-        # Para opções numéricas, incluímos o parâmetro se estiver definido.
-        if hasattr(self, "_max_objects"):
-            self.args.append(f"--max-objects={self._max_objects}")
-        if hasattr(self, "_hash_memory"):
-            self.args.append(f"--hash-memory={self._hash_memory}")
+        Args:
+            limit (asyncio.Semaphore, optional): Shared slots bounding how many tools run at
+                the same time.
 
-        # Define o arquivo de saída
-        self.args.append(f"-o={self._output_file}")
+        Returns:
+            Same as `run`.
 
-        # Executa o comando formado
+        Raises:
+            subprocess.CalledProcessError: If osmconvert returns a non-zero exit status.
+            subprocess.TimeoutExpired: If osmconvert runs longer than `timeout`.
+            asyncio.CancelledError: If the task is cancelled; osmconvert is killed first.
+        """
+        # O HASH DAS ENTRADAS NO CACHE DE ARTEFATOS LE O DISCO: FORA DO EVENT LOOP
+        key = await asyncio.to_thread(self._prepare_run)
+        if key is True:
+            return True
         t_start     = time.time()
-        result      = subprocess.run(self.args, capture_output=True, text=True, check=True)
-        t_current   = time.time() - t_start
+        runner      = ProcessRunner("osmconvert " + os.path.basename(self._output_file))
+        try:
+            result  = await runner.run_async(self.args, timeout=self.timeout, limit=limit)
+        except BaseException:
+            self._discard_part()
+            raise
+        return await asyncio.to_thread(self._finish_run, runner, result, key, time.time() - t_start)
+
+    def _prepare_run(self):
+        """
+        Builds `args` and looks the run up in the artifact store.
+
+        Returns:
+            True on an artifact hit (the output is already in place), else the artifact key
+            to save the output under (None without a store).
+        """
+        # Constroi a lista de argumentos com validação dos atributos
+        self.file_bin = self._command_bin()
+        self.args = [self.file_bin, self._input_file]
+        self.args.extend(self._options())
+
+        # Define o arquivo de saída (.part, movido para o lugar pelo _finish_run)
+        self.args.append(f"-o={self._output_file}.part")
+
+        # Reaproveita a saída de uma execução idêntica anterior
+        key = None
+        if self.artifact_store is not None:
+            key = self.artifact_store.key(self.file_bin, self.args, [self._input_file], [self._output_file])
+            if self.artifact_store.fetch(key, [self._output_file]):
+                print(f"Artefato reaproveitado: {self._output_file}")
+                return True
+            self.artifact_store.prepare([self._output_file])
+        return key
+
+    def _discard_part(self) -> None:
+        path_part = f"{self._output_file}.part"
+        if os.path.exists(path_part):
+            os.remove(path_part)
+
+    def _finish_run(self, runner, result, key, t_current):
+        self.telemetry = runner.summary
+        if result.returncode != 0:
+            self._discard_part()
+            return False
+        self._replace(f"{self._output_file}.part", self._output_file)
+        if key is not None:
+            self.artifact_store.save(key, [self._output_file])
 
         if self.verbose:
             print(f"Tempo do Processamento: {t_current}s")
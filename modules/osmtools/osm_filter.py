@@ -1,5 +1,9 @@
+from modules.osmtools.filter_profile import FilterProfile, PROFILES
+from typing import Iterator, Optional, Union
 from glob import glob
+from modules.pipeline.process_runner import ProcessRunner
 import subprocess
+import asyncio
 import platform
 import time
 import os
@@ -21,7 +25,14 @@ class OSMfilter:
         base_categories (list): A list of base attributes required for processing.
         base_data (str): The base directory for data files.
         processed (str): The folder name for processed files.
-        folder_in_data (str): The directory for input data files.
+        folder_in_data (str): The directory for input data files, and of the filtered output
+            (defaults to data/processed/o5m; shards use their own folder).
+        profile (FilterProfile or None): The filter profile (a `PROFILES` name or a
+            FilterProfile); the output is named `.filtered.<profile>.o5m`.
+        folder_params (str): Where the profile parameter files are written.
+        report (dict): Input/output sizes and time of the last run, to compare profiles.
+        hash_memory (int or None): osmfilter `--hash-memory` in MB (see `MemoryPlanner`).
+        timeout (float or None): Seconds before `run`/`run_async`/`iter_run` kill osmfilter.
     Methods:
         input_file (property):
             Getter and setter for the input file path. Ensures the file exists in the 
@@ -35,7 +46,7 @@ class OSMfilter:
         FileExistsError: If the input file does not exist in the specified directory.
         subprocess.CalledProcessError: If the subprocess command fails during execution.
     """
-    def __init__(self, verbose: bool = False):
+    def __init__(self, verbose: bool = False, folder_in_data: Optional[str] = None):
         
         self.verbose            = verbose
 
@@ -68,11 +79,67 @@ class OSMfilter:
 
         # BASE PATH OUT FILES
         self.processed          = "processed"
-        self.folder_in_data     = os.path.join(self.base_data, self.processed, "o5m")
+        self.folder_in_data     = folder_in_data or os.path.join(self.base_data, self.processed, "o5m")
         os.makedirs(self.folder_in_data, exist_ok=True)
 
         self.args               = []
 
+        # CACHE DE ARTEFATOS (ArtifactStore), DESATIVADO POR PADRAO
+        self.artifact_store     = None
+
+        # TELEMETRIA DA ULTIMA EXECUCAO (ProcessRunner.summary)
+        self.telemetry: dict    = {}
+
+        # LIMITE EM SEGUNDOS DE run/run_async; None = SEM LIMITE
+        self.timeout: Optional[float] = None
+
+        # PERFIL DE FILTRO (FilterProfile); SEM PERFIL MANTEM O FILTRO ORIGINAL highway=
+        self._profile: Optional[FilterProfile] = None
+        self.folder_params      = os.path.join(self.base_data, "interim", "filter")
+        self.report: dict       = {}
+
+        # MEMORIA DA TABELA DE HASH EM MB (--hash-memory); None USA O PADRAO DO OSMFILTER
+        self.hash_memory: Optional[int] = None
+
+    @property
+    def profile(self) -> Optional[FilterProfile]:
+        """
+        Return the filter profile in use.
+
+        Returns:
+            FilterProfile or None: The profile, or None for the plain `--keep=highway=` filter.
+        """
+        return self._profile
+
+    @profile.setter
+    def profile(self, profile: Union[str, FilterProfile, None]) -> None:
+        if isinstance(profile, str):
+            if profile not in PROFILES:
+                raise ValueError(f"Unknown filter profile: {profile} (available: {', '.join(PROFILES)})")
+            profile = PROFILES[profile]
+        if profile is not None and not isinstance(profile, FilterProfile):
+            raise TypeError("profile must be a profile name or a FilterProfile")
+        self._profile = profile
+        if hasattr(self, "_input_file"):
+            self._output_file = self._output_name(os.path.basename(self._input_file))
+
+    def _output_name(self, name: str) -> str:
+        suffix = self._profile.name if self._profile is not None else "streets"
+        return os.path.join(self.folder_in_data, os.path.splitext(name)[0] + f".filtered.{suffix}.o5m")
+
+    def _filter_args(self) -> tuple:
+        """
+        Builds the filter arguments: the profile parameter file, or the plain highway filter.
+
+        Returns:
+            tuple: (arguments, extra input files that the result depends on).
+        """
+        if self._profile is None:
+            # MANTEM A TAG PRINCIPAL
+            return ["--keep=highway="], [] # waterway=
+        path_params = self._profile.write(os.path.join(self.folder_params, f"{self._profile.name}.params"))
+        return [f"--parameter-file={path_params}"], [path_params]
+
     @property
     def input_file(self) -> str:
         """
@@ -93,7 +160,7 @@ class OSMfilter:
         path = os.path.join(self.folder_in_data, name)
         if os.path.exists(path):
             self._input_file = path
-            self._output_file = os.path.join(self.folder_in_data, os.path.splitext(name)[0] + ".filtered.streets.o5m")
+            self._output_file = self._output_name(name)
         else:
             raise FileExistsError(f"input_file not exists in {self.folder_in_data}")
 
@@ -113,26 +180,88 @@ class OSMfilter:
             1. Constructs the argument list for the subprocess command.
             2. Appends filtering options for categories.
             3. Defines the output file.
-            4. Executes the subprocess command and captures its output.
+            4. Reuses the output of an identical previous run when an `artifact_store` is set,
+               otherwise executes the command with `ProcessRunner` (streamed output, resource
+               telemetry in `telemetry`).
             5. Measures and prints the processing time along with the command output.
         Raises:
             subprocess.CalledProcessError: If the subprocess command fails.
+            subprocess.TimeoutExpired: If it runs longer than `timeout`; the process is killed.
         """
 
+        key = self._prepare_run()
+        if key is True:
+            return True
+
+        # Executa o comando formado
+        t_start     = time.time()
+        runner      = ProcessRunner("osmfilter " + os.path.basename(self._output_file))
+        result      = runner.run(self.args, timeout=self.timeout)
+        return self._finish_run(runner, result, key, time.time() - t_start)
+
+    async def run_async(self, limit=None):
+        """
+        Async variant of `run`, for drivers that run many filters from one event loop.
+
+        Args:
+            limit (asyncio.Semaphore, optional): Shared slots bounding how many tools run at
+                the same time.
+
+        Returns:
+            Same as `run`.
+
+        Raises:
+            subprocess.CalledProcessError: If osmfilter returns a non-zero exit status.
+            subprocess.TimeoutExpired: If osmfilter runs longer than `timeout`.
+            asyncio.CancelledError: If the task is cancelled; osmfilter is killed first.
+        """
+        # O HASH DAS ENTRADAS NO CACHE DE ARTEFATOS LE O DISCO: FORA DO EVENT LOOP
+        key = await asyncio.to_thread(self._prepare_run)
+        if key is True:
+            return True
+        t_start     = time.time()
+        runner      = ProcessRunner("osmfilter " + os.path.basename(self._output_file))
+        result      = await runner.run_async(self.args, timeout=self.timeout, limit=limit)
+        return await asyncio.to_thread(self._finish_run, runner, result, key, time.time() - t_start)
+
+    def _prepare_run(self):
+        """
+        Builds `args` and looks the run up in the artifact store.
+
+        Returns:
+            True on an artifact hit (the output is already in place), else the artifact key
+            to save the output under (None without a store).
+        """
         # Constroi a lista de argumentos com validação dos atributos
-        self.file_bin = f"./{self.file_bin}" if self.base_sys == "Linux" else self.file_bin
+        if self.base_sys == "Linux" and not (os.path.isabs(self.file_bin) or self.file_bin.startswith("./")):
+            self.file_bin = f"./{self.file_bin}"
         self.args = [self.file_bin, self._input_file]
 
-        # MANTEM A TAG PRINCIPAL
-        self.args.append("--keep=highway=") # waterway=
+        # FILTRO: PERFIL (ARQUIVO DE PARAMETROS) OU A TAG PRINCIPAL
+        filter_args, filter_inputs = self._filter_args()
+        self.args.extend(filter_args)
+        if self.hash_memory:
+            self.args.append(f"--hash-memory={self.hash_memory}")
 
         # Define o arquivo de saída
         self.args.append(f"-o={self._output_file}")
 
-        # Executa o comando formado
-        t_start     = time.time()
-        result      = subprocess.run(self.args, capture_output=True, text=True, check=True)
-        t_current   = time.time() - t_start
+        # Reaproveita a saída de uma execução idêntica anterior
+        key = None
+        if self.artifact_store is not None:
+            key = self.artifact_store.key(self.file_bin, self.args, [self._input_file, *filter_inputs], [self._output_file])
+            if self.artifact_store.fetch(key, [self._output_file]):
+                print(f"Artefato reaproveitado: {self._output_file}")
+                self._record(0.0)
+                return True
+            self.artifact_store.prepare([self._output_file])
+        return key
+
+    def _finish_run(self, runner, result, key, t_current):
+        self.telemetry = runner.summary
+        if key is not None:
+            self.artifact_store.save(key, [self._output_file])
+        self._record(t_current)
         if self.verbose:
             print(f"Tempo do Processamento: {t_current}s")
 
@@ -146,3 +275,65 @@ class OSMfilter:
             print("Result: ", stdout)
             return True
 
+    def _record(self, seconds: float) -> None:
+        """
+        Stores the size of the last output, to compare profiles.
+        """
+        self.report = {
+            "profile": self._profile.name if self._profile is not None else None,
+            "input_bytes": os.path.getsize(self._input_file),
+            "output_bytes": os.path.getsize(self._output_file),
+            "seconds": round(seconds, 3),
+        }
+
+    def iter_run(self, chunk_size: int = 1024 * 1024, tee_path: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Filters the input file and yields the filtered data (.o5m) instead of writing it.
+
+        Meant to be chained into `OSMConvert.run_stream`, so the filtered extract goes
+        straight from osmfilter's stdout to osmconvert's stdin without a disk round trip.
+        Only the output side can be piped: osmfilter needs random access to its input, so
+        `input_file` must be a regular file.
+
+        Args:
+            chunk_size (int): Size of the chunks read from osmfilter.
+            tee_path (str, optional): Also writes the filtered data to this file, for
+                debugging. The file is only kept if osmfilter finishes successfully.
+
+        Yields:
+            bytes: The filtered data, in order.
+
+        Raises:
+            subprocess.CalledProcessError: If osmfilter returns a non-zero exit status.
+            subprocess.TimeoutExpired: If osmfilter runs longer than `timeout`; it is killed.
+        """
+        if self.base_sys == "Linux" and not (os.path.isabs(self.file_bin) or self.file_bin.startswith("./")):
+            self.file_bin = f"./{self.file_bin}"
+        self.args = [self.file_bin, self._input_file, *self._filter_args()[0], "--out-o5m"]
+        if self.hash_memory:
+            self.args.append(f"--hash-memory={self.hash_memory}")
+
+        t_start = time.time()
+        runner  = ProcessRunner("osmfilter " + os.path.basename(self._output_file))
+        chunks  = runner.stream(self.args, timeout=self.timeout, chunk_size=chunk_size)
+        tee     = open(f"{tee_path}.part", "wb") if tee_path else None
+        try:
+            for chunk in chunks:
+                if tee is not None:
+                    tee.write(chunk)
+                yield chunk
+        except BaseException:
+            if tee is not None:
+                tee.close()
+                os.remove(f"{tee_path}.part")
+            raise
+        finally:
+            # CONSUMIDOR INTERROMPIDO: FECHAR O GERADOR MATA O OSMFILTER
+            chunks.close()
+            self.telemetry = runner.summary
+        if tee is not None:
+            tee.close()
+            os.replace(f"{tee_path}.part", tee_path)
+        if self.verbose:
+            print(f"Tempo do Processamento: {time.time() - t_start}s")
+
@@ -0,0 +1,230 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from modules.osmtools.osm_convert import OSMConvert
+from modules.osmtools.osm_filter import OSMfilter
+from typing import Optional
+import shutil
+import math
+import time
+import os
+
+def _process_shard(spec: dict) -> dict:
+    """
+    Recorta, converte e filtra um shard. Executado em um processo do pool, por isso é uma
+    função de módulo e recebe apenas tipos simples.
+    """
+    t_start = time.time()
+    OSMC = OSMConvert(
+        base_path_in=spec["base_path_in"],
+        base_path_out=spec["folder"],
+        type_osm_in=spec["type_osm_in"],
+        type_osm_out="o5m",
+    )
+    if spec["file_bin"]:
+        OSMC.file_bin           = spec["file_bin"]
+    OSMC.input_file             = spec["input_file"]
+    OSMC.drop_author            = True
+    OSMC.drop_version           = True
+    OSMC.verbose                = False
+    OSMC.timeout                = spec["convert_timeout"]
+    # VIAS QUE CRUZAM A BORDA FICAM INTEIRAS EM CADA SHARD QUE TOCAM
+    OSMC.complete_ways          = True
+    OSMC.complete_multipolygons = True
+    if spec["hash_memory"]:
+        OSMC.hash_memory        = spec["hash_memory"]
+    if spec["bbox"] is not None:
+        OSMC.bounding_box       = spec["bbox"]
+    else:
+        OSMC.bounding_polygon   = spec["poly"]
+    OSMC.run()
+    path = OSMC._output_file
+
+    if spec["apply_filter"]:
+        OSMF = OSMfilter(folder_in_data=os.path.dirname(path))
+        OSMF.profile = spec["profile"]
+        OSMF.timeout = spec["filter_timeout"]
+        OSMF.input_file = os.path.basename(path)
+        OSMF.run()
+        os.remove(path)
+        path = OSMF._output_file
+
+    return {"index": spec["index"], "path": path, "elapsed": time.time() - t_start}
+
+
+class OSMShard:
+    """
+    Pré-processamento (osmconvert + osmfilter) dividido geograficamente entre processos.
+
+    O extrato é recortado em shards, por grade de retângulos (`-b=`) ou por polígonos
+    (`-B=`, por exemplo os estados/regiões escritos por `GeofabrikCatalog.write_poly`),
+    sempre com `--complete-ways`. Cada shard é convertido e filtrado em um processo do
+    `ProcessPoolExecutor` e os shards filtrados são unidos em um único PBF para o
+    `SpatialiteOsmNet`. A união (`OSMConvert.merge`) grava cada id uma única vez, o que
+    remove as vias de borda repetidas entre shards vizinhos.
+
+    Atributos:
+        input_file (str): Nome do extrato em `base_path_in/type_osm_in`.
+        shards (int): Número de retângulos da grade (ignorado quando há `polygons`).
+        polygons (list ou None): Arquivos .poly, um shard por polígono.
+        bbox (tuple ou None): Extensão (min_lon, min_lat, max_lon, max_lat) do extrato;
+            quando None, é lida com `--out-statistics`.
+        max_workers (int): Processos simultâneos.
+        folder_work (str): Pasta temporária dos shards.
+        output_file (str): PBF unido.
+        apply_filter (bool): Aplica o osmfilter em cada shard.
+        profile (str, FilterProfile ou None): Perfil do osmfilter (ver `OSMfilter.profile`).
+        keep_shards (bool): Mantém os shards após a união, para depuração.
+        file_bin (str ou None): Binário do osmconvert a usar no lugar do padrão.
+        hash_memory (int ou None): `--hash-memory` de cada processo; com vários processos
+            ao mesmo tempo, use uma fração da RAM.
+        convert_timeout (float ou None): Limite em segundos de cada osmconvert (recorte,
+            estatísticas e união); o processo é encerrado e o shard falha.
+        filter_timeout (float ou None): Limite em segundos do osmfilter de cada shard.
+        report (list): Resultado de cada shard da última execução.
+    Exemplo:
+        SHARD = OSMShard("brazil-latest.osm.pbf", shards=16, max_workers=16)
+        SHARD.run()  # data/processed/pbf/brazil-latest.osm.filtered.streets.pbf
+    """
+    def __init__(self,
+            input_file: str,
+            shards: int                     = 4,
+            polygons: Optional[list]        = None,
+            bbox: Optional[tuple]           = None,
+            max_workers: Optional[int]      = None,
+            base_path_in: str               = os.path.join("data","external"),
+            type_osm_in: str                = "pbf",
+            folder_work: str                = os.path.join("data","interim","shards"),
+            output_file: Optional[str]      = None,
+            apply_filter: bool              = True,
+            keep_shards: bool               = False
+        ):
+        if polygons is None and shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.input_file     = input_file
+        self.shards         = shards
+        self.polygons       = list(polygons) if polygons else None
+        self.bbox           = tuple(bbox) if bbox else None
+        count               = len(self.polygons) if self.polygons else self.shards
+        self.max_workers    = max(1, min(max_workers or os.cpu_count() or 1, count))
+        self.base_path_in   = base_path_in
+        self.type_osm_in    = type_osm_in
+        name                = self.input_file.split(".")[0]
+        self.folder_work    = os.path.join(folder_work, name)
+        self.output_file    = output_file or os.path.join(
+            "data","processed","pbf", os.path.splitext(self.input_file)[0] + ".filtered.streets.pbf"
+        )
+        self.apply_filter   = apply_filter
+        self.keep_shards    = keep_shards
+        self.file_bin       = None
+        self.hash_memory    = None
+        self.convert_timeout = None
+        self.filter_timeout = None
+        self.profile        = None
+        self.report         = []
+
+    def _converter(self, base_path_in: str, type_osm_in: str, type_osm_out: str) -> OSMConvert:
+        OSMC = OSMConvert(
+            base_path_in=base_path_in,
+            base_path_out=self.folder_work,
+            type_osm_in=type_osm_in,
+            type_osm_out=type_osm_out,
+        )
+        if self.file_bin:
+            OSMC.file_bin = self.file_bin
+        OSMC.timeout = self.convert_timeout
+        return OSMC
+
+    def bounds(self) -> tuple:
+        """
+        Retorna a extensão do extrato, informada em `bbox` ou lida do próprio arquivo.
+        Returns:
+            tuple: (min_lon, min_lat, max_lon, max_lat).
+        """
+        if self.bbox is not None:
+            return self.bbox
+        OSMC = self._converter(self.base_path_in, self.type_osm_in, "o5m")
+        OSMC.input_file = self.input_file
+        stats = OSMC.statistics()
+        self.bbox = (stats["lon min"], stats["lat min"], stats["lon max"], stats["lat max"])
+        return self.bbox
+
+    def tiles(self) -> list:
+        """
+        Divide a extensão em uma grade de `shards` retângulos, o mais quadrada possível.
+        Returns:
+            list: Retângulos (min_lon, min_lat, max_lon, max_lat), de oeste para leste e de
+            sul para norte. As bordas externas ganham uma folga para incluir os extremos.
+        """
+        min_lon, min_lat, max_lon, max_lat = self.bounds()
+        pad         = 1e-6
+        min_lon, min_lat, max_lon, max_lat = min_lon - pad, min_lat - pad, max_lon + pad, max_lat + pad
+        rows        = max(d for d in range(1, int(math.isqrt(self.shards)) + 1) if self.shards % d == 0)
+        cols        = self.shards // rows
+        # MAIS COLUNAS NO EIXO MAIS LONGO
+        if (max_lat - min_lat) > (max_lon - min_lon):
+            rows, cols = cols, rows
+        step_lon    = (max_lon - min_lon) / cols
+        step_lat    = (max_lat - min_lat) / rows
+        return [
+            (
+                min_lon + col * step_lon,
+                min_lat + row * step_lat,
+                max_lon if col == cols - 1 else min_lon + (col + 1) * step_lon,
+                max_lat if row == rows - 1 else min_lat + (row + 1) * step_lat,
+            )
+            for row in range(rows) for col in range(cols)
+        ]
+
+    def _specs(self) -> list:
+        regions = [(None, poly) for poly in self.polygons] if self.polygons else [(box, None) for box in self.tiles()]
+        specs = []
+        for index, (box, poly) in enumerate(regions):
+            folder = os.path.join(self.folder_work, f"shard_{index:03d}")
+            os.makedirs(folder, exist_ok=True)
+            specs.append({
+                "index": index,
+                "input_file": self.input_file,
+                "base_path_in": self.base_path_in,
+                "type_osm_in": self.type_osm_in,
+                "folder": folder,
+                "bbox": box,
+                "poly": poly,
+                "apply_filter": self.apply_filter,
+                "file_bin": self.file_bin,
+                "hash_memory": self.hash_memory,
+                "convert_timeout": self.convert_timeout,
+                "filter_timeout": self.filter_timeout,
+                "profile": self.profile,
+            })
+        return specs
+
+    def run(self) -> str:
+        """
+        Processa os shards em paralelo e une o resultado em `output_file`.
+        Returns:
+            str: Caminho do PBF unido.
+        Raises:
+            subprocess.CalledProcessError: Se o osmconvert/osmfilter falhar em algum shard;
+            os demais shards em andamento são concluídos antes do erro ser propagado.
+            subprocess.TimeoutExpired: Se passar de `convert_timeout`/`filter_timeout`.
+        """
+        shutil.rmtree(self.folder_work, ignore_errors=True)
+        specs   = self._specs()
+        t_start = time.time()
+        results = []
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(_process_shard, spec) for spec in specs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f"[shard {result['index']:03d}] concluído em {result['elapsed']:.1f}s")
+        self.report = sorted(results, key=lambda result: result["index"])
+
+        # UNE OS SHARDS; IDS REPETIDOS NAS BORDAS SAO GRAVADOS UMA UNICA VEZ
+        os.makedirs(os.path.dirname(self.output_file) or ".", exist_ok=True)
+        OSMC = self._converter(self.folder_work, "o5m", os.path.splitext(self.output_file)[1].lstrip(".") or "pbf")
+        OSMC.merge([result["path"] for result in self.report], self.output_file)
+        print(f"{len(specs)} shards unidos em {time.time() - t_start:.1f}s: {self.output_file}")
+
+        if not self.keep_shards:
+            shutil.rmtree(self.folder_work, ignore_errors=True)
+        return self.output_file
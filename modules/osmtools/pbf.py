@@ -0,0 +1,210 @@
+"""
+Leitura e escrita de baixo nível do formato OSM PBF, sem dependência de protobuf.
+
+O arquivo é uma sequência de (tamanho int32 big-endian, BlobHeader, Blob). Cada Blob
+de dados guarda um PrimitiveBlock comprimido com zlib. Apenas os campos usados pelos
+filtros são decodificados; o restante das mensagens é copiado byte a byte.
+Referência: https://wiki.openstreetmap.org/wiki/PBF_Format
+"""
+from typing import Iterator, Optional
+import numpy as np
+import struct
+import zlib
+
+WIRE_VARINT     = 0
+WIRE_64BIT      = 1
+WIRE_BYTES      = 2
+WIRE_32BIT      = 5
+
+
+def read_varint(buf: bytes, pos: int) -> tuple:
+    """
+    Lê um varint a partir de `pos`.
+    Returns:
+        tuple: (valor, nova posição).
+    """
+    result, shift = 0, 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_varint(value: int) -> bytes:
+    """
+    Codifica um inteiro não negativo como varint.
+    """
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def iter_fields(buf: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[tuple]:
+    """
+    Percorre os campos de uma mensagem protobuf.
+    Yields:
+        tuple: (número do campo, wire type, valor, início do campo, fim do campo). Para
+        WIRE_BYTES o valor é o intervalo (início, fim) do conteúdo, sem cópia.
+    """
+    pos = start
+    end = len(buf) if end is None else end
+    while pos < end:
+        field_start = pos
+        key, pos    = read_varint(buf, pos)
+        number, wire = key >> 3, key & 0x07
+        if wire == WIRE_VARINT:
+            value, pos = read_varint(buf, pos)
+        elif wire == WIRE_BYTES:
+            size, pos = read_varint(buf, pos)
+            value = (pos, pos + size)
+            pos += size
+        elif wire == WIRE_64BIT:
+            value = buf[pos:pos + 8]
+            pos += 8
+        elif wire == WIRE_32BIT:
+            value = buf[pos:pos + 4]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type: {wire}")
+        yield number, wire, value, field_start, pos
+
+
+def field_bytes(number: int, payload: bytes) -> bytes:
+    """
+    Codifica um campo length-delimited (tag + tamanho + conteúdo).
+    """
+    return encode_varint((number << 3) | WIRE_BYTES) + encode_varint(len(payload)) + payload
+
+
+def field_varint(number: int, value: int) -> bytes:
+    """
+    Codifica um campo varint (tag + valor).
+    """
+    return encode_varint((number << 3) | WIRE_VARINT) + encode_varint(value)
+
+
+def decode_packed(buf, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+    """
+    Decodifica um campo packed de varints de forma vetorizada.
+    Returns:
+        np.ndarray: Valores como uint64 (sem zigzag).
+    """
+    data = np.frombuffer(buf, dtype=np.uint8, count=(len(buf) if end is None else end) - start, offset=start)
+    if data.size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends    = np.flatnonzero(data < 0x80)
+    starts  = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    group   = np.repeat(np.arange(ends.size), ends - starts + 1)
+    shift   = (np.arange(data.size) - starts[group]) * 7
+    parts   = (data & 0x7F).astype(np.uint64) << shift.astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def encode_packed(values: np.ndarray) -> bytes:
+    """
+    Codifica valores não negativos (uint64) como varints packed, de forma vetorizada.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if values.size == 0:
+        return b""
+    sizes   = np.ones(values.size, dtype=np.int64)
+    for k in range(1, 10):
+        sizes += values >= np.uint64(1 << (7 * k))
+    offsets = np.repeat(np.cumsum(sizes) - sizes, sizes)
+    index   = np.arange(offsets.size) - offsets
+    value   = np.repeat(values, sizes)
+    out     = ((value >> (index * 7).astype(np.uint64)) & np.uint64(0x7F)).astype(np.uint8) | 0x80
+    # O ULTIMO BYTE DE CADA VALOR NAO TEM O BIT DE CONTINUACAO
+    out[np.cumsum(sizes) - 1] &= 0x7F
+    return out.tobytes()
+
+
+def zigzag_decode(values: np.ndarray) -> np.ndarray:
+    """
+    Converte valores sint64 (zigzag) para int64.
+    """
+    values = values.astype(np.uint64)
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def zigzag_encode(values: np.ndarray) -> np.ndarray:
+    """
+    Converte int64 para a representação sint64 (zigzag).
+    """
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def iter_blobs(path: str) -> Iterator[tuple]:
+    """
+    Percorre os blobs do arquivo sem ler seus dados.
+    Yields:
+        tuple: (tipo do blob, posição do Blob no arquivo, tamanho do Blob).
+    """
+    with open(path, "rb") as file:
+        while True:
+            size = file.read(4)
+            if len(size) < 4:
+                return
+            header = file.read(struct.unpack(">I", size)[0])
+            blob_type, datasize = None, 0
+            for number, _, value, _, _ in iter_fields(header):
+                if number == 1:
+                    blob_type = header[value[0]:value[1]].decode("utf-8")
+                elif number == 3:
+                    datasize = value
+            offset = file.tell()
+            yield blob_type, offset, datasize
+            file.seek(offset + datasize)
+
+
+def read_blob(path: str, offset: int, size: int) -> bytes:
+    """
+    Lê e descomprime um Blob.
+    Returns:
+        bytes: O conteúdo (HeaderBlock ou PrimitiveBlock).
+    Raises:
+        ValueError: Se o blob usar uma compressão não suportada (lzma, zstd...).
+    """
+    with open(path, "rb") as file:
+        file.seek(offset)
+        blob = file.read(size)
+    for number, _, value, _, _ in iter_fields(blob):
+        if number == 1:
+            return blob[value[0]:value[1]]
+        if number == 3:
+            return zlib.decompress(blob[value[0]:value[1]])
+    raise ValueError("Unsupported PBF blob compression")
+
+
+def read_raw_blob(path: str, offset: int, size: int) -> bytes:
+    """
+    Lê um Blob sem descomprimir, para copiá-lo como está.
+    """
+    with open(path, "rb") as file:
+        file.seek(offset)
+        return file.read(size)
+
+
+def frame_blob(blob_type: str, blob: bytes) -> bytes:
+    """
+    Monta o registro completo de um Blob já serializado (tamanho + BlobHeader + Blob).
+    """
+    header = field_bytes(1, blob_type.encode("utf-8")) + field_varint(3, len(blob))
+    return struct.pack(">I", len(header)) + header + blob
+
+
+def encode_blob(blob_type: str, data: bytes, level: int = 6) -> bytes:
+    """
+    Comprime um bloco com zlib e monta o seu registro completo.
+    """
+    blob = field_varint(2, len(data)) + field_bytes(3, zlib.compress(data, level))
+    return frame_blob(blob_type, blob)
@@ -0,0 +1,257 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from modules.osmtools import pbf
+import numpy as np
+import time
+import os
+
+# CONJUNTO DE NOS CARREGADO UMA VEZ POR PROCESSO DO POOL (MEMORY-MAPPED)
+_NODES_CACHE: dict = {}
+
+
+def _block_layout(data: bytes) -> tuple:
+    """
+    Separa um PrimitiveBlock em tabela de strings, grupos e demais campos (granularidade,
+    offsets), estes copiados como estão.
+    """
+    table, strings, groups, extra = b"", [], [], b""
+    for number, _, value, start, end in pbf.iter_fields(data):
+        if number == 1:
+            strings = [data[s_start:s_end] for n, _, (s_start, s_end), _, _ in pbf.iter_fields(data, *value) if n == 1]
+            table = data[start:end]
+        elif number == 2:
+            groups.append(value)
+        else:
+            extra += data[start:end]
+    return table, strings, groups, extra
+
+
+def _way_refs(data: bytes, start: int, end: int, key_index: int) -> Optional[tuple]:
+    """
+    Retorna o intervalo (início, fim) do campo `refs` de uma Way que tenha a chave
+    `key_index`, ou None se não tiver.
+    """
+    has_key, refs = False, (start, start)
+    for number, _, value, _, _ in pbf.iter_fields(data, start, end):
+        if number == 2:
+            pos, stop = value
+            while pos < stop and not has_key:
+                key, pos = pbf.read_varint(data, pos)
+                has_key = key == key_index
+        elif number == 8:
+            refs = value
+    return refs if has_key else None
+
+
+def _decode_refs(data: bytes, ranges: list) -> np.ndarray:
+    """
+    Decodifica os `refs` (delta sint64) de várias vias de uma só vez: os trechos são
+    concatenados, decodificados juntos e a soma acumulada é reiniciada em cada via.
+    """
+    chunks  = [data[start:end] for start, end in ranges]
+    buf     = b"".join(chunks)
+    if not buf:
+        return np.zeros(0, dtype=np.int64)
+    deltas  = pbf.zigzag_decode(pbf.decode_packed(buf))
+    # VIA DE CADA VALOR, PELA POSICAO DO SEU ULTIMO BYTE
+    limits  = np.cumsum([len(chunk) for chunk in chunks])
+    owner   = np.searchsorted(limits, np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) < 0x80), side="right")
+    total   = np.cumsum(deltas)
+    first   = np.flatnonzero(np.diff(owner, prepend=-1))
+    base    = np.repeat(total[first] - deltas[first], np.diff(np.append(first, owner.size)))
+    return total - base
+
+
+def _scan_ways(args: tuple) -> np.ndarray:
+    """
+    Passo 1: nós referenciados pelas vias com a chave procurada, em um bloco.
+    """
+    path, offset, size, key = args
+    data = pbf.read_blob(path, offset, size)
+    _, strings, groups, _ = _block_layout(data)
+    if key not in strings:
+        return np.zeros(0, dtype=np.int64)
+    key_index = strings.index(key)
+    ranges = []
+    for g_start, g_end in groups:
+        for number, _, value, _, _ in pbf.iter_fields(data, g_start, g_end):
+            if number == 3:
+                refs = _way_refs(data, value[0], value[1], key_index)
+                if refs is not None:
+                    ranges.append(refs)
+    return np.unique(_decode_refs(data, ranges)) if ranges else np.zeros(0, dtype=np.int64)
+
+
+def _contains(nodes: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    if nodes.size == 0:
+        return np.zeros(ids.size, dtype=bool)
+    pos = np.minimum(np.searchsorted(nodes, ids), nodes.size - 1)
+    return nodes[pos] == ids
+
+
+def _filter_dense(data: bytes, start: int, end: int, nodes: np.ndarray) -> tuple:
+    """
+    Mantém os nós de um DenseNodes que estão no conjunto; descarta o DenseInfo.
+    Returns:
+        tuple: (DenseNodes serializado ou b"", quantidade de nós mantidos).
+    """
+    fields = {}
+    for number, _, value, _, _ in pbf.iter_fields(data, start, end):
+        if number in (1, 8, 9, 10):
+            fields[number] = value
+    if 1 not in fields:
+        return b"", 0
+    ids     = np.cumsum(pbf.zigzag_decode(pbf.decode_packed(data, *fields[1])))
+    lat     = np.cumsum(pbf.zigzag_decode(pbf.decode_packed(data, *fields[8])))
+    lon     = np.cumsum(pbf.zigzag_decode(pbf.decode_packed(data, *fields[9])))
+    keep    = _contains(nodes, ids)
+    if not keep.any():
+        return b"", 0
+
+    def delta(values: np.ndarray) -> bytes:
+        return pbf.encode_packed(pbf.zigzag_encode(np.diff(values, prepend=0)))
+
+    out = pbf.field_bytes(1, delta(ids[keep]))
+    out += pbf.field_bytes(8, delta(lat[keep])) + pbf.field_bytes(9, delta(lon[keep]))
+    if 10 in fields:
+        # keys_vals: PARES (CHAVE, VALOR) DE CADA NO, SEPARADOS POR 0
+        keys_vals   = pbf.decode_packed(data, *fields[10])
+        owner       = np.cumsum(keys_vals == 0) - (keys_vals == 0)
+        out += pbf.field_bytes(10, pbf.encode_packed(keys_vals[keep[owner]]))
+    return out, int(keep.sum())
+
+
+def _filter_block(args: tuple) -> tuple:
+    """
+    Passo 2: reescreve um bloco só com as vias com a chave e os nós do conjunto.
+    Returns:
+        tuple: (registro do blob filtrado ou b"", nós mantidos, vias mantidas).
+    """
+    path, offset, size, key, path_nodes = args
+    if path_nodes not in _NODES_CACHE:
+        _NODES_CACHE.clear()
+        _NODES_CACHE[path_nodes] = np.load(path_nodes, mmap_mode="r")
+    nodes = _NODES_CACHE[path_nodes]
+
+    data = pbf.read_blob(path, offset, size)
+    table, strings, groups, extra = _block_layout(data)
+    key_index   = strings.index(key) if key in strings else -1
+    kept_groups = b""
+    count_nodes = count_ways = 0
+    for g_start, g_end in groups:
+        group = b""
+        for number, _, value, start, end in pbf.iter_fields(data, g_start, g_end):
+            if number == 1:
+                node_id = next(v for n, _, v, _, _ in pbf.iter_fields(data, *value) if n == 1)
+                node_id = (node_id >> 1) ^ -(node_id & 1)
+                if _contains(nodes, np.array([node_id], dtype=np.int64))[0]:
+                    group += data[start:end]
+                    count_nodes += 1
+            elif number == 2:
+                dense, kept = _filter_dense(data, value[0], value[1], nodes)
+                if kept:
+                    group += pbf.field_bytes(2, dense)
+                    count_nodes += kept
+            elif number == 3 and key_index > 0:
+                if _way_refs(data, value[0], value[1], key_index) is not None:
+                    group += data[start:end]
+                    count_ways += 1
+            # RELACOES E CHANGESETS SAO DESCARTADOS
+        if group:
+            kept_groups += pbf.field_bytes(2, group)
+    if not kept_groups:
+        return b"", 0, 0
+    return pbf.encode_blob("OSMData", table + kept_groups + extra), count_nodes, count_ways
+
+
+class PBFHighwayFilter:
+    """
+    Filtro nativo de PBF, alternativa ao caminho OSMConvert (pbf -> o5m) + OSMfilter +
+    OSMConvert (o5m -> pbf).
+
+    Lê os blobs do PBF diretamente e processa os blocos em um `ProcessPoolExecutor`, em dois
+    passos: o primeiro coleta os nós referenciados pelas vias com a chave (`highway`), que
+    ficam em um array NumPy ordenado em disco, compartilhado pelos processos por mmap; o
+    segundo reescreve cada bloco só com essas vias e esses nós. Relações e metadados
+    (autor, versão) são descartados, como nas opções usadas no make_router.
+
+    Atributos:
+        input_file (str): PBF de entrada.
+        output_file (str): PBF filtrado.
+        key (str): Chave mantida nas vias.
+        max_workers (int): Processos do pool.
+        folder_work (str): Pasta do array de nós.
+        report (dict): Contagens e tempos da última execução.
+    Exemplo:
+        PBFHighwayFilter(
+            "data/external/pbf/brazil-latest.osm.pbf",
+            "data/processed/pbf/brazil-latest.osm.filtered.streets.pbf",
+        ).run()
+    """
+    def __init__(self,
+            input_file: str,
+            output_file: str,
+            key: str                    = "highway",
+            max_workers: Optional[int]  = None,
+            folder_work: str            = os.path.join("data","interim","pbf_filter")
+        ):
+        if not os.path.exists(input_file):
+            raise FileExistsError(f"input_file not exists: {input_file}")
+        self.input_file     = input_file
+        self.output_file    = output_file
+        self.key            = key
+        self.max_workers    = max(1, max_workers or os.cpu_count() or 1)
+        self.folder_work    = folder_work
+        self.report         = {}
+
+    def run(self) -> str:
+        """
+        Executa os dois passos e grava o PBF filtrado.
+        Returns:
+            str: Caminho do PBF filtrado.
+        Raises:
+            ValueError: Se o arquivo usar uma compressão de blob não suportada.
+        """
+        key     = self.key.encode("utf-8")
+        blobs   = list(pbf.iter_blobs(self.input_file))
+        data    = [(offset, size) for blob_type, offset, size in blobs if blob_type == "OSMData"]
+        chunks  = max(1, len(data) // (self.max_workers * 4))
+        os.makedirs(self.folder_work, exist_ok=True)
+        path_nodes = os.path.join(self.folder_work, f"{os.path.basename(self.output_file)}.nodes.npy")
+
+        t_start = time.time()
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            # PASSO 1: NOS DAS VIAS
+            found = list(executor.map(_scan_ways, [(self.input_file, o, s, key) for o, s in data], chunksize=chunks))
+            nodes = np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+            np.save(path_nodes, nodes)
+            del found
+            t_scan = time.time() - t_start
+
+            # PASSO 2: REESCRITA DOS BLOCOS, GRAVADOS NA ORDEM ORIGINAL
+            os.makedirs(os.path.dirname(self.output_file) or ".", exist_ok=True)
+            path_tmp = f"{self.output_file}.part"
+            count_nodes = count_ways = 0
+            with open(path_tmp, "wb") as file:
+                for blob_type, offset, size in blobs:
+                    if blob_type == "OSMHeader":
+                        file.write(pbf.frame_blob(blob_type, pbf.read_raw_blob(self.input_file, offset, size)))
+                        break
+                tasks = [(self.input_file, o, s, key, path_nodes) for o, s in data]
+                for record, kept_nodes, kept_ways in executor.map(_filter_block, tasks, chunksize=chunks):
+                    file.write(record)
+                    count_nodes += kept_nodes
+                    count_ways  += kept_ways
+            os.replace(path_tmp, self.output_file)
+
+        os.remove(path_nodes)
+        self.report = {
+            "blocks": len(data),
+            "nodes": count_nodes,
+            "ways": count_ways,
+            "scan_seconds": round(t_scan, 3),
+            "total_seconds": round(time.time() - t_start, 3),
+            "output_bytes": os.path.getsize(self.output_file),
+        }
+        print(f"Filtro nativo: {count_ways} vias, {count_nodes} nós em {self.report['total_seconds']}s")
+        return self.output_file
@@ -0,0 +1,113 @@
+"""
+Índices espaciais R*Tree do SpatiaLite nas tabelas do roteador e busca do nó mais próximo
+(snapping de origem/destino) por meio deles.
+"""
+from modules.osmtools.spatialite_sql import SpatialiteSQL
+from typing import Optional
+
+# O FILTRO PELA R*TREE (TABELA VIRTUAL SpatialIndex) SUBSTITUI O X()/Y() QUE LIA TODA A TABELA
+SNAP_SQL = """
+SELECT node_id, ST_Distance(MakePoint(:lon, :lat), geometry) AS dist
+FROM roads_nodes
+WHERE ROWID IN (
+    SELECT ROWID FROM SpatialIndex
+    WHERE f_table_name = 'roads_nodes' AND f_geometry_column = 'geometry'
+      AND search_frame = BuildMbr(:lon - :box, :lat - :box, :lon + :box, :lat + :box)
+)
+ORDER BY dist ASC
+LIMIT 1
+"""
+
+class SpatialIndexManager:
+    """
+    Cria as R*Trees (`CreateSpatialIndex`) de `roads_nodes.geometry` e `roads.geometry`
+    depois da construção do banco e localiza o nó mais próximo de um ponto.
+
+    Índices B-tree em colunas BLOB de geometria não ajudam em buscas espaciais; a R*Tree
+    guarda o retângulo de cada geometria e a tabela virtual `SpatialIndex` devolve só os
+    ROWIDs que cruzam a janela de busca. A janela começa pequena e é ampliada até achar um
+    nó; como a distância ao nó achado pode passar da janela (um nó no canto), a busca é
+    refeita uma vez com a janela do tamanho dessa distância, o que garante o mais próximo.
+
+    Atributos:
+        sql (SpatialiteSQL): Conexão ao banco, com `mod_spatialite` carregado.
+        tables (tuple): Pares (tabela, coluna) indexados por `ensure`.
+        box (float): Meia largura inicial da janela de busca, em graus.
+        max_box (float): Meia largura máxima; acima dela o ponto é considerado fora da malha.
+    Exemplo:
+        with SpatialiteSQL("data/processed/streets/streets.sqlite") as SQL:
+            INDEX = SpatialIndexManager(SQL)
+            INDEX.ensure()
+            node_id, dist = INDEX.nearest(-49.2717158, -16.7802859)
+    """
+    tables  = (("roads_nodes", "geometry"), ("roads", "geometry"))
+
+    def __init__(self, sql: SpatialiteSQL, box: float = 0.005, max_box: float = 1.0):
+        if not 0 < box <= max_box:
+            raise ValueError("box must be positive and at most max_box")
+        self.sql        = sql
+        self.box        = box
+        self.max_box    = max_box
+
+    def _spatial(self) -> SpatialiteSQL:
+        self.sql.connect()
+        if not self.sql.spatial:
+            raise RuntimeError("Spatial indexes need mod_spatialite loaded in the connection")
+        return self.sql
+
+    def enabled(self, table: str, column: str = "geometry") -> bool:
+        """
+        Informa se a geometria já tem R*Tree (`geometry_columns.spatial_index_enabled`).
+        """
+        rows = self._spatial().query(
+            "SELECT spatial_index_enabled FROM geometry_columns "
+            "WHERE Lower(f_table_name) = Lower(?) AND Lower(f_geometry_column) = Lower(?)",
+            (table, column),
+        )
+        return bool(rows) and rows[0][0] == 1
+
+    def create(self, table: str, column: str = "geometry") -> bool:
+        """
+        Cria a R*Tree da geometria, se ainda não existir.
+        Returns:
+            bool: True se o índice foi criado agora; False se já existia.
+        Raises:
+            RuntimeError: Se o SpatiaLite recusar (ex.: geometria não registrada em
+                `geometry_columns`).
+        """
+        if self.enabled(table, column):
+            return False
+        rows = self._spatial().execute(["SELECT CreateSpatialIndex(?, ?)"], (table, column))
+        if not rows or rows[0][0] != 1:
+            raise RuntimeError(f"CreateSpatialIndex failed for {table}.{column}")
+        print(f"R*Tree criada: {table}.{column}")
+        return True
+
+    def ensure(self) -> list:
+        """
+        Cria as R*Trees de todas as `tables` que ainda não têm.
+        Returns:
+            list: As tabelas indexadas nesta chamada.
+        """
+        return [table for table, column in self.tables if self.create(table, column)]
+
+    def nearest(self, lon: float, lat: float) -> Optional[tuple]:
+        """
+        Nó de `roads_nodes` mais próximo do ponto.
+        Returns:
+            tuple ou None: (node_id, distância em graus), ou None se não houver nó a até
+            `max_box` graus.
+        """
+        SQL = self._spatial()
+        box = self.box
+        while True:
+            rows = SQL.query(SNAP_SQL, {"lon": lon, "lat": lat, "box": box})
+            if rows:
+                node_id, dist = rows[0]
+                if dist > box:
+                    # O NO ACHADO PODE ESTAR NO CANTO: REFAZ COM A JANELA DO TAMANHO DA DISTANCIA
+                    node_id, dist = SQL.query(SNAP_SQL, {"lon": lon, "lat": lat, "box": dist})[0]
+                return node_id, dist
+            if box >= self.max_box:
+                return None
+            box = min(box * 4, self.max_box)
@@ -2,7 +2,13 @@
 Módulo para integração com os executáveis Spatialite.
 Cria uma classe para cada .exe em spatialite/tools, seguindo SOLID.
 """
+from modules.pipeline.process_runner import ProcessRunner
+from modules.osmtools.memory_plan import MemoryPlanner
+from typing import Iterable, Optional
 import subprocess
+import asyncio
+import sqlite3
+import shutil
 import os
 # from modules.logger.logger_factory import LoggerFactory
 
@@ -10,10 +16,86 @@ TOOLS_PATH = os.path.join(# os.path.dirname(__file__)
     "modules", "osmtools", "bin", "Windows", "spatialite", "tools"
 )
 
+def building_path(db_path: str) -> str:
+    """
+    Caminho temporário onde o banco é construído antes de ser publicado em `db_path`
+    (na mesma pasta, para que a troca seja um rename atômico).
+    """
+    return f"{db_path}.building"
+
+
+def verify_database(path: str, tables: Iterable[str] = (), non_empty: Iterable[str] = ()) -> None:
+    """
+    Verifica um banco recém-construído: integridade (`PRAGMA quick_check`), existência das
+    tabelas e presença de linhas nas tabelas de dados.
+    Args:
+        path (str): Banco a verificar (aberto somente para leitura).
+        tables (Iterable[str]): Tabelas (ou tabelas virtuais) que precisam existir.
+        non_empty (Iterable[str]): Tabelas comuns que precisam ter ao menos uma linha.
+    Raises:
+        FileNotFoundError: Se o banco não existir.
+        RuntimeError: Se a verificação falhar.
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Database not found: {path}")
+    tables, non_empty = list(tables), list(non_empty)
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        check = connection.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise RuntimeError(f"Database check failed for {path}: {check}")
+        names   = {row[0] for row in connection.execute("SELECT name FROM sqlite_master")}
+        missing = [table for table in tables + non_empty if table not in names]
+        if missing:
+            raise RuntimeError(f"Missing tables in {path}: {', '.join(missing)}")
+        empty   = [table for table in non_empty if connection.execute(f'SELECT 1 FROM "{table}" LIMIT 1').fetchone() is None]
+        if empty:
+            raise RuntimeError(f"Empty tables in {path}: {', '.join(empty)}")
+    finally:
+        connection.close()
+
+
+def publish_database(path_build: str, db_path: str, tables: Iterable[str] = (), non_empty: Iterable[str] = ()) -> str:
+    """
+    Verifica o banco construído em `path_build` e o coloca em `db_path` com um rename
+    atômico: quem lê `db_path` vê o banco anterior inteiro ou o novo inteiro, nunca um
+    banco pela metade.
+    Returns:
+        str: `db_path`.
+    Raises:
+        RuntimeError: Se a verificação falhar; `db_path` não é alterado.
+    """
+    verify_database(path_build, tables, non_empty)
+    with open(path_build, "rb+") as file:
+        os.fsync(file.fileno())
+    os.replace(path_build, db_path)
+    for suffix in ("-journal", "-wal", "-shm"):
+        if os.path.exists(path_build + suffix):
+            os.remove(path_build + suffix)
+    print(f"Banco publicado: {db_path}")
+    return db_path
+
+
+def _remove_database(path: str) -> None:
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
 class SpatialiteBase:
     """
     Classe base para execução de binários spatialite.
+
+    Atributos:
+        output_flags (tuple): Flags cujo valor é o banco gerado/alterado pela ferramenta;
+            usados como saída (e estado de entrada) no cache de artefatos.
+        artifact_store (ArtifactStore ou None): Cache de artefatos; desativado por padrão.
+        telemetry (dict): Memória, CPU e E/S da última execução (`ProcessRunner.summary`).
+        timeout (float ou None): Segundos até `run`/`run_async` encerrarem a ferramenta;
+            None = sem limite.
     """
+    output_flags = ("-d", "--db-path")
+
     def __init__(self, exe_name: str):
         """
         Inicializa a classe base com o caminho do executável e configura o logger.
@@ -23,45 +105,122 @@ class SpatialiteBase:
             FileNotFoundError: Se o executável não for encontrado no caminho esperado.
         """
         self.exe_path = os.path.join(TOOLS_PATH, exe_name)
+        self.artifact_store = None
+        self.telemetry = {}
+        self.timeout = None
         # self.logger = LoggerFactory().get_logger(self.__class__.__name__)
         if not os.path.exists(self.exe_path):
             raise FileNotFoundError(f"Executable not found: {self.exe_path}")
 
-    def run(self, args: list, capture_output=True, check=True, **kwargs):
+    def _artifact_files(self, args: list) -> tuple:
         """
-        Executa o binário com os argumentos fornecidos via subprocess.
+        Separa os arquivos de entrada e de saída dos argumentos para o cache de artefatos.
+        Args:
+            args (list): Lista de argumentos do executável.
+        Returns:
+            tuple: (entradas, saídas). O banco de saída também é entrada, pois a ferramenta
+            escreve dentro dele e o resultado depende do seu estado anterior.
+        """
+        outputs = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg in self.output_flags]
+        inputs  = [arg for arg in args if os.path.isfile(arg) and arg not in outputs]
+        return inputs + outputs, outputs
+
+    def _prepare_run(self, args: list) -> tuple:
+        """
+        Monta o comando e procura a execução no cache de artefatos.
+        Returns:
+            tuple: (comando, chave do artefato ou None, bancos de saída, resultado pronto
+            quando o artefato foi reaproveitado ou None).
+        """
+        cmd = [self.exe_path] + args
+        print(f"Running command: {' '.join(cmd)}")
+        # self.logger.info(f"Running: {' '.join(cmd)}")
+
+        # O banco é alterado no lugar pelas etapas seguintes: sempre copia, nunca hardlink
+        key, outputs = None, []
+        if self.artifact_store is not None:
+            inputs, outputs = self._artifact_files(args)
+            if outputs:
+                key = self.artifact_store.key(self.exe_path, cmd, inputs, outputs)
+                if self.artifact_store.fetch(key, outputs, link=False):
+                    print(f"Artefato reaproveitado: {', '.join(outputs)}")
+                    return cmd, key, outputs, subprocess.CompletedProcess(cmd, 0, stdout="", stderr="")
+        return cmd, key, outputs, None
+
+    def _finish_run(self, runner, result, key, outputs, capture_output):
+        self.telemetry = runner.summary
+        if key is not None and result.returncode == 0:
+            self.artifact_store.save(key, outputs, link=False)
+        if capture_output:
+            print(f"stdout: {result.stdout}")
+        # self.logger.info(f"stdout: {result.stdout}")
+        if capture_output and result.stderr:
+            print(f"stderr: {result.stderr}")
+            # self.logger.error(f"stderr: {result.stderr}")
+        return result
+
+    def run(self, args: list, capture_output=True, check=True, timeout=None, **kwargs):
+        """
+        Executa o binário com os argumentos fornecidos via `ProcessRunner`, que repassa a
+        saída ao logger linha a linha e mede memória, CPU e E/S do processo.
+        Com `artifact_store` definido, reaproveita o banco de uma execução idêntica anterior
+        (mesmo conteúdo de entrada, executável e argumentos) em vez de executar.
         Args:
             args (list, opcional): Lista de argumentos para passar ao executável.
-            capture_output (bool, opcional): Se True, captura stdout/stderr.
+            capture_output (bool, opcional): Se True, imprime stdout/stderr ao final (a saída
+                é sempre repassada ao logger durante a execução).
             check (bool, opcional): Se True, lança exceção em erro de execução.
-            **kwargs: Parâmetros adicionais para subprocess.run.
+            timeout (float, opcional): Segundos até a árvore de processos ser encerrada;
+                None usa o atributo `timeout`.
+            **kwargs: Parâmetros adicionais para subprocess.Popen.
         Returns:
             subprocess.CompletedProcess: Resultado da execução do subprocess.
         Raises:
             subprocess.CalledProcessError: Se o comando retornar código 
             diferente de zero e check=True.
+            subprocess.TimeoutExpired: Se o comando passar do `timeout`.
         """
-        cmd = [self.exe_path] + args
-        print(f"Running command: {' '.join(cmd)}")
-        # self.logger.info(f"Running: {' '.join(cmd)}")
-        try:
-            result = subprocess.run(
-                cmd,
-                capture_output=capture_output,
-                check=check,
-                text=True,
-                **kwargs
-            )
-            print(f"stdout: {result.stdout}")
-            # self.logger.info(f"stdout: {result.stdout}")
-            if result.stderr:
-                print(f"stderr: {result.stderr}")
-                # self.logger.error(f"stderr: {result.stderr}")
+        cmd, key, outputs, result = self._prepare_run(args)
+        if result is not None:
             return result
-        except subprocess.CalledProcessError as e:
+        runner = ProcessRunner(os.path.basename(self.exe_path))
+        try:
+            result = runner.run(cmd, check=check, timeout=timeout or self.timeout, **kwargs)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            # A FALHA E REPASSADA: UMA ETAPA COM ERRO NAO PODE SER DADA COMO CONCLUIDA
             print(f"Error executing {self.exe_path}: {e}")
             # self.logger.error(f"Execution failed: {e}")
-            #raise
+            self.telemetry = runner.summary
+            raise
+        return self._finish_run(runner, result, key, outputs, capture_output)
+
+    async def run_async(self, args: list, capture_output=True, check=True, timeout=None, limit=None, **kwargs):
+        """
+        Variante assíncrona de `run`, para orquestrar várias ferramentas (regiões, tabelas
+        de rede) em um único event loop. Cancelar a tarefa encerra a árvore de processos.
+        Args:
+            limit (asyncio.Semaphore, opcional): Vagas compartilhadas que limitam quantas
+                ferramentas rodam ao mesmo tempo.
+            Demais: como em `run` (`kwargs` vão para `asyncio.create_subprocess_exec`).
+        Returns:
+            subprocess.CompletedProcess: Resultado da execução do subprocess.
+        Raises:
+            subprocess.CalledProcessError: Se o comando falhar e check=True.
+            subprocess.TimeoutExpired: Se o comando passar do `timeout`.
+            asyncio.CancelledError: Se a tarefa for cancelada.
+        """
+        # O HASH DAS ENTRADAS NO CACHE DE ARTEFATOS LE O DISCO: FORA DO EVENT LOOP
+        cmd, key, outputs, result = await asyncio.to_thread(self._prepare_run, args)
+        if result is not None:
+            return result
+        runner = ProcessRunner(os.path.basename(self.exe_path))
+        try:
+            result = await runner.run_async(cmd, check=check, timeout=timeout or self.timeout, limit=limit, **kwargs)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            print(f"Error executing {self.exe_path}: {e}")
+            self.telemetry = runner.summary
+            raise
+        return await asyncio.to_thread(self._finish_run, runner, result, key, outputs, capture_output)
 
 # Classes específicas para cada .exe
 class SpatialiteXmlValidator(SpatialiteBase):
@@ -287,6 +446,57 @@ class SpatialiteOsmNet(SpatialiteBase):
     def __init__(self):
         super().__init__("spatialite_osm_net.exe")
 
+    def build(self,
+            osm_path: str,
+            db_path: str,
+            table: str                  = "roads",
+            in_memory: Optional[bool]   = None,
+            cache_size: Optional[int]   = None,
+            journal_off: bool           = True,
+            publish: bool               = True,
+            extra_args: Iterable[str]   = ()
+        ) -> str:
+        """
+        Modo de construção rápida: gera o banco em `building_path(db_path)`, em memória
+        (`-m`) ou em disco sem journal (`-jo`), com o cache (`-cs`) dimensionado pela RAM
+        disponível, e só então o publica em `db_path`.
+        Args:
+            osm_path (str): PBF filtrado.
+            db_path (str): Banco final.
+            table (str): Tabela de vias.
+            in_memory (bool, opcional): Usa `-m`; None decide pelo `MemoryPlanner` (se o
+                banco estimado cabe na memória).
+            cache_size (int, opcional): Páginas de cache; None usa o `MemoryPlanner`.
+            journal_off (bool): Usa `-jo`; seguro aqui, pois uma falha só perde o arquivo
+                temporário.
+            publish (bool): Verifica e publica em `db_path` ao final; False deixa o banco em
+                `building_path(db_path)` para as etapas seguintes (índices, redes).
+            extra_args (Iterable[str]): Argumentos adicionais do spatialite_osm_net.
+        Returns:
+            str: Caminho do banco gerado (`db_path` ou o temporário).
+        Raises:
+            subprocess.CalledProcessError: Se a ferramenta falhar.
+            RuntimeError: Se o banco gerado não passar na verificação.
+        """
+        plan = MemoryPlanner().spatialite(osm_path)
+        if in_memory is None:
+            in_memory = plan["in_memory"]
+        path_build = building_path(db_path)
+        os.makedirs(os.path.dirname(path_build) or ".", exist_ok=True)
+        _remove_database(path_build)
+
+        args = ["-o", osm_path, "-T", table, "-d", path_build, "-cs", str(cache_size or plan["cache_size"])]
+        if in_memory:
+            args.append("-m")
+        if journal_off:
+            args.append("-jo")
+        self.run(args=args + list(extra_args))
+
+        if not publish:
+            verify_database(path_build, non_empty=[table])
+            return path_build
+        return publish_database(path_build, db_path, non_empty=[table])
+
     def help(self):
         """
         Exibe a ajuda do executável.
@@ -380,6 +590,32 @@ class SpatialiteNetwork(SpatialiteBase):
     def __init__(self):
         super().__init__("spatialite_network.exe")
 
+    def build(self, db_path: str, args: list, tables: Iterable[str] = (), publish: bool = True) -> str:
+        """
+        Gera as tabelas de rede sem expor um banco pela metade: roda sobre
+        `building_path(db_path)` (o deixado por `SpatialiteOsmNet.build(publish=False)` ou
+        uma cópia do banco publicado), verifica `tables` e publica em `db_path`.
+        Args:
+            db_path (str): Banco final.
+            args (list): Argumentos do spatialite_network, sem `-d`.
+            tables (Iterable[str]): Tabelas que precisam existir ao final (ex.: a tabela de
+                dados e a virtual da rede).
+            publish (bool): False mantém o banco em construção para outras redes.
+        Returns:
+            str: Caminho do banco (`db_path` ou o temporário).
+        Raises:
+            subprocess.CalledProcessError: Se a ferramenta falhar.
+            RuntimeError: Se o banco não passar na verificação.
+        """
+        path_build = building_path(db_path)
+        if not os.path.exists(path_build):
+            shutil.copyfile(db_path, path_build)
+        self.run(args=["-d", path_build, *args])
+        if not publish:
+            verify_database(path_build, tables)
+            return path_build
+        return publish_database(path_build, db_path, tables)
+
     def help(self):
         """
         Exibe a ajuda do executável.
@@ -605,6 +841,8 @@ class SpatialiteConvert(SpatialiteBase):
 class Spatialite(SpatialiteBase):
     """
     Inicializa a classe para spatialite.exe
+    Para executar os scripts de repository/querys sem um processo por passo, use
+    `modules.osmtools.spatialite_sql.SpatialiteSQL`.
     """
     def __init__(self):
         super().__init__("spatialite.exe")
@@ -0,0 +1,248 @@
+"""
+Execução de SQL no próprio processo, com `sqlite3` e a extensão `mod_spatialite`, no lugar
+de um spatialite.exe por passo.
+"""
+from typing import Iterable, Optional, Union
+from pathlib import Path
+import platform
+import sqlite3
+import time
+import os
+
+QUERYS_PATH = os.path.join("repository", "querys")
+MODULES_PATH = os.path.join("modules", "osmtools", "bin", "Windows", "spatialite", "loadable-modules")
+
+class SpatialiteSQL:
+    """
+    Conexão ao banco do roteador (ex.: `data/processed/streets/streets.sqlite`) que executa
+    os scripts de `repository/querys` e consultas parametrizadas sem criar processos.
+
+    O banco é aberto uma única vez, com PRAGMAs para carga em lote (WAL, synchronous
+    NORMAL, temporários em memória, cache e mmap maiores), e cada script roda em uma
+    única transação: ou todos os comandos são aplicados, ou nenhum.
+
+    Para só ler (`read_only=True`) o banco é aberto com `mode=ro` e só os PRAGMAs de
+    leitura são aplicados: o arquivo publicado não muda de modo de journal, não ganha
+    -wal/-shm e pode estar em um volume somente leitura.
+
+    Para servir rotas (`journal=False`) a conexão continua gravável, porque o
+    VirtualRouting é configurado com UPDATEs na tabela virtual (Algorithm, Options,
+    Delimiter) e o SQLite abre uma transação de escrita para qualquer UPDATE, mesmo sem
+    gravar páginas; os PRAGMAs de journal não são aplicados, então o arquivo publicado
+    também não muda de modo de journal nem ganha -wal/-shm.
+
+    Atributos:
+        db_path (str): Caminho do banco.
+        extension (str): Extensão carregada (`mod_spatialite`, resolvida pelo sistema; no
+            Windows a pasta `loadable-modules` entra na busca das DLLs).
+        require_spatialite (bool): Se False, segue sem a extensão quando ela não puder ser
+            carregada (SQL puro, ex.: índices e UPDATEs; também usado nos testes).
+        read_only (bool): Abre o banco somente para leitura.
+        journal (bool): Aplica os PRAGMAs de journal (WAL, synchronous); False mantém o
+            modo de journal do arquivo.
+        pragmas (dict): PRAGMAs aplicados ao abrir.
+        spatial (bool): Se a extensão foi carregada.
+        report (list): Tempo de cada script executado.
+    Exemplo:
+        with SpatialiteSQL("data/processed/streets/streets.sqlite") as SQL:
+            SQL.script("index/index.sql")
+            SQL.script("router/update_router_astar.sql")
+            rows = SQL.query("SELECT node_id FROM roads_nodes WHERE node_id = ?", (42,))
+            SQL.executemany("INSERT INTO pontos (x, y) VALUES (?, ?)", pontos)
+    """
+    pragmas = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "temp_store": "MEMORY",
+        # VALOR NEGATIVO = KiB (256 MB)
+        "cache_size": -262144,
+        "mmap_size": 1024 ** 3,
+    }
+    # PRAGMAS QUE ALTERAM O ARQUIVO DO BANCO (FORA DO MODO SOMENTE LEITURA)
+    write_pragmas = ("journal_mode", "synchronous")
+
+    def __init__(self,
+            db_path: str,
+            extension: str              = "mod_spatialite",
+            require_spatialite: bool    = True,
+            cache_size: Optional[int]   = None,
+            read_only: bool             = False,
+            journal: bool               = True
+        ):
+        self.db_path            = db_path
+        self.extension          = extension
+        self.require_spatialite = require_spatialite
+        self.read_only          = read_only
+        self.journal            = journal and not read_only
+        self.pragmas            = {
+            name: value for name, value in self.pragmas.items()
+            if self.journal or name not in self.write_pragmas
+        }
+        if cache_size is not None:
+            self.pragmas["cache_size"] = cache_size
+        self.spatial            = False
+        self.report: list       = []
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _load_extension(self, connection: sqlite3.Connection) -> bool:
+        if not hasattr(connection, "enable_load_extension"):
+            return False
+        if platform.system() == "Windows" and os.path.isdir(MODULES_PATH):
+            os.add_dll_directory(os.path.abspath(MODULES_PATH))
+        try:
+            connection.enable_load_extension(True)
+            connection.load_extension(self.extension)
+            return True
+        except sqlite3.OperationalError:
+            return False
+        finally:
+            connection.enable_load_extension(False)
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Abre o banco (uma vez), carrega a extensão e aplica os PRAGMAs.
+        Returns:
+            sqlite3.Connection: A conexão, em modo autocommit; as transações são explícitas.
+        Raises:
+            RuntimeError: Se a extensão não puder ser carregada e `require_spatialite`.
+        """
+        if self._connection is not None:
+            return self._connection
+        if self.read_only:
+            # mode=ro FALHA SE O BANCO NAO EXISTIR, EM VEZ DE CRIAR UM ARQUIVO VAZIO
+            uri = f"{Path(self.db_path).absolute().as_uri()}?mode=ro"
+            connection = sqlite3.connect(uri, uri=True, isolation_level=None, check_same_thread=False)
+        else:
+            connection = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self.spatial = self._load_extension(connection)
+        if not self.spatial and self.require_spatialite:
+            connection.close()
+            raise RuntimeError(
+                f"Could not load {self.extension}: this Python sqlite3 has no extension "
+                "support or the library is not installed"
+            )
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        self._connection = connection
+        return connection
+
+    def close(self) -> None:
+        """
+        Fecha a conexão, se aberta.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self) -> "SpatialiteSQL":
+        self.connect()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @staticmethod
+    def statements(sql: str) -> list:
+        """
+        Separa um script em comandos completos, respeitando `;` dentro de textos e
+        comentários. Trechos só com comentários são descartados.
+        Returns:
+            list: Os comandos, na ordem do script.
+        """
+        result, buffer = [], ""
+        for line in sql.splitlines(keepends=True):
+            buffer += line
+            if sqlite3.complete_statement(buffer):
+                result.append(buffer.strip())
+                buffer = ""
+        # O ULTIMO COMANDO PODE NAO TER ';' (EX.: OS SELECTS DE router/)
+        if buffer.strip():
+            result.append(buffer.strip())
+        return [
+            statement for statement in result
+            if any(line.strip() and not line.strip().startswith("--") for line in statement.splitlines())
+        ]
+
+    def script(self, name: str, params: Union[dict, tuple, None] = None) -> list:
+        """
+        Executa um script de `repository/querys` (ou um caminho de arquivo) em uma única
+        transação.
+        Args:
+            name (str): Caminho relativo a `repository/querys` (ex.: "index/index.sql") ou
+                caminho de um arquivo .sql.
+            params (dict ou tuple, opcional): Parâmetros (`:nome` ou `?`) dos comandos.
+        Returns:
+            list: As linhas do último comando (vazio quando não é uma consulta).
+        Raises:
+            FileNotFoundError: Se o script não existir.
+            sqlite3.Error: Se um comando falhar; a transação é desfeita.
+        """
+        path = name if os.path.isfile(name) else os.path.join(QUERYS_PATH, name)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"SQL script not found: {path}")
+        with open(path, "r", encoding="utf-8") as file:
+            sql = file.read()
+        t_start = time.time()
+        rows = self.execute(self.statements(sql), params)
+        self.report.append({"script": name, "seconds": round(time.time() - t_start, 3)})
+        print(f"Script {name} executado em {self.report[-1]['seconds']}s")
+        return rows
+
+    def execute(self, statements: Iterable[str], params: Union[dict, tuple, None] = None) -> list:
+        """
+        Executa vários comandos em uma única transação.
+        Returns:
+            list: As linhas do último comando.
+        Raises:
+            sqlite3.Error: Se um comando falhar; a transação é desfeita.
+        """
+        connection = self.connect()
+        rows = []
+        connection.execute("BEGIN")
+        try:
+            for statement in statements:
+                # PARAMETROS POSICIONAIS SO NOS COMANDOS QUE TEM "?"; OS NOMEADOS VALEM PARA TODOS
+                bind = params and (isinstance(params, dict) or "?" in statement)
+                cursor = connection.execute(statement, params) if bind else connection.execute(statement)
+                rows = cursor.fetchall()
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return rows
+
+    def query(self, sql: str, params: Union[dict, tuple] = ()) -> list:
+        """
+        Executa uma consulta parametrizada.
+        Returns:
+            list: As linhas do resultado.
+        """
+        return self.connect().execute(sql, params).fetchall()
+
+    def executemany(self, sql: str, rows: Iterable, batch: int = 50000) -> int:
+        """
+        Executa um comando parametrizado para muitas linhas, em uma única transação e em
+        lotes de `batch` linhas (sem montar a lista inteira em memória).
+        Returns:
+            int: Número de linhas processadas.
+        Raises:
+            sqlite3.Error: Se um lote falhar; a transação inteira é desfeita.
+        """
+        connection = self.connect()
+        count, chunk = 0, []
+        connection.execute("BEGIN")
+        try:
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= batch:
+                    connection.executemany(sql, chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                connection.executemany(sql, chunk)
+                count += len(chunk)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return count
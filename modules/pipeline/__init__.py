@@ -0,0 +1,4 @@
+from .stage import Stage
+from .journal import StageJournal
+from .executor import PipelineExecutor
+from .process_runner import ProcessRunner, stage_scope
@@ -0,0 +1,208 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .process_runner import stage_scope
+from .journal import StageJournal
+from .stage import Stage, fingerprint
+from typing import Iterable, Optional
+import time
+import os
+
+class PipelineExecutor:
+    """
+    This module provides the `PipelineExecutor` class, which runs a graph of `Stage`s in
+    dependency order, in parallel where the graph allows, and resumes from a journal.
+    Classes:
+        PipelineExecutor: Validates the stage graph, skips stages the journal records as
+        done, and runs the remaining ones on a thread pool (the stages themselves are
+        external processes, so threads are enough to keep several of them busy).
+    Dependencies:
+        - concurrent.futures: Used to run independent stages at the same time.
+        - StageJournal: Used to persist the completion of each stage.
+    Attributes:
+        stages (dict[str, Stage]): The stages keyed by name, in declaration order.
+        dependencies (dict[str, list[str]]): The upstream stages of each stage, from
+            `Stage.after` and from outputs of other stages used as inputs.
+        journal (StageJournal): The completion record used to resume.
+        max_workers (int): Maximum number of stages running at the same time.
+        report (dict[str, dict]): Outcome of the last run, keyed by stage name, with the
+            telemetry of the external processes each stage ran through `ProcessRunner`.
+    Resume rules:
+        A stage is skipped when the journal records it as done with the same signature (which
+        covers the content of its inputs), its outputs exist and none of its upstream stages
+        changed anything in this execution. A stage with `cache=False` always runs, and
+        counts as a change only when its outputs differ afterwards. A failed stage does not
+        stop independent branches; stages downstream of it are "blocked".
+    Exceptions:
+        - ValueError: Raised for duplicate names, unknown dependencies or cycles.
+    Example:
+        executor = PipelineExecutor(stages, StageJournal("data/interim/pipeline/make_router.json"))
+        report = executor.run()
+        executor.failed  # names of the stages that failed
+    """
+    def __init__(self,
+            stages: Iterable[Stage],
+            journal: Optional[StageJournal] = None,
+            max_workers: int                = 2
+        ):
+        self.stages: dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            self.stages[stage.name] = stage
+        self.journal        = journal or StageJournal()
+        self.max_workers    = max(1, max_workers)
+        self.dependencies   = self._dependencies()
+        self._check_cycles()
+        self.report: dict[str, dict] = {}
+
+    def _dependencies(self) -> dict:
+        producers = {}
+        for stage in self.stages.values():
+            for path in stage.outputs:
+                producers.setdefault(path, stage.name)
+
+        dependencies = {}
+        for stage in self.stages.values():
+            upstream = []
+            for name in stage.after:
+                if name not in self.stages:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage: {name}")
+                upstream.append(name)
+            for path in stage.inputs:
+                producer = producers.get(path)
+                if producer is not None and producer != stage.name:
+                    upstream.append(producer)
+            dependencies[stage.name] = list(dict.fromkeys(upstream))
+        return dependencies
+
+    def _check_cycles(self) -> None:
+        visiting, visited = set(), set()
+
+        def visit(name: str, path: list) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle between stages: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for upstream in self.dependencies[name]:
+                visit(upstream, path + [name])
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name, [])
+
+    def _execute(self, stage: Stage) -> tuple:
+        """
+        Runs the action of a stage.
+
+        Returns:
+            tuple: (error, elapsed, processes, changed), where `error` is None on success,
+            `processes` holds the `ProcessRunner` summaries of the stage and `changed` is
+            False for a `cache=False` stage that left its outputs as they were.
+        """
+        t_start = time.time()
+        before  = [fingerprint(path) for path in stage.outputs]
+        with stage_scope() as processes:
+            try:
+                stage.action()
+                missing = [path for path in stage.outputs if not os.path.exists(path)]
+                error   = f"Saídas não geradas: {', '.join(missing)}" if missing else None
+            except Exception as e:
+                error   = f"{type(e).__name__}: {e}"
+        changed = stage.cache or before != [fingerprint(path) for path in stage.outputs]
+        return error, time.time() - t_start, processes, changed
+
+    def run(self, force: Iterable[str] = ()) -> dict[str, dict]:
+        """
+        Runs every stage that is not already complete, respecting dependencies and locks.
+
+        Args:
+            force (Iterable[str]): Names of stages to run even if the journal has them as done;
+                everything downstream of them runs as well.
+
+        Returns:
+            dict[str, dict]: The outcome of each stage with the keys "status" ("skipped",
+            "done", "failed" or "blocked"), "elapsed", "error", "peak_rss_mb" (the highest
+            of its processes) and "processes" (their summaries), in declaration order.
+        """
+        force       = set(force)
+        unknown     = force - set(self.stages)
+        if unknown:
+            raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+        results     = {}
+        pending     = list(self.stages)
+        running     = {}
+        held        = set()
+        changed     = set()
+
+        def finish(name: str, status: str, elapsed: float = 0.0, error: Optional[str] = None, processes: list = ()) -> None:
+            results[name] = {
+                "status": status,
+                "elapsed": elapsed,
+                "error": error,
+                "peak_rss_mb": max((process["peak_rss_mb"] for process in processes), default=0.0),
+                "processes": list(processes),
+            }
+            print(f"[{name}] {status} em {elapsed:.1f}s" + (f": {error}" if error else ""))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                progressed = False
+                for name in list(pending):
+                    stage       = self.stages[name]
+                    upstream    = [results.get(dep, {}).get("status") for dep in self.dependencies[name]]
+                    if any(status in ("failed", "blocked") for status in upstream):
+                        pending.remove(name)
+                        finish(name, "blocked")
+                        progressed = True
+                        continue
+                    if not all(status in ("skipped", "done") for status in upstream):
+                        continue
+
+                    # ETAPA CONCLUIDA E SEM DEPENDENCIA QUE MUDOU ALGO: NAO RODA DE NOVO
+                    if (name not in force and stage.cache and not changed.intersection(self.dependencies[name])
+                            and self.journal.is_done(stage)):
+                        pending.remove(name)
+                        finish(name, "skipped")
+                        progressed = True
+                        continue
+
+                    if len(running) >= self.max_workers or held.intersection(stage.locks):
+                        continue
+                    pending.remove(name)
+                    held.update(stage.locks)
+                    running[executor.submit(self._execute, stage)] = name
+                    print(f"[{name}] iniciando")
+                    progressed = True
+
+                if progressed or not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name            = running.pop(future)
+                    stage           = self.stages[name]
+                    error, elapsed, processes, modified = future.result()
+                    held.difference_update(stage.locks)
+                    if error is None:
+                        if modified or name in force:
+                            changed.add(name)
+                        self.journal.mark_done(stage, elapsed)
+                        finish(name, "done", elapsed, processes=processes)
+                    else:
+                        self.journal.mark_failed(stage, error, elapsed)
+                        finish(name, "failed", elapsed, error, processes)
+
+        self.report = {name: results[name] for name in self.stages}
+        return self.report
+
+    @property
+    def failed(self) -> list[str]:
+        """
+        Return the names of the stages that failed in the last run.
+
+        Returns:
+            list[str]: The failed stages, in declaration order.
+        """
+        return [name for name, result in self.report.items() if result["status"] == "failed"]
@@ -0,0 +1,108 @@
+from typing import Optional
+import threading
+import time
+import json
+import os
+
+class StageJournal:
+    """
+    This module provides the `StageJournal` class, the persisted completion record of a
+    pipeline, used to resume a failed build at the stage that failed.
+    Classes:
+        StageJournal: Stores the outcome of every stage in a JSON file, rewritten atomically
+        after each change, so a crash never leaves a half-written journal behind.
+    Attributes:
+        path (str): The JSON file of the journal.
+        entries (dict[str, dict]): The record of each stage keyed by name, with the keys
+            "status" ("done" or "failed"), "signature", "finished_at", "elapsed" and "error".
+    Example:
+        journal = StageJournal("data/interim/pipeline/make_router.json")
+        journal.is_done(stage)
+        journal.reset(["brazil:router_time"])
+    """
+    def __init__(self, path: str = os.path.join("data", "interim", "pipeline", "journal.json")):
+        self.path       = path
+        self._lock      = threading.Lock()
+        self.entries: dict[str, dict] = self._load()
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file).get("stages", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        path_tmp = f"{self.path}.tmp"
+        with open(path_tmp, "w", encoding="utf-8") as file:
+            json.dump({"stages": self.entries}, file, ensure_ascii=False, indent=4)
+        os.replace(path_tmp, self.path)
+
+    def is_done(self, stage) -> bool:
+        """
+        Return whether a stage completed with its current declaration and outputs.
+
+        Args:
+            stage (Stage): The stage to check.
+
+        Returns:
+            bool: True if the journal records it as done, with the same signature, and all of
+            its outputs still exist.
+        """
+        entry = self.entries.get(stage.name)
+        return (
+            entry is not None
+            and entry.get("status") == "done"
+            and entry.get("signature") == stage.signature
+            and stage.outputs_exist()
+        )
+
+    def _record(self, stage, status: str, elapsed: float, error: Optional[str]) -> None:
+        with self._lock:
+            self.entries[stage.name] = {
+                "status": status,
+                "signature": stage.signature,
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "elapsed": round(elapsed, 3),
+                "error": error,
+            }
+            self._save()
+
+    def mark_done(self, stage, elapsed: float = 0.0) -> None:
+        """
+        Records a successful stage.
+
+        Args:
+            stage (Stage): The completed stage.
+            elapsed (float): Duration in seconds.
+        """
+        self._record(stage, "done", elapsed, None)
+
+    def mark_failed(self, stage, error: str, elapsed: float = 0.0) -> None:
+        """
+        Records a failed stage; it and everything after it run on the next execution.
+
+        Args:
+            stage (Stage): The failed stage.
+            error (str): The error message.
+            elapsed (float): Duration in seconds.
+        """
+        self._record(stage, "failed", elapsed, error)
+
+    def reset(self, names: Optional[list] = None) -> None:
+        """
+        Forgets some stages, or the whole journal when `names` is None.
+
+        Args:
+            names (list, optional): Names of the stages to forget.
+        """
+        with self._lock:
+            if names is None:
+                self.entries = {}
+            else:
+                for name in names:
+                    self.entries.pop(name, None)
+            self._save()
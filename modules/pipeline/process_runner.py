@@ -0,0 +1,370 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Iterator, Optional
+from loguru import logger
+import subprocess
+import asyncio
+import io
+import threading
+import psutil
+import time
+import os
+
+MB = 1024 ** 2
+
+# RESUMOS DOS PROCESSOS DA ETAPA EM EXECUCAO NA THREAD ATUAL (VER stage_scope)
+_STAGE_PROCESSES: ContextVar[Optional[list]] = ContextVar("stage_processes", default=None)
+
+
+@contextmanager
+def stage_scope() -> Iterator[list]:
+    """
+    Collects the summaries of every `ProcessRunner` run inside the block, in the current
+    thread; `PipelineExecutor` uses it to attach them to the stage report.
+
+    Yields:
+        list: The summaries, appended as the processes finish.
+    """
+    processes = []
+    token = _STAGE_PROCESSES.set(processes)
+    try:
+        yield processes
+    finally:
+        _STAGE_PROCESSES.reset(token)
+
+
+class ProcessRunner:
+    """
+    Runs an external tool, streaming its output and sampling its resource use.
+
+    stdout and stderr are read line by line while the tool runs and sent to the logger
+    (info and warning), instead of being buffered until it exits. A sampler thread reads
+    the process tree with `psutil` every `interval` seconds: resident memory, CPU time
+    and I/O counters. When the tool exits, `summary` holds the peak memory, the CPU
+    utilization and the read/write throughput; a CPU utilization well below 100% means
+    the tool spent most of its time waiting on I/O.
+
+    `run_async` is the asyncio variant, for drivers that orchestrate many tool
+    invocations from one event loop. Both variants accept a timeout; on timeout, and on
+    cancellation of the async task, the whole process tree is killed.
+    Attributes:
+        name (str): Label of the run in the log and in the summary.
+        interval (float): Seconds between samples.
+        logger: Object with `info`/`warning` methods; defaults to the loguru logger
+            (the sinks configured by `LoggerFactory` or `modules.config` apply).
+        summary (dict): Telemetry of the last run (see `run`).
+    Example:
+        runner = ProcessRunner("osmconvert brazil")
+        result = runner.run(["osmconvert64", "brazil.osm.pbf", "-o=brazil.o5m"], timeout=3600)
+        runner.summary["peak_rss_mb"], runner.summary["bound"]
+
+        limit = asyncio.Semaphore(4)
+        await asyncio.gather(*(ProcessRunner(name).run_async(args, limit=limit) for name, args in jobs))
+    """
+    # ACIMA DESTA UTILIZACAO DE CPU (CPU / TEMPO DE PAREDE) A ETAPA E LIMITADA POR CPU
+    cpu_bound_ratio = 0.7
+
+    def __init__(self, name: str, interval: float = 0.5, logger=None):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.name       = name
+        self.interval   = interval
+        self.logger     = logger
+        self.summary    = {}
+
+    def _logger(self):
+        if self.logger is None:
+            self.logger = logger.bind(logger_name="ProcessRunner")
+        return self.logger
+
+    @staticmethod
+    def _kill_tree(pid: int) -> None:
+        """
+        Kills a process and all its descendants. Only the descendants are waited for here;
+        the process itself is reaped by its `Popen`/asyncio owner.
+        """
+        try:
+            root = psutil.Process(pid)
+            children = root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        for proc in [root, *children]:
+            try:
+                proc.kill()
+            except psutil.NoSuchProcess:
+                pass
+        psutil.wait_procs(children, timeout=5)
+
+    async def _read_async(self, stream, lines: list, write) -> None:
+        while line := await stream.readline():
+            line = line.decode("utf-8", errors="replace").rstrip("\n")
+            lines.append(line)
+            write(f"[{self.name}] {line}")
+
+    def _read(self, stream, lines: list, write) -> None:
+        for line in stream:
+            line = line.rstrip("\n")
+            lines.append(line)
+            write(f"[{self.name}] {line}")
+        stream.close()
+
+    def _feed(self, process: subprocess.Popen, chunks: Iterable[bytes], failure: list) -> None:
+        # ESCREVE A ENTRADA NO stdin; SE O ITERADOR FALHAR MATA A ARVORE PARA O wait NAO FICAR PRESO
+        try:
+            for chunk in chunks:
+                process.stdin.buffer.write(chunk)
+            process.stdin.close()
+        except BrokenPipeError:
+            # O PROCESSO SAIU (OU FOI MORTO) ANTES DO FIM DA ENTRADA: O CODIGO DE SAIDA EXPLICA
+            pass
+        except BaseException as error:
+            failure.append(error)
+            self._kill_tree(process.pid)
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def _sample(self, pid: int, stop: threading.Event, stats: dict) -> None:
+        try:
+            root = psutil.Process(pid)
+        except psutil.NoSuchProcess:
+            return
+        # O MESMO OBJETO Process POR PID (cpu_times/io_counters DOS QUE JA SAIRAM FICAM NO ULTIMO VALOR)
+        known, last = {pid: root}, {}
+        while True:
+            try:
+                tree = [root] + root.children(recursive=True)
+            except psutil.NoSuchProcess:
+                break
+            rss = 0
+            for proc in tree:
+                proc = known.setdefault(proc.pid, proc)
+                try:
+                    with proc.oneshot():
+                        rss += proc.memory_info().rss
+                        cpu = proc.cpu_times()
+                        io  = proc.io_counters() if hasattr(proc, "io_counters") else None
+                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    continue
+                read    = getattr(io, "read_chars", getattr(io, "read_bytes", 0)) if io else 0
+                write   = getattr(io, "write_chars", getattr(io, "write_bytes", 0)) if io else 0
+                last[proc.pid] = (cpu.user + cpu.system, read, write)
+            stats["samples"]    += 1
+            stats["peak_rss"]   = max(stats["peak_rss"], rss)
+            stats["cpu_seconds"], stats["read"], stats["write"] = (
+                sum(values[i] for values in last.values()) for i in range(3)
+            )
+            if stop.wait(self.interval):
+                break
+
+    def run(self, args: list, check: bool = True, timeout: Optional[float] = None,
+            input: Optional[Iterable[bytes]] = None, **kwargs) -> subprocess.CompletedProcess:
+        """
+        Runs the command until it exits.
+
+        Args:
+            args (list): The command and its arguments.
+            check (bool): Raises on a non-zero exit status.
+            timeout (float or None): Seconds before the process tree is killed.
+            input (Iterable[bytes] or None): Chunks written to the process stdin from a
+                thread while it runs (e.g. a download still in progress); stdin is closed
+                after the last one. If the iterator raises, the process tree is killed and
+                the error is re-raised here.
+            **kwargs: Extra `subprocess.Popen` arguments (e.g. `cwd`, `env`).
+
+        Returns:
+            subprocess.CompletedProcess: With the full stdout/stderr text, as
+            `subprocess.run(capture_output=True, text=True)` would return.
+
+        Raises:
+            subprocess.CalledProcessError: If `check` and the exit status is non-zero.
+            subprocess.TimeoutExpired: If the process ran longer than `timeout`.
+        """
+        log     = self._logger()
+        t_start = time.time()
+        process = subprocess.Popen(
+            args, stdin=subprocess.PIPE if input is not None else None, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, text=True, errors="replace", bufsize=1, **kwargs
+        )
+        stdout, stderr, failure = [], [], []
+        stats   = {"samples": 0, "peak_rss": 0, "cpu_seconds": 0.0, "read": 0, "write": 0}
+        stop    = threading.Event()
+        threads = [
+            threading.Thread(target=self._read, args=(process.stdout, stdout, log.info), daemon=True),
+            threading.Thread(target=self._read, args=(process.stderr, stderr, log.warning), daemon=True),
+            threading.Thread(target=self._sample, args=(process.pid, stop, stats), daemon=True),
+        ]
+        if input is not None:
+            threads.append(threading.Thread(target=self._feed, args=(process, input, failure), daemon=True))
+        for thread in threads:
+            thread.start()
+        expired = False
+        try:
+            returncode = process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            expired = True
+        finally:
+            if process.poll() is None:
+                self._kill_tree(process.pid)
+                returncode = process.wait()
+            stop.set()
+            for thread in threads:
+                thread.join()
+        elapsed = time.time() - t_start
+        if failure:
+            # A ENTRADA FALHOU: O RESUMO FICA REGISTRADO E O ERRO DA ENTRADA E O QUE SOBE
+            self._finish(args, False, None, returncode, elapsed, stats, stdout, stderr)
+            raise failure[0]
+        return self._finish(args, check, timeout if expired else None, returncode, elapsed, stats, stdout, stderr)
+
+    def stream(self, args: list, check: bool = True, timeout: Optional[float] = None,
+               chunk_size: int = 1024 * 1024, **kwargs) -> Iterator[bytes]:
+        """
+        Runs the command and yields its stdout as raw chunks while it runs, for tools whose
+        output is piped into another one (e.g. `OSMfilter.iter_run`). stderr goes to the
+        logger and the resources are sampled as in `run`.
+
+        Args:
+            chunk_size (int): Size of the chunks read from stdout.
+            Others: As in `run`; `timeout` counts from the start, including the time the
+                consumer takes between chunks.
+
+        Yields:
+            bytes: The stdout content, in order.
+
+        Raises:
+            subprocess.CalledProcessError: If `check` and the exit status is non-zero.
+            subprocess.TimeoutExpired: If the process ran longer than `timeout`.
+        """
+        log     = self._logger()
+        t_start = time.time()
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+        stderr  = []
+        stats   = {"samples": 0, "peak_rss": 0, "cpu_seconds": 0.0, "read": 0, "write": 0}
+        stop    = threading.Event()
+        errors  = io.TextIOWrapper(process.stderr, errors="replace")
+        threads = [
+            threading.Thread(target=self._read, args=(errors, stderr, log.warning), daemon=True),
+            threading.Thread(target=self._sample, args=(process.pid, stop, stats), daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        # NO LIMITE O TIMER MATA A ARVORE; A LEITURA DO stdout TERMINA COM EOF
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            self._kill_tree(process.pid)
+        timer   = threading.Timer(timeout, expire) if timeout is not None else None
+        if timer is not None:
+            timer.daemon = True
+            timer.start()
+        try:
+            for chunk in iter(lambda: process.stdout.read(chunk_size), b""):
+                yield chunk
+            returncode = process.wait()
+        finally:
+            # CONSUMIDOR INTERROMPIDO (OU ERRO): NAO DEIXA A FERRAMENTA ORFA
+            if timer is not None:
+                # UM TIMER JA DISPARADO TERMINA DE MATAR A ARVORE ANTES DE SEGUIR
+                timer.cancel()
+                timer.join()
+            if process.poll() is None:
+                self._kill_tree(process.pid)
+                process.wait()
+            process.stdout.close()
+            stop.set()
+            for thread in threads:
+                thread.join()
+        elapsed = time.time() - t_start
+        self._finish(args, check, timeout if expired.is_set() else None, returncode, elapsed, stats, [], stderr)
+
+    async def run_async(self,
+            args: list,
+            check: bool                         = True,
+            timeout: Optional[float]            = None,
+            limit: Optional[asyncio.Semaphore]  = None,
+            **kwargs
+        ) -> subprocess.CompletedProcess:
+        """
+        Async variant of `run`. Cancelling the awaiting task kills the process tree and
+        re-raises `asyncio.CancelledError`.
+
+        Args:
+            limit (asyncio.Semaphore or None): Shared slots that bound how many tools run at
+                the same time; the process only starts once it holds a slot.
+            Others: As in `run` (`kwargs` go to `asyncio.create_subprocess_exec`).
+
+        Returns:
+            subprocess.CompletedProcess: As in `run`.
+
+        Raises:
+            subprocess.CalledProcessError: If `check` and the exit status is non-zero.
+            subprocess.TimeoutExpired: If the process ran longer than `timeout`.
+        """
+        if limit is not None:
+            async with limit:
+                return await self.run_async(args, check, timeout, None, **kwargs)
+
+        log     = self._logger()
+        t_start = time.time()
+        process = await asyncio.create_subprocess_exec(
+            *map(str, args), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, **kwargs
+        )
+        stdout, stderr = [], []
+        stats   = {"samples": 0, "peak_rss": 0, "cpu_seconds": 0.0, "read": 0, "write": 0}
+        stop    = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(process.pid, stop, stats), daemon=True)
+        sampler.start()
+        readers = [
+            asyncio.create_task(self._read_async(process.stdout, stdout, log.info)),
+            asyncio.create_task(self._read_async(process.stderr, stderr, log.warning)),
+        ]
+        expired = False
+        try:
+            returncode = await asyncio.wait_for(process.wait(), timeout)
+            await asyncio.gather(*readers)
+        except asyncio.TimeoutError:
+            expired = True
+        finally:
+            if process.returncode is None:
+                # TIMEOUT OU CANCELAMENTO: MATA A ARVORE E ESPERA O PROCESSO SEM SER INTERROMPIDO
+                self._kill_tree(process.pid)
+                await asyncio.shield(process.wait())
+            returncode = process.returncode
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+            stop.set()
+            sampler.join()
+        return self._finish(args, check, timeout if expired else None, returncode, time.time() - t_start, stats, stdout, stderr)
+
+    def _finish(self, args, check, expired, returncode, elapsed, stats, stdout, stderr) -> subprocess.CompletedProcess:
+        self.summary = {
+            "name": self.name,
+            "command": os.path.basename(str(args[0])),
+            "returncode": returncode,
+            "timed_out": expired is not None,
+            "seconds": round(elapsed, 3),
+            "samples": stats["samples"],
+            "peak_rss_mb": round(stats["peak_rss"] / MB, 1),
+            "cpu_seconds": round(stats["cpu_seconds"], 3),
+            "cpu_utilization": round(stats["cpu_seconds"] / elapsed, 3) if elapsed else 0.0,
+            "read_mb": round(stats["read"] / MB, 1),
+            "write_mb": round(stats["write"] / MB, 1),
+            "read_mb_s": round(stats["read"] / MB / elapsed, 1) if elapsed else 0.0,
+            "write_mb_s": round(stats["write"] / MB / elapsed, 1) if elapsed else 0.0,
+        }
+        self.summary["bound"] = "cpu" if self.summary["cpu_utilization"] >= self.cpu_bound_ratio else "io"
+        processes = _STAGE_PROCESSES.get()
+        if processes is not None:
+            processes.append(self.summary)
+
+        output, errors = "\n".join(stdout), "\n".join(stderr)
+        if expired is not None:
+            raise subprocess.TimeoutExpired(args, expired, output, errors)
+        if check and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, args, output, errors)
+        return subprocess.CompletedProcess(args, returncode, output, errors)
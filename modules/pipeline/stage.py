@@ -0,0 +1,97 @@
+from typing import Callable, Iterable, Optional, Any
+import hashlib
+import json
+import os
+
+def fingerprint(path: str) -> Optional[list]:
+    """
+    Return [size, mtime_ns] of a file or folder, or None when it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class Stage:
+    """
+    This module provides the `Stage` class, one declarative step of a build pipeline.
+    Classes:
+        Stage: Binds a callable to the files it reads and writes, so the executor can
+        derive the execution order, skip completed work and run independent steps at once.
+    Attributes:
+        name (str): Unique name of the stage, e.g. "brazil:filter".
+        action (Callable[[], Any]): The work of the stage. A raised exception or a returned
+            False marks the stage as failed.
+        inputs (list[str]): Files the stage reads. A stage producing one of them as output is
+            an implicit dependency.
+        outputs (list[str]): Files the stage writes. A completed stage whose outputs are
+            missing is run again.
+        after (list[str]): Explicit dependencies, for ordering that is not visible in files
+            (e.g. two stages writing into the same database).
+        params (Any): JSON-serialisable configuration of the stage (arguments, flags). A
+            change invalidates the journal entry, so the stage runs again.
+        cache (bool): False runs the stage on every execution, for steps that check
+            freshness themselves (e.g. a download). Its downstream stages only run again
+            when it actually changed its outputs.
+        locks (list[str]): Named resources the stage needs exclusively. Stages sharing a lock
+            never run at the same time, even when the graph allows it.
+    Example:
+        Stage(
+            "brazil:filter",
+            action=osmfilter.run,
+            inputs=["data/processed/o5m/brazil-latest.osm.o5m"],
+            outputs=["data/processed/o5m/brazil-latest.osm.filtered.streets.o5m"],
+        )
+    """
+    def __init__(self,
+            name: str,
+            action: Callable[[], Any],
+            inputs: Iterable[str]   = (),
+            outputs: Iterable[str]  = (),
+            after: Iterable[str]    = (),
+            params: Optional[Any]   = None,
+            locks: Iterable[str]    = (),
+            cache: bool             = True
+        ):
+        if not name:
+            raise ValueError("Stage name must not be empty")
+        self.name       = name
+        self.action     = action
+        self.inputs     = [os.path.normpath(path) for path in inputs]
+        self.outputs    = [os.path.normpath(path) for path in outputs]
+        self.after      = list(after)
+        self.params     = params
+        self.locks      = list(locks)
+        self.cache      = cache
+
+    @property
+    def signature(self) -> str:
+        """
+        Return a digest of the declaration of the stage (files and params) and of the
+        current content of its inputs (size and modification time), so a stage runs again
+        when an input file changes.
+
+        Returns:
+            str: The hex digest stored in the journal.
+        """
+        payload = {
+            "inputs": self.inputs,
+            "content": [fingerprint(path) for path in self.inputs],
+            "outputs": self.outputs,
+            "params": self.params,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def outputs_exist(self) -> bool:
+        """
+        Return whether every declared output is present on disk.
+
+        Returns:
+            bool: True if all outputs exist (always True for a stage without outputs).
+        """
+        return all(os.path.exists(path) for path in self.outputs)
+
+    def __repr__(self) -> str:
+        return f"Stage({self.name!r})"
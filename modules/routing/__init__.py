@@ -0,0 +1,5 @@
+from .router import Router
+from .matrix import TravelMatrix
+from .graph import GraphSnapshot, GraphRouter, export_graph, graph_path
+from .ch import ContractionHierarchy, ch_path
+from .alt import Landmarks, alt_path
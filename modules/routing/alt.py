@@ -0,0 +1,231 @@
+from modules.routing.graph import GraphSnapshot, graph_path
+from typing import Optional
+import numpy as np
+import heapq
+import json
+import math
+import time
+import os
+
+try:
+    # DEPENDENCIA OPCIONAL: DIJKSTRA COMPILADO DO SCIPY; SEM ELA USA O HEAP EM PYTHON
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra as csgraph_dijkstra
+except ImportError:
+    csr_matrix = None
+
+
+def alt_path(db_path: str, metric: str = "time") -> str:
+    """
+    File of the ALT landmarks of one metric, written next to the database.
+    """
+    return f"{db_path}.alt.{metric}.npz"
+
+
+def _dijkstra(csr: dict, metric: str, source: int, count: int) -> np.ndarray:
+    # ARVORE COMPLETA A PARTIR DE source; inf NOS NOS QUE ELA NAO ALCANCA
+    offsets, targets, weights = csr["offsets"], csr["targets"], csr[metric]
+    distance = np.full(count, np.inf)
+    cost, heap = {source: 0.0}, [(0.0, source)]
+    while heap:
+        g, node = heapq.heappop(heap)
+        if g > cost[node]:
+            continue
+        distance[node] = g
+        start, end = int(offsets[node]), int(offsets[node + 1])
+        for head, weight in zip(targets[start:end].tolist(), weights[start:end].tolist()):
+            if g + weight < cost.get(head, math.inf):
+                cost[head] = g + weight
+                heapq.heappush(heap, (g + weight, head))
+    return distance
+
+
+def _solver(csr: dict, metric: str, count: int):
+    # source -> ARRAY DE DISTANCIAS DA ARVORE COMPLETA; NO scipy O CSR SOMARIA ARCOS PARALELOS,
+    # ENTAO FICA SO O MAIS BARATO DE CADA PAR (ZEROS EXPLICITOS CONTAM COMO ARCO)
+    if csr_matrix is None:
+        return lambda source: _dijkstra(csr, metric, source, count)
+    offsets = np.asarray(csr["offsets"])
+    tails   = np.repeat(np.arange(count, dtype=np.int64), np.diff(offsets))
+    heads   = np.asarray(csr["targets"], dtype=np.int64)
+    weights = np.asarray(csr[metric], dtype=np.float64)
+    order   = np.lexsort((weights, heads, tails))
+    tails, heads, weights = tails[order], heads[order], weights[order]
+    first   = np.ones(len(order), dtype=bool)
+    first[1:] = (tails[1:] != tails[:-1]) | (heads[1:] != heads[:-1])
+    indptr  = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails[first], minlength=count), out=indptr[1:])
+    matrix  = csr_matrix((weights[first], heads[first], indptr), shape=(count, count))
+    return lambda source: csgraph_dijkstra(matrix, directed=True, indices=source)
+
+
+class Landmarks:
+    """
+    ALT landmarks over a `GraphSnapshot`: preprocessing, persistence and the A* bound.
+
+    A few landmark nodes L are chosen by farthest-point selection (each new one is the
+    node farthest from the ones already chosen) and one forward and one backward Dijkstra
+    from each give d(L, v) and d(v, L) for every node. By the triangle inequality
+    d(v, t) >= max(d(L, t) - d(L, v), d(v, L) - d(t, L)), a lower bound that follows the
+    real network costs, so on "time" it is far tighter than the great-circle distance
+    over the top speed used by `GraphRouter` "astar".
+
+    Distances are stored node-major (one row of K values per node) as float32; the bound
+    subtracts `slack`, the largest float32 rounding error, so it stays a lower bound.
+    Attributes:
+        metric (str): "time" or "length", the snapshot weight they were built on.
+        node_ids (np.ndarray): `roads_nodes.node_id` of each internal index.
+        landmarks (np.ndarray): Internal index of each landmark.
+        forward (np.ndarray): (nodes, K) d(L, v); inf where v is unreachable from L.
+        backward (np.ndarray): (nodes, K) d(v, L); inf where L is unreachable from v.
+        slack (float): Margin taken off every bound.
+        source (dict or None): `meta["source"]` of the snapshot they were built on
+            (database size and mtime_ns); `open` rebuilds and `GraphRouter` refuses them
+            when the snapshot no longer matches.
+        report (dict): Preprocessing figures (nodes, landmarks, seconds).
+    Example:
+        ALT = Landmarks.build(GraphSnapshot(graph_path(db)), metric="time", count=16)
+        ALT.save(alt_path(db, "time"))
+        GraphRouter(GRAPH, landmarks=[Landmarks.load(alt_path(db, "time"))]).shortest_path(a, b, "time", "alt")
+    """
+    def __init__(self, metric, node_ids, landmarks, forward, backward, source=None):
+        self.metric     = metric
+        self.source     = source
+        self.node_ids   = np.asarray(node_ids, dtype=np.int64)
+        self.landmarks  = np.asarray(landmarks, dtype=np.int64)
+        self.forward    = np.asarray(forward, dtype=np.float32)
+        self.backward   = np.asarray(backward, dtype=np.float32)
+        finite          = [values[np.isfinite(values)] for values in (self.forward, self.backward)]
+        largest         = max((float(values.max()) for values in finite if values.size), default=0.0)
+        self.slack      = 4 * largest * float(np.finfo(np.float32).eps)
+        self.report     = {}
+
+    def __len__(self) -> int:
+        return len(self.landmarks)
+
+    @classmethod
+    def build(cls, graph: GraphSnapshot, metric: str = "time", count: int = 16, seed: int = 0) -> "Landmarks":
+        """
+        Selects `count` landmarks and computes their distance arrays.
+
+        The full Dijkstras run in `scipy.sparse.csgraph` (compiled) when scipy is
+        installed; without it they run on a Python heap, which is only practical for
+        small graphs.
+
+        Args:
+            graph (GraphSnapshot): The CSR snapshot.
+            metric (str): "time" or "length".
+            count (int): Number of landmarks; each costs two full Dijkstras here and
+                2 * 4 bytes per node on disk.
+            seed (int): Picks the start node of the selection.
+
+        Returns:
+            Landmarks: The landmarks, with `report` filled.
+        """
+        if metric not in ("time", "length"):
+            raise ValueError("metric must be 'time' or 'length'")
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        t_start = time.time()
+        nodes   = len(graph)
+        count   = min(count, nodes)
+        # O PONTO DE PARTIDA NAO VIRA MARCO: O PRIMEIRO E O NO MAIS LONGE DELE
+        start   = int(np.random.default_rng(seed).integers(nodes))
+        forward_tree, backward_tree = _solver(graph.fwd, metric, nodes), _solver(graph.bwd, metric, nodes)
+        nearest = forward_tree(start)
+        chosen, forward, backward = [], [], []
+        for _ in range(count):
+            reachable = np.isfinite(nearest)
+            reachable[chosen] = False
+            if not reachable.any():
+                break
+            landmark = int(np.argmax(np.where(reachable, nearest, -1.0)))
+            chosen.append(landmark)
+            forward.append(forward_tree(landmark))
+            backward.append(backward_tree(landmark))
+            # DISTANCIA DE CADA NO AO MARCO MAIS PROXIMO JA ESCOLHIDO
+            nearest = forward[0] if len(chosen) == 1 else np.minimum(nearest, forward[-1])
+        result = cls(metric, graph.node_ids, chosen, np.stack(forward, axis=1), np.stack(backward, axis=1),
+                     graph.meta.get("source"))
+        result.report = {
+            "metric": metric,
+            "nodes": nodes,
+            "landmarks": len(chosen),
+            "compiled": csr_matrix is not None,
+            "seconds": round(time.time() - t_start, 2),
+        }
+        print(f"Marcos ALT ({metric}): {len(chosen)} marcos em {result.report['seconds']}s")
+        return result
+
+    def save(self, path: str) -> str:
+        """
+        Writes the landmarks to an uncompressed `.npz`, atomically.
+
+        Returns:
+            str: `path`.
+        """
+        temp = f"{path}.tmp.npz"
+        np.savez(
+            temp, metric=np.array(self.metric), node_ids=self.node_ids, landmarks=self.landmarks,
+            forward=self.forward, backward=self.backward, source=np.array(json.dumps(self.source)),
+        )
+        os.replace(temp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "Landmarks":
+        """
+        Reads landmarks written by `save`.
+        """
+        with np.load(path) as data:
+            # ARQUIVOS ANTERIORES A source CARREGAM COMO None E O open OS RECONSTROI
+            source = json.loads(str(data["source"])) if "source" in data.files else None
+            return cls(str(data["metric"]), *(data[name] for name in ("node_ids", "landmarks", "forward", "backward")),
+                       source)
+
+    @classmethod
+    def open(cls, db_path: str, metric: str = "time", graph: Optional[GraphSnapshot] = None, count: int = 16) -> "Landmarks":
+        """
+        Loads the landmarks saved next to the database, building and saving them from
+        the graph snapshot when they are missing or were built on another snapshot (the
+        source database size and mtime_ns differ).
+        """
+        path  = alt_path(db_path, metric)
+        graph = graph or GraphSnapshot(graph_path(db_path))
+        if os.path.exists(path):
+            result = cls.load(path)
+            if result.source is not None and result.source == graph.meta.get("source"):
+                return result
+            print(f"Marcos ALT desatualizados, reconstruindo: {path}")
+        result = cls.build(graph, metric, count)
+        result.save(path)
+        return result
+
+    def bound(self, source: int, target: int, active: Optional[int] = 4):
+        """
+        Lower bound of the cost from each node to `target` (internal indexes), for A*.
+
+        Args:
+            source, target (int): Internal indexes of the query.
+            active (int or None): Uses only the landmarks with the best bound at `source`
+                (cheaper per node, nearly as tight); None uses all.
+
+        Returns:
+            callable: node -> lower bound of d(node, target).
+        """
+        to_target, from_target = self.forward[target], self.backward[target]
+        if active is not None and active < len(self.landmarks):
+            with np.errstate(invalid="ignore"):
+                gains = np.fmax(to_target - self.forward[source], self.backward[source] - from_target)
+            keep = np.argsort(-np.nan_to_num(gains, nan=-np.inf), kind="stable")[:active]
+            to_target, from_target = to_target[keep], from_target[keep]
+        else:
+            keep = slice(None)
+        forward, backward, slack = self.forward, self.backward, self.slack
+
+        def bound(node: int) -> float:
+            # inf - inf (MARCO SEM LIGACAO COM OS DOIS NOS) NAO LIMITA NADA: fmax IGNORA O nan
+            with np.errstate(invalid="ignore"):
+                value = np.fmax(to_target - forward[node][keep], backward[node][keep] - from_target).max()
+            return max(0.0, float(value) - slack) if value == value else 0.0
+        return bound
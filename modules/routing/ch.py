@@ -0,0 +1,477 @@
+from modules.routing.graph import GraphSnapshot, graph_path
+from typing import Optional
+import numpy as np
+import heapq
+import math
+import json
+import time
+import os
+
+try:
+    # DEPENDENCIA OPCIONAL: COMPILA A CONTRACAO; SEM ELA O MESMO CODIGO RODA EM PYTHON PURO
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def ch_path(db_path: str, metric: str = "time") -> str:
+    """
+    File of the Contraction Hierarchy of one metric, written next to the database.
+    """
+    return f"{db_path}.ch.{metric}.npz"
+
+
+def _upward(count: int, keys: np.ndarray, others: np.ndarray, arcs: np.ndarray) -> tuple:
+    order   = np.argsort(keys, kind="stable")
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=count), out=offsets[1:])
+    return offsets, np.ascontiguousarray(others[order].astype(np.int32)), np.ascontiguousarray(arcs[order])
+
+
+def _compiled(function):
+    return njit(cache=True, nogil=True)(function) if njit is not None else function
+
+
+@_compiled
+def _witness(source, skip, limit, max_settle, out_first, out_next, arc_head, arc_weight, dead, contracted, dist, touched,
+             mark, stamp, targets):
+    # DIJKSTRA LIMITADO A PARTIR DE source SEM PASSAR POR skip, ATE ASSENTAR OS targets NOS MARCADOS
+    # COM stamp; dist FICA PREENCHIDO NOS touched
+    dist[source] = 0.0
+    touched[0] = source
+    count = 1
+    settled = 0
+    heap = [(0.0, source)]
+    while len(heap) > 0 and settled < max_settle:
+        g, node = heapq.heappop(heap)
+        if g > dist[node]:
+            continue
+        if g > limit:
+            break
+        settled += 1
+        if mark[node] == stamp:
+            targets -= 1
+            if targets == 0:
+                break
+        arc = out_first[node]
+        while arc >= 0:
+            nxt = arc_head[arc]
+            if not dead[arc] and not contracted[nxt] and nxt != skip:
+                value = g + arc_weight[arc]
+                if value < dist[nxt]:
+                    if dist[nxt] == np.inf:
+                        touched[count] = nxt
+                        count += 1
+                    dist[nxt] = value
+                    heapq.heappush(heap, (value, nxt))
+            arc = out_next[arc]
+    return count
+
+
+@_compiled
+def _shortcuts(v, max_settle, out_first, out_next, in_first, in_next, arc_tail, arc_head, arc_weight, dead, contracted, dist, touched,
+               mark, stamp):
+    # ATALHOS u -> x NECESSARIOS AO CONTRAIR v: (u, x, peso, arco u->v, arco v->x), OS GRAUS DE v E O
+    # ULTIMO stamp USADO EM mark (MARCA OS DESTINOS DE CADA BUSCA SEM LIMPAR O ARRAY)
+    degree_in = degree_out = 0
+    arc = in_first[v]
+    while arc >= 0:
+        if not dead[arc] and not contracted[arc_tail[arc]]:
+            degree_in += 1
+        arc = in_next[arc]
+    arc = out_first[v]
+    while arc >= 0:
+        if not dead[arc] and not contracted[arc_head[arc]]:
+            degree_out += 1
+        arc = out_next[arc]
+    size = degree_in * degree_out
+    found_u, found_x = np.empty(size, np.int64), np.empty(size, np.int64)
+    found_w = np.empty(size, np.float64)
+    found_1, found_2 = np.empty(size, np.int64), np.empty(size, np.int64)
+    found = 0
+    first = in_first[v]
+    while first >= 0:
+        u = arc_tail[first]
+        if not dead[first] and not contracted[u]:
+            limit = -1.0
+            targets = 0
+            stamp += 1
+            second = out_first[v]
+            while second >= 0:
+                x = arc_head[second]
+                if not dead[second] and not contracted[x] and x != u:
+                    limit = max(limit, arc_weight[first] + arc_weight[second])
+                    if mark[x] != stamp:
+                        mark[x] = stamp
+                        targets += 1
+                second = out_next[second]
+            if limit >= 0.0:
+                count = _witness(u, v, limit, max_settle, out_first, out_next, arc_head, arc_weight, dead, contracted, dist, touched,
+                                 mark, stamp, targets)
+                second = out_first[v]
+                while second >= 0:
+                    x = arc_head[second]
+                    value = arc_weight[first] + arc_weight[second]
+                    if not dead[second] and not contracted[x] and x != u and dist[x] > value:
+                        found_u[found], found_x[found], found_w[found] = u, x, value
+                        found_1[found], found_2[found] = first, second
+                        found += 1
+                    second = out_next[second]
+                for k in range(count):
+                    dist[touched[k]] = np.inf
+        first = in_next[first]
+    return (found_u[:found].copy(), found_x[:found].copy(), found_w[:found].copy(), found_1[:found].copy(),
+            found_2[:found].copy(), degree_in, degree_out, stamp)
+
+
+@_compiled
+def _contract(count, tails, heads, weights, edges, max_settle):
+    capacity    = max(16, 2 * len(tails))
+    arc_tail    = np.empty(capacity, np.int64)
+    arc_head    = np.empty(capacity, np.int64)
+    arc_weight  = np.empty(capacity, np.float64)
+    arc_child1  = np.empty(capacity, np.int64)
+    arc_child2  = np.empty(capacity, np.int64)
+    arc_edge    = np.empty(capacity, np.int64)
+    dead        = np.zeros(capacity, np.bool_)
+    out_next    = np.empty(capacity, np.int64)
+    in_next     = np.empty(capacity, np.int64)
+    out_first   = np.full(count, -1, np.int64)
+    in_first    = np.full(count, -1, np.int64)
+    contracted  = np.zeros(count, np.bool_)
+    deleted     = np.zeros(count, np.int64)
+    level       = np.zeros(count, np.int64)
+    rank        = np.zeros(count, np.int64)
+    dist        = np.full(count, np.inf)
+    touched     = np.empty(count, np.int64)
+    mark        = np.zeros(count, np.int64)
+    stamp       = 0
+    arcs        = 0
+    pending_u, pending_x, pending_w = tails, heads, weights
+    pending_1 = pending_2 = np.full(len(tails), -1, np.int64)
+    pending_e = edges
+    heap = [(0.0, 0)]
+    heap.pop()
+    order = 0
+    # A PRIMEIRA RODADA INSERE OS ARCOS ORIGINAIS; AS SEGUINTES CONTRAEM UM NO E INSEREM SEUS ATALHOS
+    while True:
+        if arcs + len(pending_u) > capacity:
+            capacity = max(2 * capacity, arcs + len(pending_u))
+            arc_tail, arc_head = _resize(arc_tail, capacity), _resize(arc_head, capacity)
+            arc_weight = _resize(arc_weight, capacity)
+            arc_child1, arc_child2 = _resize(arc_child1, capacity), _resize(arc_child2, capacity)
+            arc_edge, out_next, in_next = _resize(arc_edge, capacity), _resize(out_next, capacity), _resize(in_next, capacity)
+            grown = np.zeros(capacity, np.bool_)
+            grown[:len(dead)] = dead
+            dead = grown
+        for k in range(len(pending_u)):
+            u, x, w = pending_u[k], pending_x[k], pending_w[k]
+            if u == x:
+                continue
+            # ARCOS PARALELOS: SO O MAIS BARATO FICA NA BUSCA (OS DEMAIS FICAM GUARDADOS PARA O DESEMPACOTAMENTO)
+            skip = False
+            arc = out_first[u]
+            while arc >= 0:
+                if not dead[arc] and arc_head[arc] == x:
+                    if arc_weight[arc] <= w:
+                        skip = True
+                    else:
+                        dead[arc] = True
+                arc = out_next[arc]
+            if skip:
+                continue
+            arc_tail[arcs], arc_head[arcs], arc_weight[arcs] = u, x, w
+            arc_child1[arcs], arc_child2[arcs], arc_edge[arcs] = pending_1[k], pending_2[k], pending_e[k]
+            out_next[arcs], out_first[u] = out_first[u], arcs
+            in_next[arcs], in_first[x] = in_first[x], arcs
+            arcs += 1
+
+        if order == 0 and len(heap) == 0:
+            for v in range(count):
+                found_u, _, _, _, _, degree_in, degree_out, stamp = _shortcuts(
+                    v, max_settle, out_first, out_next, in_first, in_next, arc_tail, arc_head, arc_weight, dead, contracted, dist, touched,
+                    mark, stamp)
+                heap.append((float(len(found_u) - degree_in - degree_out), v))
+            heapq.heapify(heap)
+
+        pending_u = np.empty(0, np.int64)
+        while len(heap) > 0:
+            _, v = heapq.heappop(heap)
+            found_u, found_x, found_w, found_1, found_2, degree_in, degree_out, stamp = _shortcuts(
+                v, max_settle, out_first, out_next, in_first, in_next, arc_tail, arc_head, arc_weight, dead, contracted, dist, touched,
+                mark, stamp)
+            value = float(len(found_u) - degree_in - degree_out + deleted[v] + level[v])
+            # ATUALIZACAO PREGUICOSA: SE A PRIORIDADE PIOROU, VOLTA PARA A FILA
+            if len(heap) > 0 and value > heap[0][0]:
+                heapq.heappush(heap, (value, v))
+                continue
+            arc = in_first[v]
+            while arc >= 0:
+                if not dead[arc] and not contracted[arc_tail[arc]]:
+                    deleted[arc_tail[arc]] += 1
+                    level[arc_tail[arc]] = max(level[arc_tail[arc]], level[v] + 1)
+                arc = in_next[arc]
+            arc = out_first[v]
+            while arc >= 0:
+                if not dead[arc] and not contracted[arc_head[arc]]:
+                    deleted[arc_head[arc]] += 1
+                    level[arc_head[arc]] = max(level[arc_head[arc]], level[v] + 1)
+                arc = out_next[arc]
+            contracted[v] = True
+            # TIRA DAS LISTAS DOS VIZINHOS OS ARCOS MORTOS E OS QUE LEVAM A NOS JA CONTRAIDOS
+            arc = in_first[v]
+            while arc >= 0:
+                if not contracted[arc_tail[arc]]:
+                    _prune(arc_tail[arc], out_first, out_next, arc_head, dead, contracted)
+                arc = in_next[arc]
+            arc = out_first[v]
+            while arc >= 0:
+                if not contracted[arc_head[arc]]:
+                    _prune(arc_head[arc], in_first, in_next, arc_tail, dead, contracted)
+                arc = out_next[arc]
+            rank[v] = order
+            order += 1
+            pending_u, pending_x, pending_w, pending_1, pending_2 = found_u, found_x, found_w, found_1, found_2
+            pending_e = np.full(len(found_u), -1, np.int64)
+            break
+        if len(heap) == 0 and len(pending_u) == 0:
+            break
+    return rank, arc_tail[:arcs], arc_head[:arcs], arc_weight[:arcs], arc_child1[:arcs], arc_child2[:arcs], arc_edge[:arcs]
+
+
+@_compiled
+def _prune(node, first, following, other, dead, contracted):
+    previous = -1
+    arc = first[node]
+    while arc >= 0:
+        if dead[arc] or contracted[other[arc]]:
+            if previous < 0:
+                first[node] = following[arc]
+            else:
+                following[previous] = following[arc]
+        else:
+            previous = arc
+        arc = following[arc]
+
+
+@_compiled
+def _resize(values, capacity):
+    grown = np.empty(capacity, values.dtype)
+    grown[:len(values)] = values
+    return grown
+
+
+class ContractionHierarchy:
+    """
+    Contraction Hierarchies over a `GraphSnapshot`: preprocessing, persistence and
+    queries.
+
+    The nodes are contracted one by one, least important first (edge difference plus the
+    number of already contracted neighbors, with lazy updates). Contracting a node adds a
+    shortcut u -> w for each pair of neighbors whose shortest path runs through it; a
+    bounded Dijkstra (the witness search) avoids shortcuts with an alternative path. The
+    contraction order is the node rank.
+
+    A query is a bidirectional Dijkstra that only climbs: forward from the origin on arcs
+    to higher-ranked nodes, backward from the destination on arcs from higher-ranked
+    nodes. On road networks both searches settle a few hundred nodes even across the
+    country. Each shortcut keeps the two arcs it replaces, so the path is unpacked back to
+    `roads.id`.
+    Attributes:
+        metric (str): "time" or "length", the snapshot weight it was built on.
+        node_ids (np.ndarray): `roads_nodes.node_id` of each internal index.
+        rank (np.ndarray): Contraction order of each node.
+        weight, child1, child2, edge (np.ndarray): Every arc, original or shortcut: its
+            cost, the two arcs a shortcut replaces (-1 for original arcs) and the
+            `roads.id` of an original arc (-1 for shortcuts).
+        up, down (tuple): (offsets, targets, arcs) CSR of the arcs climbing from each node
+            (forward search) and of the arcs reaching each node from above (backward).
+        source (dict or None): `meta["source"]` of the snapshot it was built on (database
+            size and mtime_ns); `open` rebuilds when the snapshot no longer matches.
+        report (dict): Preprocessing figures (nodes, arcs, shortcuts, seconds).
+    Example:
+        CH = ContractionHierarchy.build(GraphSnapshot(graph_path(db)), metric="time")
+        CH.save(ch_path(db, "time"))
+        ContractionHierarchy.load(ch_path(db, "time")).shortest_path(node_from, node_to)
+    """
+    def __init__(self, metric, node_ids, rank, weight, child1, child2, edge, tail, head, source=None):
+        self.metric     = metric
+        self.source     = source
+        self.node_ids   = np.asarray(node_ids, dtype=np.int64)
+        self.rank       = np.asarray(rank, dtype=np.int32)
+        self.weight     = np.asarray(weight, dtype=np.float64)
+        self.child1     = np.asarray(child1, dtype=np.int64)
+        self.child2     = np.asarray(child2, dtype=np.int64)
+        self.edge       = np.asarray(edge, dtype=np.int64)
+        self.tail       = np.asarray(tail, dtype=np.int32)
+        self.head       = np.asarray(head, dtype=np.int32)
+        climbs          = self.rank[self.tail] < self.rank[self.head]
+        arcs            = np.arange(len(self.weight), dtype=np.int64)
+        count           = len(self.node_ids)
+        self.up         = _upward(count, self.tail[climbs], self.head[climbs], arcs[climbs])
+        self.down       = _upward(count, self.head[~climbs], self.tail[~climbs], arcs[~climbs])
+        self.report     = {}
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    @classmethod
+    def build(cls, graph: GraphSnapshot, metric: str = "time", witness_settle: int = 64) -> "ContractionHierarchy":
+        """
+        Contracts the snapshot graph.
+
+        The contraction runs on flat arrays (arcs in growable arrays, adjacency as linked
+        lists of arc ids) and is compiled with `numba` when it is installed; without it the
+        same code runs as plain Python, which is only practical for small graphs.
+
+        Args:
+            graph (GraphSnapshot): The CSR snapshot.
+            metric (str): "time" or "length".
+            witness_settle (int): Nodes settled per witness search; lower builds faster
+                with more shortcuts, never wrong routes.
+
+        Returns:
+            ContractionHierarchy: The hierarchy, with `report` filled.
+        """
+        if metric not in ("time", "length"):
+            raise ValueError("metric must be 'time' or 'length'")
+        if njit is None and len(graph) > 100_000:
+            print("Aviso: numba não instalado, a contração roda em Python puro (lenta em grafos grandes)")
+        t_start = time.time()
+        count   = len(graph)
+        offsets = np.asarray(graph.fwd["offsets"])
+        tails   = np.repeat(np.arange(count, dtype=np.int64), np.diff(offsets))
+        rank, tail, head, weight, child1, child2, edge = _contract(
+            count, tails, np.asarray(graph.fwd["targets"], dtype=np.int64),
+            np.asarray(graph.fwd[metric], dtype=np.float64), np.asarray(graph.fwd["edge"], dtype=np.int64),
+            witness_settle,
+        )
+        original = int((child1 < 0).sum())
+        hierarchy = cls(metric, graph.node_ids, rank, weight, child1, child2, edge, tail, head, graph.meta.get("source"))
+        hierarchy.report = {
+            "metric": metric,
+            "nodes": count,
+            "arcs": original,
+            "shortcuts": len(weight) - original,
+            "compiled": njit is not None,
+            "seconds": round(time.time() - t_start, 2),
+        }
+        print(f"Contraction Hierarchy ({metric}): {count} nós, {len(weight) - original} atalhos em {hierarchy.report['seconds']}s")
+        return hierarchy
+
+    def save(self, path: str) -> str:
+        """
+        Writes the hierarchy to an uncompressed `.npz`, atomically.
+
+        Returns:
+            str: `path`.
+        """
+        temp = f"{path}.tmp.npz"
+        np.savez(
+            temp, metric=np.array(self.metric), node_ids=self.node_ids, rank=self.rank, weight=self.weight,
+            child1=self.child1, child2=self.child2, edge=self.edge, tail=self.tail, head=self.head,
+            source=np.array(json.dumps(self.source)),
+        )
+        os.replace(temp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "ContractionHierarchy":
+        """
+        Reads a hierarchy written by `save`.
+        """
+        with np.load(path) as data:
+            # ARQUIVOS ANTERIORES A source CARREGAM COMO None E O open OS RECONSTROI
+            source = json.loads(str(data["source"])) if "source" in data.files else None
+            return cls(str(data["metric"]), *(data[name] for name in
+                       ("node_ids", "rank", "weight", "child1", "child2", "edge", "tail", "head")), source)
+
+    def _index(self, node_id: int) -> int:
+        position = int(np.searchsorted(self.node_ids, node_id))
+        if position >= len(self.node_ids) or self.node_ids[position] != node_id:
+            raise KeyError(node_id)
+        return position
+
+    def unpack(self, arc: int) -> list:
+        """
+        `roads.id` of the original arcs behind an arc, in path order.
+        """
+        edges, stack = [], [arc]
+        while stack:
+            arc = stack.pop()
+            if self.child1[arc] < 0:
+                edges.append(int(self.edge[arc]))
+            else:
+                stack += [int(self.child2[arc]), int(self.child1[arc])]
+        return edges
+
+    def shortest_path(self, source_id: int, target_id: int, unpack: bool = True) -> dict:
+        """
+        Shortest path between two `roads_nodes` ids.
+
+        Returns:
+            dict: {"cost" (None when unreachable), "edges" (`roads.id` in path order;
+            empty when `unpack` is False), "settled"}.
+
+        Raises:
+            KeyError: If a node is not in the hierarchy.
+        """
+        source, target = self._index(source_id), self._index(target_id)
+        graphs  = (self.up, self.down)
+        cost    = ({source: 0.0}, {target: 0.0})
+        parent  = ({source: None}, {target: None})
+        heaps   = ([(0.0, source)], [(0.0, target)])
+        best, meet, settled = (0.0, source, 0) if source == target else (math.inf, None, 0)
+        while True:
+            # CADA LADO PARA QUANDO SUA FILA NAO PODE MAIS MELHORAR O MELHOR ENCONTRO
+            active = [side for side in (0, 1) if heaps[side] and heaps[side][0][0] < best]
+            if not active:
+                break
+            side = min(active, key=lambda s: heaps[s][0][0])
+            g, node = heapq.heappop(heaps[side])
+            if g > cost[side][node]:
+                continue
+            settled += 1
+            other = cost[1 - side].get(node)
+            if other is not None and g + other < best:
+                best, meet = g + other, node
+            offsets, targets, arcs = graphs[side]
+            start, end = int(offsets[node]), int(offsets[node + 1])
+            for nxt, arc in zip(targets[start:end].tolist(), arcs[start:end].tolist()):
+                value = g + self.weight[arc]
+                if value < cost[side].get(nxt, math.inf):
+                    cost[side][nxt], parent[side][nxt] = value, (node, arc)
+                    heapq.heappush(heaps[side], (value, nxt))
+        if meet is None:
+            return {"cost": None, "edges": [], "settled": settled}
+        edges = []
+        if unpack:
+            forward, node = [], meet
+            while parent[0][node] is not None:
+                node, arc = parent[0][node]
+                forward.append(arc)
+            backward, node = [], meet
+            while parent[1][node] is not None:
+                node, arc = parent[1][node]
+                backward.append(arc)
+            for arc in forward[::-1] + backward:
+                edges += self.unpack(arc)
+        return {"cost": float(best), "edges": edges, "settled": settled}
+
+    @classmethod
+    def open(cls, db_path: str, metric: str = "time", graph: Optional[GraphSnapshot] = None) -> "ContractionHierarchy":
+        """
+        Loads the hierarchy saved next to the database, building and saving it from the
+        graph snapshot when it is missing or was built on another snapshot (the source
+        database size and mtime_ns differ).
+        """
+        path  = ch_path(db_path, metric)
+        graph = graph or GraphSnapshot(graph_path(db_path))
+        if os.path.exists(path):
+            hierarchy = cls.load(path)
+            if hierarchy.source is not None and hierarchy.source == graph.meta.get("source"):
+                return hierarchy
+            print(f"Contraction Hierarchy desatualizada, reconstruindo: {path}")
+        hierarchy = cls.build(graph, metric)
+        hierarchy.save(path)
+        return hierarchy
@@ -0,0 +1,353 @@
+from modules.osmtools.node_snap import NodeSnapIndex, point_blobs_xy
+from typing import Iterable, Optional, Tuple
+import numpy as np
+import sqlite3
+import shutil
+import heapq
+import json
+import math
+import os
+
+# COORDENADAS EM GRAUS * 1E7 CABEM EM int32 (PRECISAO DE ~1 CM)
+COORD_SCALE     = 10_000_000
+EARTH_RADIUS_M  = 6_371_008.8
+# ARRAYS DE CADA SENTIDO DO CSR (fwd = SAIDAS DO NO, bwd = ENTRADAS)
+_CSR_ARRAYS     = ("offsets", "targets", "time", "length", "edge")
+
+def graph_path(db_path: str) -> str:
+    """
+    Folder of the graph snapshot written next to the database.
+    """
+    return f"{db_path}.graph"
+
+
+def _columns(connection: sqlite3.Connection, table: str) -> set:
+    return {row[1].lower() for row in connection.execute(f'PRAGMA table_info("{table}")')}
+
+
+def _csr(count: int, sources: np.ndarray, arrays: dict) -> dict:
+    order   = np.argsort(sources, kind="stable")
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=count), out=offsets[1:])
+    return {"offsets": offsets, **{name: np.ascontiguousarray(values[order]) for name, values in arrays.items()}}
+
+
+def export_graph(db_path: str, folder: Optional[str] = None, batch: int = 500_000) -> str:
+    """
+    Exports the `roads` network of a `make_router` database to a CSR graph snapshot of
+    `.npy` files, read back by `GraphSnapshot` with memory mapping.
+
+    Each road becomes one arc per allowed direction (`oneway_fromto`/`oneway_tofrom`
+    when the table has them, both directions otherwise), with its `cost` (time),
+    `length` and `roads.id`. Arcs are stored twice, grouped by tail (`fwd_*`) and by
+    head (`bwd_*`), for bidirectional search. Node coordinates come from
+    `roads_nodes.geometry`, quantized to int32 (degrees * 1e7).
+
+    The snapshot is written to a temporary folder and moved into place at the end, so a
+    reader never sees a partial one.
+
+    Args:
+        db_path (str): The router database (read-only, no `mod_spatialite` needed).
+        folder (str or None): Destination; defaults to `graph_path(db_path)`.
+        batch (int): Rows read per fetch.
+
+    Returns:
+        str: The snapshot folder.
+
+    Raises:
+        ValueError: If `roads` is empty or references nodes missing from `roads_nodes`.
+    """
+    folder = folder or graph_path(db_path)
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        columns = _columns(connection, "roads")
+        oneway  = {"oneway_fromto", "oneway_tofrom"} <= columns
+        select  = "id, node_from, node_to, cost, length" + (", oneway_fromto, oneway_tofrom" if oneway else ", 1, 1")
+        cursor  = connection.execute(f"SELECT {select} FROM roads WHERE node_from IS NOT NULL AND node_to IS NOT NULL AND cost IS NOT NULL AND length IS NOT NULL")
+        chunks  = []
+        while rows := cursor.fetchmany(batch):
+            chunks.append(np.array(rows, dtype=np.float64))
+        if not chunks:
+            raise ValueError(f"No roads in {db_path}")
+        roads = np.concatenate(chunks)
+
+        cursor  = connection.execute("SELECT node_id, geometry FROM roads_nodes WHERE geometry IS NOT NULL")
+        ids, lonlat = [], []
+        while rows := cursor.fetchmany(batch):
+            ids.append(np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)))
+            lonlat.append(point_blobs_xy([row[1] for row in rows]))
+    finally:
+        connection.close()
+
+    edge, node_from, node_to = roads[:, 0].astype(np.int64), roads[:, 1].astype(np.int64), roads[:, 2].astype(np.int64)
+    cost, length = roads[:, 3], roads[:, 4]
+    node_ids = np.unique(np.concatenate([node_from, node_to]))
+    known    = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+    points   = np.concatenate(lonlat) if lonlat else np.empty((0, 2))
+    order    = np.argsort(known)
+    position = np.searchsorted(known, node_ids, sorter=order)
+    position = np.minimum(position, max(len(known) - 1, 0))
+    if not len(known) or (known[order[position]] != node_ids).any():
+        raise ValueError(f"roads references nodes missing from roads_nodes in {db_path}")
+    coords   = np.round(points[order[position]] * COORD_SCALE).astype(np.int32)
+
+    # UM ARCO POR SENTIDO PERMITIDO; OS INDICES INTERNOS SAO AS POSICOES EM node_ids
+    tail, head = np.searchsorted(node_ids, node_from), np.searchsorted(node_ids, node_to)
+    forward, backward = roads[:, 5] != 0, roads[:, 6] != 0
+    arcs_u  = np.concatenate([tail[forward], head[backward]])
+    arcs_v  = np.concatenate([head[forward], tail[backward]])
+    values  = {
+        "time": np.concatenate([cost[forward], cost[backward]]).astype(np.float32),
+        "length": np.concatenate([length[forward], length[backward]]).astype(np.float32),
+        "edge": np.concatenate([edge[forward], edge[backward]]),
+    }
+    fwd = _csr(len(node_ids), arcs_u, {"targets": arcs_v.astype(np.int32), **values})
+    bwd = _csr(len(node_ids), arcs_v, {"targets": arcs_u.astype(np.int32), **values})
+
+    # MAIOR VELOCIDADE (COMPRIMENTO / CUSTO) DA REDE: LIMITE INFERIOR DO TEMPO PARA O A*
+    moving  = values["time"] > 0
+    speed   = float((values["length"][moving] / values["time"][moving]).max()) if moving.any() else None
+    if (~moving & (values["length"] > 0)).any():
+        speed = None
+    stat = os.stat(db_path)
+    meta = {
+        "nodes": int(len(node_ids)),
+        "arcs": int(len(arcs_u)),
+        "coord_scale": COORD_SCALE,
+        "max_speed": speed,
+        "source": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+    }
+
+    building = f"{folder}.building"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    np.save(os.path.join(building, "node_ids.npy"), node_ids)
+    np.save(os.path.join(building, "coords.npy"), coords)
+    for prefix, csr in (("fwd", fwd), ("bwd", bwd)):
+        for name in _CSR_ARRAYS:
+            np.save(os.path.join(building, f"{prefix}_{name}.npy"), csr[name])
+    with open(os.path.join(building, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump(meta, file, indent=4)
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(building, folder)
+    print(f"Grafo CSR gravado: {folder} ({meta['nodes']} nós, {meta['arcs']} arcos)")
+    return folder
+
+
+class GraphSnapshot:
+    """
+    A CSR graph snapshot written by `export_graph`, memory-mapped read-only.
+
+    The arrays are `np.load(..., mmap_mode="r")` views of the files: opening is instant
+    and every process that maps the same snapshot shares one copy of the graph through
+    the operating system page cache.
+    Attributes:
+        folder (str): The snapshot folder.
+        meta (dict): Counts, coordinate scale, network top speed and source database.
+        node_ids (np.ndarray): `roads_nodes.node_id` of each internal node index.
+        coords (np.ndarray): int32 (N, 2) lon/lat * `coord_scale`.
+        fwd, bwd (dict): CSR arrays by tail and by head: offsets, targets, time, length,
+            edge (`roads.id`).
+    Example:
+        GRAPH = GraphSnapshot("data/processed/streets/streets.sqlite.graph")
+        GRAPH.index(node_id), GRAPH.lonlat(index)
+    """
+    def __init__(self, folder: str):
+        if not os.path.isfile(os.path.join(folder, "meta.json")):
+            raise FileNotFoundError(f"Graph snapshot not found: {folder}")
+        self.folder     = folder
+        with open(os.path.join(folder, "meta.json"), "r", encoding="utf-8") as file:
+            self.meta   = json.load(file)
+        load            = lambda name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r")
+        self.node_ids   = load("node_ids")
+        self.coords     = load("coords")
+        self.fwd        = {name: load(f"fwd_{name}") for name in _CSR_ARRAYS}
+        self.bwd        = {name: load(f"bwd_{name}") for name in _CSR_ARRAYS}
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def index(self, node_id: int) -> int:
+        """
+        Internal index of a `roads_nodes.node_id`.
+
+        Raises:
+            KeyError: If the node is not in the graph.
+        """
+        position = int(np.searchsorted(self.node_ids, node_id))
+        if position >= len(self.node_ids) or self.node_ids[position] != node_id:
+            raise KeyError(node_id)
+        return position
+
+    def lonlat(self, index: int) -> Tuple[float, float]:
+        """
+        Coordinates of an internal node index, in degrees.
+        """
+        lon, lat = self.coords[index]
+        scale = self.meta["coord_scale"]
+        return float(lon) / scale, float(lat) / scale
+
+
+class GraphRouter:
+    """
+    Shortest paths on a `GraphSnapshot`, without SpatiaLite.
+
+    Two searches are available, both on binary heaps kept in Python lists (`heapq`) with
+    the tentative costs in dictionaries, so a query only touches the nodes it settles:
+        - "bidijkstra": bidirectional Dijkstra, forward on `fwd` and backward on `bwd`,
+          stopping when the two frontiers together cannot improve the best meeting.
+        - "astar": A* with the great-circle distance as the bound; for "time" it is
+          divided by the top speed of the network, so the search stays exact.
+        - "alt": A* with the landmark bounds of `modules.routing.alt.Landmarks` built
+          for the metric, much tighter than "astar" on "time".
+    Attributes:
+        graph (GraphSnapshot): The snapshot.
+        snap (NodeSnapIndex or None): Used by `route` to snap coordinates.
+        landmarks (dict): `Landmarks` of each metric, for "alt".
+    Example:
+        ROUTER = GraphRouter(GraphSnapshot(graph_path(db)), NodeSnapIndex.open(db))
+        ROUTER.route((-49.2717158, -16.7802859), (-49.205362, -16.803097), metric="time")
+    """
+    metrics     = ("time", "length")
+    algorithms  = ("bidijkstra", "astar", "alt")
+
+    def __init__(self, graph: GraphSnapshot, snap: Optional[NodeSnapIndex] = None, landmarks: Iterable = ()):
+        self.graph      = graph
+        self.snap       = snap
+        self.landmarks  = {item.metric: item for item in landmarks}
+        self._lat       = None
+        # O MESMO NUMERO DE NOS NAO BASTA: A REDE PODE MUDAR SEM MUDAR A CONTAGEM
+        if any(len(item.node_ids) != len(graph) or item.source != graph.meta.get("source")
+               for item in self.landmarks.values()):
+            raise ValueError("landmarks were built on another graph snapshot")
+
+    @staticmethod
+    def _arcs(csr: dict, metric: str, node: int):
+        start, end = int(csr["offsets"][node]), int(csr["offsets"][node + 1])
+        return zip(csr["targets"][start:end].tolist(), csr[metric][start:end].tolist(), csr["edge"][start:end].tolist())
+
+    def _bound(self, metric: str, target: int):
+        # LIMITE INFERIOR DO CUSTO ATE O DESTINO (A*); None QUANDO NAO HA LIMITE SEGURO
+        speed = 1.0 if metric == "length" else self.graph.meta.get("max_speed")
+        if not speed:
+            return None
+        coords  = self.graph.coords
+        scale   = self.graph.meta["coord_scale"]
+        lon_t, lat_t = (math.radians(value / scale) for value in coords[target].tolist())
+        cos_t   = math.cos(lat_t)
+        # 0.995: A ESFERA PODE SUPERESTIMAR O ELIPSOIDE EM ATE ~0.5%
+        factor  = 0.995 * 2 * EARTH_RADIUS_M / speed
+
+        def bound(node: int) -> float:
+            lon, lat = (math.radians(value / scale) for value in coords[node].tolist())
+            a = math.sin((lat - lat_t) / 2) ** 2 + math.cos(lat) * cos_t * math.sin((lon - lon_t) / 2) ** 2
+            return factor * math.asin(min(1.0, math.sqrt(a)))
+        return bound
+
+    def _astar(self, source: int, target: int, metric: str, bound=None):
+        bound   = bound or self._bound(metric, target) or (lambda node: 0.0)
+        cost    = {source: 0.0}
+        parent  = {source: None}
+        heap    = [(bound(source), 0.0, source)]
+        done    = set()
+        settled = 0
+        while heap:
+            _, g, node = heapq.heappop(heap)
+            if node in done:
+                continue
+            done.add(node)
+            settled += 1
+            if node == target:
+                return g, self._chain(parent, target, reverse=False), settled
+            for head, weight, edge in self._arcs(self.graph.fwd, metric, node):
+                value = g + weight
+                if value < cost.get(head, math.inf):
+                    cost[head], parent[head] = value, (node, edge)
+                    heapq.heappush(heap, (value + bound(head), value, head))
+        return None, [], settled
+
+    def _bidijkstra(self, source: int, target: int, metric: str):
+        csr     = (self.graph.fwd, self.graph.bwd)
+        cost    = ({source: 0.0}, {target: 0.0})
+        parent  = ({source: None}, {target: None})
+        heaps   = ([(0.0, source)], [(0.0, target)])
+        done    = (set(), set())
+        best, meet, settled = math.inf, (source if source == target else None), 0
+        if meet is not None:
+            best = 0.0
+        while heaps[0] and heaps[1]:
+            # PARA QUANDO NENHUM CAMINHO PELAS FRONTEIRAS PODE MELHORAR O MELHOR ENCONTRO
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            g, node = heapq.heappop(heaps[side])
+            if node in done[side]:
+                continue
+            done[side].add(node)
+            settled += 1
+            for head, weight, edge in self._arcs(csr[side], metric, node):
+                value = g + weight
+                if value < cost[side].get(head, math.inf):
+                    cost[side][head], parent[side][head] = value, (node, edge)
+                    heapq.heappush(heaps[side], (value, head))
+                    other = cost[1 - side].get(head)
+                    if other is not None and value + other < best:
+                        best, meet = value + other, head
+        if meet is None:
+            return None, [], settled
+        return best, self._chain(parent[0], meet, reverse=False) + self._chain(parent[1], meet, reverse=True), settled
+
+    @staticmethod
+    def _chain(parent: dict, node: int, reverse: bool) -> list:
+        edges = []
+        while parent[node] is not None:
+            node, edge = parent[node]
+            edges.append(edge)
+        # NA BUSCA DE TRAS AS VIAS JA SAEM NA ORDEM DO ENCONTRO PARA O DESTINO
+        return edges if reverse else edges[::-1]
+
+    def shortest_path(self, source_id: int, target_id: int, metric: str = "time", algorithm: str = "bidijkstra") -> dict:
+        """
+        Shortest path between two `roads_nodes` ids.
+
+        Args:
+            source_id, target_id (int): Node ids.
+            metric (str): "time" (`roads.cost`) or "length" (`roads.length`).
+            algorithm (str): "bidijkstra", "astar" or "alt".
+
+        Returns:
+            dict: {"cost" (None when unreachable), "edges" (`roads.id` in path order),
+            "settled" (nodes settled by the search)}.
+
+        Raises:
+            ValueError: For an unknown metric or algorithm, or "alt" without landmarks
+                for the metric.
+            KeyError: If a node is not in the graph.
+        """
+        if metric not in self.metrics:
+            raise ValueError(f"metric must be one of {self.metrics}")
+        if algorithm not in self.algorithms:
+            raise ValueError(f"algorithm must be one of {self.algorithms}")
+        if algorithm == "alt" and metric not in self.landmarks:
+            raise ValueError(f"No landmarks for metric '{metric}'")
+        source, target = self.graph.index(source_id), self.graph.index(target_id)
+        if algorithm == "alt":
+            cost, edges, settled = self._astar(source, target, metric, self.landmarks[metric].bound(source, target))
+        else:
+            search = self._astar if algorithm == "astar" else self._bidijkstra
+            cost, edges, settled = search(source, target, metric)
+        return {"cost": cost, "edges": edges, "settled": settled}
+
+    def route(self, origin: Tuple[float, float], destination: Tuple[float, float], metric: str = "time", algorithm: str = "bidijkstra") -> dict:
+        """
+        Snaps (lon, lat) origin and destination with `snap` and runs `shortest_path`.
+
+        Returns:
+            dict: As `shortest_path`, plus "origin_node" and "destination_node".
+        """
+        if self.snap is None:
+            raise ValueError("route needs a NodeSnapIndex; use shortest_path with node ids")
+        node_from, _ = self.snap.nearest(*origin)
+        node_to, _ = self.snap.nearest(*destination)
+        result = self.shortest_path(node_from, node_to, metric, algorithm)
+        return {"origin_node": node_from, "destination_node": node_to, **result}
@@ -0,0 +1,199 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from modules.osmtools.spatialite_sql import SpatialiteSQL
+from modules.osmtools.node_snap import NodeSnapIndex
+from typing import Iterator, Optional, Tuple
+import numpy as np
+import math
+import csv
+import os
+
+# CONEXAO AQUECIDA DE CADA PROCESSO DO POOL (VER _init_worker)
+_WORKER: dict = {}
+
+
+def _init_worker(db_path: str, table: str, extension: str) -> None:
+    """
+    Opens the connection of a pool process once; every block it runs reuses it.
+
+    The connection skips the journal PRAGMAs but stays writable: the VirtualRouting
+    settings below are UPDATEs, which SQLite refuses on a `mode=ro` connection.
+    """
+    SQL = SpatialiteSQL(db_path, extension=extension, journal=False)
+    connection = SQL.connect()
+    # VARIOS DESTINOS POR CONSULTA SO NO DIJKSTRA; SEM TRECHOS NEM GEOMETRIAS, SO O CUSTO
+    connection.execute(f"UPDATE {table} SET Algorithm = 'Dijkstra'")
+    connection.execute(f"UPDATE {table} SET Options = 'SIMPLE'")
+    connection.execute(f"UPDATE {table} SET Delimiter = ','")
+    _WORKER.update(sql=SQL, table=table)
+
+
+def _origin_block(origins: np.ndarray, destinations: np.ndarray, batch: int) -> np.ndarray:
+    """
+    Costs from each origin node to every destination node, one-to-many: one query per
+    origin and per `batch` destinations. Runs in a pool process (or inline, after
+    `_init_worker`).
+    """
+    connection  = _WORKER["sql"].connect()
+    table       = _WORKER["table"]
+    costs       = np.full((len(origins), len(destinations)), np.nan)
+    column      = {int(node): j for j, node in enumerate(destinations)}
+    for i, node_from in enumerate(origins.tolist()):
+        for start in range(0, len(destinations), batch):
+            # MODO DE VARIOS DESTINOS DO VirtualRouting: OS NOS EM UM TEXTO SEPARADO POR Delimiter
+            # (UM IN (...) SERIA QUEBRADO PELO SQLITE EM UMA CONSULTA POR DESTINO)
+            nodes = ",".join(str(int(node)) for node in destinations[start:start + batch])
+            rows = connection.execute(
+                f"SELECT NodeTo, Cost FROM {table} WHERE NodeFrom = ? AND NodeTo = ? AND Role = 'Route'",
+                (node_from, nodes),
+            ).fetchall()
+            for node_to, cost in rows:
+                if cost is not None and node_to in column:
+                    costs[i, column[node_to]] = cost
+        if node_from in column:
+            costs[i, column[node_from]] = 0.0
+    return costs
+
+
+class TravelMatrix:
+    """
+    Many-to-many travel time or distance matrices on a `make_router` database.
+
+    All origins and destinations are snapped in one vectorized pass (`NodeSnapIndex`) and
+    repeated nodes are routed once. Each origin runs a single one-to-many VirtualRouting
+    query instead of one query per pair: multi-destination mode, with the destination
+    nodes in `NodeTo` separated by `Delimiter`, Dijkstra and costs only. The origins are
+    split in blocks across a process pool; every pool process opens and warms its
+    connection once, so the routing network is loaded once per process.
+
+    The matrix comes back as a NumPy array (`compute`) or is streamed to CSV or Parquet
+    block by block (`write`), without holding the whole matrix.
+    Attributes:
+        db_path (str): The router database.
+        metric (str): "time" or "dist".
+        max_workers (int): Pool processes; 1 runs in the calling process.
+        batch (int): Destinations per query.
+        extension (str): SpatiaLite extension.
+        snap (NodeSnapIndex): Snapping index saved next to the database.
+    Notes:
+        Each process holds its own copy of the routing network in memory.
+    Example:
+        MATRIX = TravelMatrix("data/processed/streets/streets.sqlite", metric="time", max_workers=8)
+        costs = MATRIX.compute(origins, destinations)  # (N, 2) e (M, 2) de (lon, lat)
+        MATRIX.write(origins, destinations, "data/interim/matrix.csv")
+    """
+    tables = {"time": "router_time", "dist": "router_dist"}
+
+    def __init__(self,
+            db_path: str,
+            metric: str                 = "time",
+            max_workers: Optional[int]  = None,
+            batch: int                  = 500,
+            extension: str              = "mod_spatialite"
+        ):
+        if metric not in self.tables:
+            raise ValueError(f"metric must be one of {sorted(self.tables)}")
+        if batch < 1:
+            raise ValueError("batch must be at least 1")
+        self.db_path        = db_path
+        self.metric         = metric
+        self.max_workers    = max(1, max_workers or os.cpu_count() or 1)
+        self.batch          = batch
+        self.extension      = extension
+        self.snap           = NodeSnapIndex.open(db_path)
+
+    def snap_points(self, points) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Snaps (lon, lat) points to `roads_nodes`, vectorized.
+
+        Returns:
+            tuple: (node ids, snapping distances in meters).
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return self.snap.nearest_many(points[:, 0], points[:, 1])
+
+    def blocks(self, origins, destinations) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Computes the matrix by origin blocks, yielding each one as soon as it is ready
+        (not in origin order).
+
+        Args:
+            origins, destinations (array-like): (lon, lat) points, shapes (N, 2) and (M, 2).
+
+        Yields:
+            tuple: (origin indexes, costs of shape (len(indexes), M)); NaN where there is
+            no path.
+        """
+        nodes_o, _  = self.snap_points(origins)
+        nodes_d, _  = self.snap_points(destinations)
+        unique_o, inverse_o = np.unique(nodes_o, return_inverse=True)
+        unique_d, inverse_d = np.unique(nodes_d, return_inverse=True)
+        # ORIGENS QUE CAEM NO MESMO NO SAO ROTEADAS UMA VEZ E REPETIDAS NA SAIDA
+        order       = np.argsort(inverse_o, kind="stable")
+        rows_of     = np.split(order, np.cumsum(np.bincount(inverse_o, minlength=len(unique_o)))[:-1])
+        workers     = min(self.max_workers, len(unique_o)) or 1
+        size        = max(1, math.ceil(len(unique_o) / (workers * 4)))
+        chunks      = [np.arange(start, min(start + size, len(unique_o))) for start in range(0, len(unique_o), size)]
+        initargs    = (self.db_path, self.tables[self.metric], self.extension)
+
+        def expand(chunk, costs):
+            indexes = np.concatenate([rows_of[k] for k in chunk])
+            repeats = [len(rows_of[k]) for k in chunk]
+            return indexes, np.repeat(costs, repeats, axis=0)[:, inverse_d]
+
+        if workers == 1:
+            _init_worker(*initargs)
+            try:
+                for chunk in chunks:
+                    yield expand(chunk, _origin_block(unique_o[chunk], unique_d, self.batch))
+            finally:
+                _WORKER.pop("sql").close()
+            return
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            futures = {executor.submit(_origin_block, unique_o[chunk], unique_d, self.batch): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                yield expand(futures[future], future.result())
+
+    def compute(self, origins, destinations) -> np.ndarray:
+        """
+        The whole matrix in memory.
+
+        Returns:
+            np.ndarray: float64 (N, M), in the metric unit; NaN where there is no path.
+        """
+        destinations = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        matrix = np.full((len(origins), len(destinations)), np.nan)
+        for indexes, costs in self.blocks(origins, destinations):
+            matrix[indexes] = costs
+        return matrix
+
+    def write(self, origins, destinations, path: str) -> str:
+        """
+        Streams the matrix to `path` in long format (origin, destination, cost), block by
+        block. `.parquet` needs `pyarrow`; any other extension is written as CSV.
+
+        Returns:
+            str: `path`.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        m = len(np.asarray(destinations).reshape(-1, 2))
+        if path.endswith(".parquet"):
+            # DEPENDENCIA OPCIONAL, SO PARA ESTE FORMATO
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = pa.schema([("origin", pa.int64()), ("destination", pa.int64()), ("cost", pa.float64())])
+            with pq.ParquetWriter(path, schema) as writer:
+                for indexes, costs in self.blocks(origins, destinations):
+                    writer.write_table(pa.table({
+                        "origin": np.repeat(indexes, m),
+                        "destination": np.tile(np.arange(m), len(indexes)),
+                        "cost": costs.ravel(),
+                    }, schema=schema))
+            return path
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["origin", "destination", "cost"])
+            for indexes, costs in self.blocks(origins, destinations):
+                for index, row in zip(indexes.tolist(), costs.tolist()):
+                    writer.writerows((index, j, "" if math.isnan(cost) else cost) for j, cost in enumerate(row))
+        return path
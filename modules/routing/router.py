@@ -0,0 +1,162 @@
+from modules.osmtools.spatialite_sql import SpatialiteSQL
+from modules.osmtools.spatial_index import SpatialIndexManager
+from modules.osmtools.node_snap import NodeSnapIndex, METERS_PER_DEGREE
+from typing import Optional, Tuple
+import threading
+import time
+
+class Router:
+    """
+    Routes between coordinates on a database built by `make_router`, from Python.
+
+    Opening the database, loading `mod_spatialite` and having VirtualRouting read its
+    network into memory costs far more than a query, so each thread that calls `route`
+    gets one connection the first time and keeps it: the connection is opened through
+    `SpatialiteSQL` without the journal PRAGMAs (no WAL switch or -wal/-shm files next to
+    the published database), the routing tables get their algorithm and are warmed with a
+    query before the first real one. It stays writable because VirtualRouting takes its
+    settings as an UPDATE on the virtual table, which SQLite refuses on a `mode=ro`
+    connection; the settings only live in the connection, the file is not written. The route query is a single
+    parameterized statement per metric, so the `sqlite3` statement cache prepares it
+    once per connection.
+
+    Origin and destination are snapped to the nearest `roads_nodes` node with the NumPy
+    index saved next to the database (`NodeSnapIndex`, shared by all threads), or with
+    the R*Tree when `snap_index` is False.
+    Attributes:
+        db_path (str): The router database.
+        tables (dict): Routing virtual table of each metric.
+        algorithm (str or None): "A*" or "Dijkstra", set on every connection; None keeps
+            the table default.
+        extension (str): SpatiaLite extension loaded on every connection.
+        snap (NodeSnapIndex or None): The snapping index, when `snap_index`.
+    Notes:
+        Every connection holds its own copy of the routing network in memory, so the pool
+        grows with the number of threads calling `route`; size worker pools accordingly.
+    Example:
+        with Router("data/processed/streets/streets.sqlite") as ROUTER:
+            route = ROUTER.route((-49.2717158, -16.7802859), (-49.205362, -16.803097), metric="time")
+            route["cost"], route["links"]
+    """
+    tables = {"time": "router_time", "dist": "router_dist"}
+
+    def __init__(self,
+            db_path: str,
+            algorithm: Optional[str]    = "A*",
+            snap_index: bool            = True,
+            extension: str              = "mod_spatialite",
+            cache_size: Optional[int]   = None
+        ):
+        if algorithm not in (None, "A*", "Dijkstra"):
+            raise ValueError("algorithm must be 'A*', 'Dijkstra' or None")
+        self.db_path    = db_path
+        self.algorithm  = algorithm
+        self.extension  = extension
+        self.cache_size = cache_size
+        self.snap       = NodeSnapIndex.open(db_path) if snap_index else None
+        self._local     = threading.local()
+        self._lock      = threading.Lock()
+        self._pool: list = []
+
+    def _sql(self) -> SpatialiteSQL:
+        SQL = getattr(self._local, "sql", None)
+        if SQL is None:
+            SQL = SpatialiteSQL(self.db_path, extension=self.extension, cache_size=self.cache_size, journal=False)
+            connection = SQL.connect()
+            try:
+                self._warm(connection)
+            except BaseException:
+                SQL.close()
+                raise
+            self._local.sql = SQL
+            with self._lock:
+                self._pool.append(SQL)
+        return SQL
+
+    def _warm(self, connection) -> None:
+        # A PRIMEIRA CONSULTA FAZ O VirtualRouting CARREGAR A REDE; FEITA AQUI, NAO NA ROTA DO USUARIO
+        row = connection.execute("SELECT node_id FROM roads_nodes LIMIT 1").fetchone()
+        for table in self.tables.values():
+            if self.algorithm is not None:
+                connection.execute(f"UPDATE {table} SET Algorithm = ?", (self.algorithm,))
+            if row is not None:
+                connection.execute(self._route_sql(table), (row[0], row[0])).fetchall()
+
+    @staticmethod
+    def _route_sql(table: str) -> str:
+        return (
+            f"SELECT Role, LinkRowid, Cost, CASE WHEN Role = 'Route' THEN AsText(Geometry) END "
+            f"FROM {table} WHERE NodeFrom = ? AND NodeTo = ?"
+        )
+
+    def _nearest(self, SQL: SpatialiteSQL, point: Tuple[float, float]) -> Tuple[int, float]:
+        lon, lat = point
+        if self.snap is not None:
+            return self.snap.nearest(lon, lat)
+        found = SpatialIndexManager(SQL).nearest(lon, lat)
+        if found is None:
+            raise ValueError(f"No road node near {point}")
+        return found[0], found[1] * METERS_PER_DEGREE
+
+    def route(self, origin: Tuple[float, float], destination: Tuple[float, float], metric: str = "time") -> dict:
+        """
+        Shortest route between two coordinates.
+
+        Args:
+            origin (tuple): (longitude, latitude) of the origin, X/Y order.
+            destination (tuple): (longitude, latitude) of the destination.
+            metric (str): "time" (`router_time`, cost in the `cost` column unit) or "dist"
+                (`router_dist`, cost in the geometry length unit).
+
+        Returns:
+            dict: {"metric", "origin_node", "destination_node", "snap_m" (snapping distance
+            of origin and destination, in meters), "cost" (None when there is no path),
+            "geometry" (WKT of the whole route), "links" (`roads` rowids, in route order),
+            "seconds"}.
+
+        Raises:
+            ValueError: If `metric` is unknown.
+            RuntimeError: If `mod_spatialite` cannot be loaded.
+        """
+        if metric not in self.tables:
+            raise ValueError(f"metric must be one of {sorted(self.tables)}")
+        t_start = time.perf_counter()
+        SQL     = self._sql()
+        node_from, snap_from = self._nearest(SQL, origin)
+        node_to, snap_to     = self._nearest(SQL, destination)
+        rows    = SQL.query(self._route_sql(self.tables[metric]), (node_from, node_to))
+        head    = next((row for row in rows if row[0] == "Route"), None)
+        return {
+            "metric": metric,
+            "origin_node": node_from,
+            "destination_node": node_to,
+            "snap_m": (round(snap_from, 1), round(snap_to, 1)),
+            "cost": head[2] if head else None,
+            "geometry": head[3] if head else None,
+            "links": [row[1] for row in rows if row[0] == "Link"],
+            "seconds": round(time.perf_counter() - t_start, 6),
+        }
+
+    @property
+    def connections(self) -> int:
+        """
+        Number of warm connections in the pool.
+        """
+        with self._lock:
+            return len(self._pool)
+
+    def close(self) -> None:
+        """
+        Closes every pooled connection; threads that route again get a new one.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, []
+        for SQL in pool:
+            SQL.close()
+        self._local = threading.local()
+
+    def __enter__(self) -> "Router":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
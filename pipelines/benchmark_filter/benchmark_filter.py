@@ -0,0 +1,78 @@
+from modules.osmtools.pbf_filter import PBFHighwayFilter
+from modules.osmtools.osm_convert import OSMConvert
+from modules.osmtools.osm_filter import OSMfilter
+
+import json
+import time
+import sys
+import os
+
+# PBF EM data/external/pbf USADO NA COMPARACAO (OU PASSADO NA LINHA DE COMANDO)
+INPUT_FILE      = "brazil-latest.osm.pbf"
+# PROCESSOS DO FILTRO NATIVO
+WORKERS         = [1, 4, os.cpu_count() or 1]
+PATH_REPORT     = os.path.join("data","interim","benchmark","filter.json")
+
+
+def stats(path):
+    OSMC = OSMConvert(base_path_in=os.path.dirname(os.path.dirname(path)), type_osm_in=os.path.basename(os.path.dirname(path)))
+    OSMC.input_file = os.path.basename(path)
+    result = OSMC.statistics()
+    return {"bytes": os.path.getsize(path), "nodes": result.get("nodes", 0), "ways": result.get("ways", 0)}
+
+
+def external(name):
+    """
+    Caminho atual: pbf -> o5m (osmconvert), filtro (osmfilter), o5m -> pbf (osmconvert).
+    """
+    t_start = time.time()
+    OSMC = OSMConvert(type_osm_in="pbf", type_osm_out="o5m")
+    OSMC.input_file             = name
+    OSMC.drop_author            = True
+    OSMC.drop_version           = True
+    OSMC.verbose                = False
+    OSMC.complete_ways          = True
+    OSMC.complete_multipolygons = True
+    OSMC.run()
+
+    OSMF = OSMfilter()
+    OSMF.input_file = os.path.basename(OSMC._output_file)
+    OSMF.run()
+
+    OSMC = OSMConvert(
+        base_path_in=os.path.join("data","processed"),
+        base_path_out=os.path.join("data","interim","benchmark"),
+        type_osm_in="o5m",
+        type_osm_out="pbf",
+    )
+    OSMC.input_file = os.path.basename(OSMF._output_file)
+    OSMC.verbose    = False
+    OSMC.run()
+    return time.time() - t_start, OSMC._output_file
+
+
+def native(name, workers):
+    output = os.path.join("data","interim","benchmark",f"native-{workers}-{name}")
+    t_start = time.time()
+    PBFHighwayFilter(os.path.join("data","external","pbf",name), output, max_workers=workers).run()
+    return time.time() - t_start, output
+
+
+if __name__ == "__main__":
+
+    name = sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE
+    os.makedirs(os.path.dirname(PATH_REPORT), exist_ok=True)
+
+    report = {"input": name, "input_bytes": os.path.getsize(os.path.join("data","external","pbf",name))}
+    seconds, output = external(name)
+    report["osmconvert+osmfilter"] = {"seconds": round(seconds, 2), **stats(output)}
+    print(f"osmconvert+osmfilter: {seconds:.1f}s")
+
+    for workers in WORKERS:
+        seconds, output = native(name, workers)
+        report[f"native[{workers}]"] = {"seconds": round(seconds, 2), **stats(output)}
+        print(f"nativo com {workers} processos: {seconds:.1f}s")
+
+    with open(PATH_REPORT, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=4)
+    print(json.dumps(report, ensure_ascii=False, indent=4))
@@ -0,0 +1,47 @@
+from modules.routing import TravelMatrix
+
+import numpy as np
+import json
+import time
+import sys
+import os
+
+# BANCO DO ROTEADOR (OU PASSADO NA LINHA DE COMANDO)
+PATH_DB         = os.path.join("data","processed","streets","streets.sqlite")
+# PONTOS SORTEADOS NA AREA URBANA DE GOIANIA (min_lon, min_lat, max_lon, max_lat)
+BBOX            = (-49.40, -16.78, -49.15, -16.55)
+ORIGINS         = 1000
+DESTINATIONS    = 1000
+METRIC          = "time"
+MAX_WORKERS     = os.cpu_count() or 1
+SEED            = 42
+PATH_REPORT     = os.path.join("data","interim","benchmark","matrix.json")
+
+
+if __name__ == "__main__":
+
+    path = sys.argv[1] if len(sys.argv) > 1 else PATH_DB
+    os.makedirs(os.path.dirname(PATH_REPORT), exist_ok=True)
+    rng = np.random.default_rng(SEED)
+
+    def points(count):
+        return np.column_stack((rng.uniform(BBOX[0], BBOX[2], count), rng.uniform(BBOX[1], BBOX[3], count)))
+
+    origins, destinations = points(ORIGINS), points(DESTINATIONS)
+    MATRIX = TravelMatrix(path, metric=METRIC, max_workers=MAX_WORKERS)
+    t_start = time.time()
+    costs = MATRIX.compute(origins, destinations)
+    seconds = time.time() - t_start
+
+    report = {
+        "database": path,
+        "shape": list(costs.shape),
+        "metric": METRIC,
+        "max_workers": MAX_WORKERS,
+        "seconds": round(seconds, 2),
+        "pairs_per_second": round(costs.size / seconds, 1) if seconds else None,
+        "unreachable": int(np.isnan(costs).sum()),
+    }
+    with open(PATH_REPORT, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=4)
+    print(json.dumps(report, ensure_ascii=False, indent=4))
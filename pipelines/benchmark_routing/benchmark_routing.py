@@ -0,0 +1,66 @@
+from modules.routing.graph import GraphRouter, GraphSnapshot, export_graph, graph_path
+from modules.routing.ch import ContractionHierarchy
+from modules.routing.alt import Landmarks
+
+import statistics
+import json
+import time
+import sys
+import os
+
+import numpy as np
+
+# BANCO DO ROTEADOR USADO NA MEDICAO (OU PASSADO NA LINHA DE COMANDO)
+PATH_DB         = os.path.join("data","processed","streets","streets.sqlite")
+METRIC          = "time"
+ALT_LANDMARKS   = 16
+# PARES ORIGEM/DESTINO SORTEADOS ENTRE OS NOS DO GRAFO
+PAIRS           = 50
+SEED            = 42
+PATH_REPORT     = os.path.join("data","interim","benchmark","routing.json")
+
+
+def timings(route, pairs):
+    seconds, settled = [], []
+    for source, target in pairs:
+        t_start = time.perf_counter()
+        settled.append(route(source, target)["settled"])
+        seconds.append(time.perf_counter() - t_start)
+    ms = sorted(s * 1000 for s in seconds)
+    return {
+        "mean_ms": round(statistics.mean(ms), 3),
+        "p95_ms": round(ms[int(len(ms) * 0.95) - 1], 3),
+        "mean_settled": round(statistics.mean(settled), 1),
+    }
+
+
+if __name__ == "__main__":
+
+    path = sys.argv[1] if len(sys.argv) > 1 else PATH_DB
+    os.makedirs(os.path.dirname(PATH_REPORT), exist_ok=True)
+    report = {"database": path, "metric": METRIC}
+
+    # O TEMPO DE PREPARO E O QUE DECIDE SE CH_METRICS/ALT_METRICS FICAM LIGADOS NO make_router
+    if not os.path.exists(os.path.join(graph_path(path), "meta.json")):
+        t_start = time.perf_counter()
+        export_graph(path)
+        report["graph_seconds"] = round(time.perf_counter() - t_start, 2)
+    GRAPH = GraphSnapshot(graph_path(path))
+    report["nodes"] = len(GRAPH)
+    CH = ContractionHierarchy.build(GRAPH, METRIC)
+    report["ch_build"] = CH.report
+    ALT = Landmarks.build(GRAPH, METRIC, ALT_LANDMARKS)
+    report["alt_build"] = ALT.report
+
+    rng = np.random.default_rng(SEED)
+    pairs = GRAPH.node_ids[rng.integers(len(GRAPH), size=(PAIRS, 2))].tolist()
+    ROUTER = GraphRouter(GRAPH, landmarks=[ALT])
+    for algorithm in ("bidijkstra", "astar", "alt"):
+        report[algorithm] = timings(lambda a, b: ROUTER.shortest_path(a, b, METRIC, algorithm), pairs)
+        print(f"{algorithm}: {report[algorithm]['mean_ms']} ms por rota")
+    report["ch_query"] = timings(CH.shortest_path, pairs)
+    print(f"ch: {report['ch_query']['mean_ms']} ms por rota")
+
+    with open(PATH_REPORT, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=4)
+    print(json.dumps(report, ensure_ascii=False, indent=4))
@@ -0,0 +1,95 @@
+from modules.osmtools.spatial_index import SpatialIndexManager
+from modules.osmtools.spatialite_sql import SpatialiteSQL
+from modules.osmtools.node_snap import NodeSnapIndex
+
+import statistics
+import random
+import json
+import time
+import sys
+import os
+
+# BANCO DO ROTEADOR USADO NA COMPARACAO (OU PASSADO NA LINHA DE COMANDO)
+PATH_DB         = os.path.join("data","processed","streets","streets.sqlite")
+# PONTOS DE ORIGEM/DESTINO: NOS SORTEADOS DESLOCADOS ATE JITTER GRAUS
+POINTS          = 200
+JITTER          = 0.01
+SEED            = 42
+# JANELA DO FILTRO X()/Y() DAS CONSULTAS ANTIGAS DE repository/querys/router
+SCAN_BOX        = 0.5
+PATH_REPORT     = os.path.join("data","interim","benchmark","snapping.json")
+
+# SNAPPING ANTERIOR: LE TODOS OS NOS DA TABELA E ORDENA OS DA JANELA PELA DISTANCIA
+SCAN_SQL = """
+SELECT node_id, ST_Distance(MakePoint(:lon, :lat), geometry) AS dist
+FROM roads_nodes
+WHERE
+        X(geometry) >= :lon - :box AND X(geometry) <= :lon + :box
+    AND Y(geometry) >= :lat - :box AND Y(geometry) <= :lat + :box
+ORDER BY dist ASC
+LIMIT 1
+"""
+
+
+def points(SQL):
+    rows = SQL.query("SELECT X(geometry), Y(geometry) FROM roads_nodes ORDER BY random() LIMIT ?", (POINTS,))
+    rng = random.Random(SEED)
+    return [(x + rng.uniform(-JITTER, JITTER), y + rng.uniform(-JITTER, JITTER)) for x, y in rows]
+
+
+def timings(snap, pontos):
+    seconds, nodes = [], []
+    for lon, lat in pontos:
+        t_start = time.perf_counter()
+        nodes.append(snap(lon, lat))
+        seconds.append(time.perf_counter() - t_start)
+    ms = sorted(s * 1000 for s in seconds)
+    return {
+        "mean_ms": round(statistics.mean(ms), 3),
+        "p50_ms": round(ms[len(ms) // 2], 3),
+        "p95_ms": round(ms[int(len(ms) * 0.95) - 1], 3),
+        "max_ms": round(ms[-1], 3),
+    }, nodes
+
+
+if __name__ == "__main__":
+
+    path = sys.argv[1] if len(sys.argv) > 1 else PATH_DB
+    os.makedirs(os.path.dirname(PATH_REPORT), exist_ok=True)
+
+    with SpatialiteSQL(path) as SQL:
+        INDEX = SpatialIndexManager(SQL)
+        INDEX.ensure()
+        pontos = points(SQL)
+
+        def scan(lon, lat):
+            rows = SQL.query(SCAN_SQL, {"lon": lon, "lat": lat, "box": SCAN_BOX})
+            return rows[0][0] if rows else None
+
+        def rtree(lon, lat):
+            result = INDEX.nearest(lon, lat)
+            return result[0] if result else None
+
+        report = {"database": path, "points": len(pontos), "jitter": JITTER}
+        report["scan"], nodes_scan = timings(scan, pontos)
+        print(f"X()/Y() + ST_Distance: {report['scan']['mean_ms']} ms por ponto")
+        report["rtree"], nodes_rtree = timings(rtree, pontos)
+        print(f"R*Tree (SpatialIndex): {report['rtree']['mean_ms']} ms por ponto")
+
+    SNAP = NodeSnapIndex.open(path)
+    report["numpy"], nodes_numpy = timings(lambda lon, lat: SNAP.nearest(lon, lat)[0], pontos)
+    print(f"Grade NumPy: {report['numpy']['mean_ms']} ms por ponto")
+    lons, lats = zip(*pontos)
+    t_start = time.perf_counter()
+    SNAP.nearest_many(lons, lats)
+    report["numpy_batch_ms_per_point"] = round((time.perf_counter() - t_start) * 1000 / len(pontos), 4)
+
+    report["speedup"] = round(report["scan"]["mean_ms"] / report["rtree"]["mean_ms"], 1) if report["rtree"]["mean_ms"] else None
+    # OS DOIS CAMINHOS DEVEM ESCOLHER O MESMO NO (EMPATES DE DISTANCIA A PARTE)
+    report["same_node"] = sum(a == b for a, b in zip(nodes_scan, nodes_rtree))
+    # A GRADE MEDE EM METROS (LONGITUDE CORRIGIDA PELA LATITUDE), ENTAO PODE DIVERGIR EM EMPATES PROXIMOS
+    report["same_node_numpy"] = sum(a == b for a, b in zip(nodes_rtree, nodes_numpy))
+
+    with open(PATH_REPORT, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=4)
+    print(json.dumps(report, ensure_ascii=False, indent=4))
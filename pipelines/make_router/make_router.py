@@ -1,89 +1,332 @@
-from modules.osmtools.spatialite import SpatialiteOsmNet, SpatialiteNetwork
+from modules.osmtools.spatialite import SpatialiteOsmNet, SpatialiteNetwork, publish_database
+from modules.pipeline import Stage, StageJournal, PipelineExecutor
+from modules.osmtools.artifact_store import ArtifactStore
+from modules.osmtools.memory_plan import MemoryPlanner
+from modules.osmtools.spatial_index import SpatialIndexManager
+from modules.osmtools.spatialite_sql import SpatialiteSQL
+from modules.osmtools.node_snap import NodeSnapIndex, snap_path
+from modules.routing.graph import GraphSnapshot, export_graph, graph_path
+from modules.routing.ch import ContractionHierarchy, ch_path
+from modules.routing.alt import Landmarks, alt_path
 from modules.osmtools.osm_convert import OSMConvert
 from modules.osmtools.osm_filter import OSMfilter
+from modules.osmtools.pbf_filter import PBFHighwayFilter
+from modules.osmtools.osm_shard import OSMShard
 from modules.geofabrik import ProtobufDownloader
 
+import json
+import sys
 import os
 
-if __name__ == "__main__":
+# REGIOES GEOFABRIK A CONSTRUIR (PAGINA, NOME); CADA UMA E UM RAMO INDEPENDENTE
+REGIONS         = [
+    ("https://download.geofabrik.de/south-america/brazil.html", "brazil"),
+]
+# BAIXA E CONVERTE PARA O5M AO MESMO TEMPO, SEM GRAVAR/RELER O PBF BRUTO
+STREAM_DOWNLOAD = False
+# NO MODO STREAM, SALVA TAMBEM O PBF BRUTO EM data/external/pbf
+KEEP_PBF        = False
+# FILTRA E CONVERTE PARA PBF POR PIPE, SEM GRAVAR/RELER O O5M FILTRADO
+PIPED           = False
+# NO MODO PIPE, GRAVA TAMBEM O O5M FILTRADO (SOMENTE PARA DEPURACAO)
+KEEP_INTERMEDIATES = False
+# REAPROVEITA SAIDAS DE ETAPAS COM MESMA ENTRADA, BINARIO E ARGUMENTOS
+USE_ARTIFACTS   = True
+# PERFIL DO OSMFILTER (car, truck, walking OU UM FilterProfile), OPCIONAL; None = TODAS AS VIAS highway=
+# COM TODAS AS TAGS. UM PERFIL DESCARTA VIAS E TAGS E MUDA O NOME DOS ARQUIVOS; SO VALE COM "osmfilter"
+FILTER_PROFILE  = None
+# FILTRO: "osmfilter" (osmconvert + osmfilter) OU "native" (PBF -> PBF EM PYTHON, POR BLOCOS)
+FILTER_ENGINE   = "osmfilter"
+# DIVIDE CONVERSAO+FILTRO EM N SHARDS GEOGRAFICOS PROCESSADOS EM PARALELO (0 = DESATIVADO)
+SHARDS          = 0
+# CONSTROI O BANCO EM UM ARQUIVO TEMPORARIO (EM MEMORIA OU SEM JOURNAL, CACHE PELA RAM),
+# COM INDICES E REDES, E SO O PUBLICA (RENAME ATOMICO) DEPOIS DE VERIFICADO
+FAST_BUILD      = True
+# GRAVA AO LADO DO BANCO O INDICE DE SNAPPING EM NUMPY (<banco>.nodes.npz) PARA QUEM ROTEIA
+SNAP_INDEX      = True
+# EXPORTA A REDE roads PARA UM GRAFO CSR EM .npy (<banco>.graph), LIDO COM mmap PELO GraphRouter
+GRAPH_SNAPSHOT  = True
+# CONTRACTION HIERARCHIES SOBRE O GRAFO CSR, UMA POR METRICA (<banco>.ch.<metrica>.npz); [] DESLIGA
+# OPCIONAL: COM numba (requirements-optional.txt) ~18s PARA 358 MIL NOS / 1 MILHAO DE ARCOS (REDE SINTETICA);
+# SEM numba E PYTHON PURO, SO SERVE PARA REDES PEQUENAS. MEDIR NUM EXTRATO REAL COM pipelines/benchmark_routing ANTES DE LIGAR
+CH_METRICS      = []
+# MARCOS ALT (LIMITES DO A* PELA DESIGUALDADE TRIANGULAR) POR METRICA (<banco>.alt.<metrica>.npz); [] DESLIGA
+# COM scipy (requirements-optional.txt) 16 MARCOS EM ~3s PARA 358 MIL NOS (REDE SINTETICA); SEM scipy ~8s POR DIJKSTRA, 2 POR MARCO
+ALT_METRICS     = ["time"]
+ALT_LANDMARKS   = 16
+# ETAPAS EXECUTADAS AO MESMO TEMPO
+MAX_WORKERS     = 2
+# MEMORIA TOTAL (MB) DIVIDIDA ENTRE AS ETAPAS SIMULTANEAS; None = 75% DA RAM DISPONIVEL
+MEMORY_BUDGET_MB = None
+# CONTA OS OBJETOS COM --out-statistics (EXATO, MAS LE O ARQUIVO TODO) EM VEZ DE ESTIMAR
+PLAN_STATISTICS = False
+# REGISTRO DAS ETAPAS CONCLUIDAS; UMA FALHA RETOMA A PARTIR DA ETAPA QUE FALHOU
+PATH_JOURNAL    = os.path.join("data", "interim", "pipeline", "make_router.json")
+# LIMITE EM SEGUNDOS DE CADA FERRAMENTA (None = SEM LIMITE); A FERRAMENTA TRAVADA E
+# ENCERRADA COM SEUS SUBPROCESSOS E A ETAPA FALHA, SEM PRENDER A CONSTRUCAO
+TIMEOUTS        = {"convert": None, "filter": None, "osm_net": None, "network": 4 * 3600}
+# RELATORIO DA EXECUCAO: TEMPO, PICO DE MEMORIA, CPU E E/S DE CADA ETAPA
+PATH_REPORT     = os.path.join("data", "interim", "pipeline", "make_router.report.json")
+
+# TABELAS DE ROTEIRIZACAO: POR TEMPO (COLUNA cost) E POR DISTANCIA (COMPRIMENTO DA GEOMETRIA)
+ROUTERS         = {
+    "router_time": ["-c", "cost"],
+    "router_dist": [],
+}
 
-    # BAIXANDO OS DADOS DO GEOFABRICK
-    PBD = ProtobufDownloader()
-    PBD.run()
 
-    # TRANSFORMANDO PBF PARA O5M PARA REALIZAR FILTROS E DIMINUIR TAMANHO DO PROTOBUF
+def osm_convert(store, planner, input_file, base_path_in, type_osm_in, type_osm_out, complete):
     OSMC = OSMConvert(
-        type_osm_in='pbf',
-        type_osm_out='o5m',
+        base_path_in=base_path_in,
+        base_path_out=os.path.join("data","processed"),
+        type_osm_in=type_osm_in,
+        type_osm_out=type_osm_out,
     )
-    OSMC.input_file             = 'brazil-latest.osm.pbf'
-    OSMC.drop_author            = True
-    OSMC.drop_version           = True
-    OSMC.verbose                = True
-    OSMC.complete_ways          = True
-    OSMC.complete_multipolygons = True
-    OSMC.max_objects            = 500000000
-    OSMC.hash_memory            = 4096
-    OSMC.run()
+    OSMC.artifact_store         = store
+    OSMC.timeout                = TIMEOUTS["convert"]
+    OSMC.drop_author            = complete
+    OSMC.drop_version           = complete
+    OSMC.verbose                = complete
+    OSMC.complete_ways          = complete
+    OSMC.complete_multipolygons = complete
+    # MEMORIA PLANEJADA PELO TAMANHO DA ENTRADA (SEM ARQUIVO, NO MODO STREAM, USA O PADRAO)
+    plan = planner.osmconvert(os.path.join(base_path_in, type_osm_in, input_file) if input_file else None)
+    OSMC.max_objects            = plan["max_objects"]
+    OSMC.hash_memory            = plan["hash_memory"]
+    if input_file is not None:
+        OSMC.input_file         = input_file
+    return OSMC
+
+
+def region_stages(url, country, store, planner):
+    """
+    Monta as etapas de uma região: download, pbf -> o5m, filtro, o5m -> pbf, banco e roteadores.
+    """
+    if FILTER_ENGINE == "native" and FILTER_PROFILE is not None:
+        # O FILTRO NATIVO NAO USA PERFIS: OS DOIS MOTORES GERARIAM REDES DIFERENTES COM A MESMA CONFIGURACAO
+        raise ValueError("FILTER_PROFILE só vale com FILTER_ENGINE = 'osmfilter'; o filtro nativo mantém todas as vias highway=")
+    name_pbf        = f"{country}-latest.osm.pbf"
+    name_o5m        = f"{country}-latest.osm.o5m"
+    suffix          = getattr(FILTER_PROFILE, "name", FILTER_PROFILE) or "streets"
+    name_filtered   = f"{country}-latest.osm.filtered.{suffix}.o5m"
+    path_pbf        = os.path.join("data","external","pbf",name_pbf)
+    path_o5m        = os.path.join("data","processed","o5m",name_o5m)
+    path_filtered   = os.path.join("data","processed","o5m",name_filtered)
+    path_streets    = os.path.join("data","processed","pbf",f"{country}-latest.osm.filtered.{suffix}.pbf")
+    # A PRIMEIRA REGIAO MANTEM O BANCO streets.sqlite; AS DEMAIS GANHAM O NOME NO ARQUIVO PARA NAO COLIDIR
+    name_db         = "streets.sqlite" if country == REGIONS[0][1] else f"streets-{country}.sqlite"
+    path_db         = os.path.join("data","processed","streets",name_db)
+
+    # BAIXANDO OS DADOS DO GEOFABRICK E TRANSFORMANDO PBF PARA O5M
+    def download():
+        if not ProtobufDownloader(url=url, country=country).run():
+            raise RuntimeError(f"Falha ao baixar o PBF de {country}")
+
+    def convert_o5m():
+        osm_convert(store, planner, name_pbf, os.path.join("data","external"), "pbf", "o5m", True).run()
+
+    def download_convert():
+        OSMC = osm_convert(store, planner, None, os.path.join("data","external"), "pbf", "o5m", True)
+        if ProtobufDownloader(url=url, country=country).run_stream(OSMC, keep_pbf=KEEP_PBF) is None:
+            raise RuntimeError(f"Falha ao baixar e converter o PBF de {country}")
 
     # REALIZANDO FILTRAGEM DE DADOS NO PROTOBUF
-    OSMF = OSMfilter(verbose=True)
-    OSMF.input_file = 'brazil-latest.osm.o5m'
-    OSMF.run()
+    def osm_filter():
+        OSMF = OSMfilter(verbose=True)
+        OSMF.artifact_store = store
+        OSMF.profile = FILTER_PROFILE
+        OSMF.hash_memory = planner.osmfilter(path_o5m)["hash_memory"]
+        OSMF.timeout = TIMEOUTS["filter"]
+        OSMF.input_file = name_o5m
+        OSMF.run()
 
     # CONVERTENDO O5M FITLRADO PARA PROTOBUF
-    OSMC = OSMConvert(
-        base_path_in = os.path.join("data","processed"),
-        base_path_out = os.path.join("data","processed"),
-        type_osm_in='o5m',
-        type_osm_out='pbf',
-    )
-    OSMC.input_file             = 'brazil-latest.osm.filtered.streets.o5m'
-    OSMC.drop_author            = False
-    OSMC.drop_version           = False
-    OSMC.verbose                = False
-    OSMC.complete_ways          = False
-    OSMC.complete_multipolygons = False
-    OSMC.max_objects            = 500000000
-    OSMC.hash_memory            = 4096
-    OSMC.run()
+    def convert_pbf():
+        osm_convert(store, planner, name_filtered, os.path.join("data","processed"), "o5m", "pbf", False).run()
+
+    # FILTRO -> PIPE -> CONVERSAO PARA PROTOBUF; O OSMFILTER PRECISA LER O O5M DO DISCO,
+    # MAS A SAIDA FILTRADA VAI DIRETO PARA O STDIN DO OSMCONVERT
+    def filter_pbf():
+        OSMF = OSMfilter(verbose=True)
+        OSMF.profile = FILTER_PROFILE
+        OSMF.hash_memory = planner.osmfilter(path_o5m)["hash_memory"]
+        OSMF.timeout = TIMEOUTS["filter"]
+        OSMF.input_file = name_o5m
+        OSMC = osm_convert(store, planner, None, os.path.join("data","processed"), "o5m", "pbf", False)
+        OSMC.run_stream(OSMF.iter_run(tee_path=path_filtered if KEEP_INTERMEDIATES else None), name_filtered)
+
+    # CONVERSAO E FILTRO POR SHARDS, UNIDOS DIRETO NO PROTOBUF FILTRADO
+    def sharded():
+        SHARD = OSMShard(name_pbf, shards=SHARDS, max_workers=SHARDS, output_file=path_streets)
+        SHARD.profile = FILTER_PROFILE
+        # A FATIA DA ETAPA E DIVIDIDA ENTRE OS PROCESSOS DOS SHARDS
+        SHARD.hash_memory = planner.split(SHARDS).osmconvert(path_pbf)["hash_memory"]
+        SHARD.convert_timeout = TIMEOUTS["convert"]
+        SHARD.filter_timeout = TIMEOUTS["filter"]
+        SHARD.run()
+
+    # FILTRO NATIVO: LE O PBF E GRAVA O PBF FILTRADO, SEM PASSAR POR O5M
+    def filter_native():
+        PBFHighwayFilter(path_pbf, path_streets).run()
 
     # CRIANDO O BANCO COM RODOVIAS E SEUS LINKS COM O PROTOBUF FILTRADO
-    SP_OSM_NET = SpatialiteOsmNet()
-    os.makedirs(os.path.join("data","processed","streets"), exist_ok=True)
-    path_db = os.path.join("data","processed","streets","streets.sqlite")
-    args = [
-        "-o",
-        os.path.join("data","processed","pbf","brazil-latest.osm.filtered.streets.pbf"),
-        "-T",
-        "roads",
-        "-d",
-        path_db,
-    ]
-    SP_OSM_NET.run(args=args)
-
-    # CRIANDO A TABELA DE ROTEIRIZAÇÃO POR TEMPO
-    SP_NET = SpatialiteNetwork()
-    args = [
-        "-d",
-        path_db,
-        "-T",
-        "roads",
-        "-f",
-        "node_from",
-        "-t",
-        "node_to",
-        "-g",
-        "geometry",
-        "-c",
-        "cost",
-        "--a-star-supported",
-        "-n",
-        "name",
-        "-o",
-        "table_router_time",
-        "-vt",
-        "router_time",
-        "--overwrite-output"
-    ]
-    SP_NET.run(args=args)
+    def osm_net():
+        os.makedirs(os.path.dirname(path_db), exist_ok=True)
+        # O BANCO E RECONSTRUIDO DO ZERO (E SO ASSIM O CACHE RECONHECE A MESMA ENTRADA)
+        if os.path.exists(path_db):
+            os.remove(path_db)
+        SP_OSM_NET = SpatialiteOsmNet()
+        SP_OSM_NET.artifact_store = store
+        SP_OSM_NET.timeout = TIMEOUTS["osm_net"]
+        cache_size = planner.spatialite(path_streets)["cache_size"]
+        SP_OSM_NET.run(args=["-o", path_streets, "-T", "roads", "-d", path_db, "-cs", str(cache_size)])
+
+    # INDICES DE repository/querys/index E R*TREES DAS GEOMETRIAS NO MESMO PROCESSO (SEM spatialite.exe)
+    def index(path=path_db):
+        with SpatialiteSQL(path) as SQL:
+            SQL.script(os.path.join("index", "index.sql"))
+            SpatialIndexManager(SQL).ensure()
+
+    # NOS DE roads_nodes EM ARRAYS NUMPY, LIDOS UMA VEZ AQUI E NAO A CADA PROCESSO QUE ROTEIA
+    def snap():
+        NodeSnapIndex.build(path_db).save(snap_path(path_db))
+
+    # ATALHOS E ORDEM DOS NOS PARA ROTAS LONGAS (VER ContractionHierarchy)
+    def contract(metric):
+        def run():
+            ContractionHierarchy.build(GraphSnapshot(graph_path(path_db)), metric).save(ch_path(path_db, metric))
+        return run
+
+    # MARCOS ALT: DISTANCIAS DE/PARA CADA MARCO, USADAS PELO GraphRouter "alt"
+    def landmarks(metric):
+        def run():
+            Landmarks.build(GraphSnapshot(graph_path(path_db)), metric, ALT_LANDMARKS).save(alt_path(path_db, metric))
+        return run
+
+    # CRIANDO AS TABELAS DE ROTEIRIZAÇÃO
+    def network_args(router, cost_args):
+        return [
+            "-T", "roads",
+            "-f", "node_from",
+            "-t", "node_to",
+            "-g", "geometry",
+            *cost_args,
+            "--a-star-supported",
+            "-n", "name",
+            "-o", f"table_{router}",
+            "-vt", router,
+            "--overwrite-output",
+        ]
+
+    def network_tool():
+        SP_NET = SpatialiteNetwork()
+        SP_NET.artifact_store = store
+        SP_NET.timeout = TIMEOUTS["network"]
+        return SP_NET
+
+    def network(router, cost_args):
+        def run():
+            network_tool().run(args=["-d", path_db, *network_args(router, cost_args)])
+        return run
+
+    # MODO RAPIDO: TUDO NO BANCO TEMPORARIO; QUEM LE path_db NUNCA VE UM BANCO PELA METADE
+    def database():
+        SP_OSM_NET = SpatialiteOsmNet()
+        SP_OSM_NET.artifact_store = store
+        SP_OSM_NET.timeout = TIMEOUTS["osm_net"]
+        plan = planner.spatialite(path_streets)
+        path_build = SP_OSM_NET.build(
+            path_streets, path_db, in_memory=plan["in_memory"], cache_size=plan["cache_size"], publish=False
+        )
+        index(path_build)
+        # AS R*TREES DO SPATIALITE SAO AS TABELAS VIRTUAIS idx_<tabela>_<coluna>
+        tables = [f"idx_{table}_{column}" for table, column in SpatialIndexManager.tables]
+        for router, cost_args in ROUTERS.items():
+            tables += [f"table_{router}", router]
+            network_tool().build(path_db, network_args(router, cost_args), tables, publish=False)
+        publish_database(path_build, path_db, tables, non_empty=["roads"])
+
+    # O DOWNLOAD RODA SEMPRE (cache=False): O ProtobufDownloader JA CONFERE SE O EXTRATO MUDOU,
+    # E AS ETAPAS SEGUINTES SO RODAM DE NOVO QUANDO O ARQUIVO BAIXADO MUDA
+    if FILTER_ENGINE == "native":
+        # O FILTRO NATIVO LE OS BLOCOS DO PBF EM DISCO, ENTAO NAO HA MODO STREAM AQUI
+        stages = [
+            Stage(f"{country}:download", download, outputs=[path_pbf], params={"url": url}, cache=False),
+            Stage(f"{country}:filter_native", filter_native, inputs=[path_pbf], outputs=[path_streets]),
+        ]
+    elif SHARDS:
+        # O RECORTE PRECISA DO PBF EM DISCO, ENTAO NAO HA MODO STREAM AQUI
+        stages = [
+            Stage(f"{country}:download", download, outputs=[path_pbf], params={"url": url}, cache=False),
+            Stage(f"{country}:sharded", sharded, inputs=[path_pbf], outputs=[path_streets],
+                  params={"shards": SHARDS, "profile": suffix}),
+        ]
+    elif STREAM_DOWNLOAD:
+        stages = [
+            Stage(f"{country}:download", download_convert, outputs=[path_o5m],
+                  params={"url": url, "keep_pbf": KEEP_PBF}, cache=False),
+        ]
+    else:
+        stages = [
+            Stage(f"{country}:download", download, outputs=[path_pbf], params={"url": url}, cache=False),
+            Stage(f"{country}:convert_o5m", convert_o5m, inputs=[path_pbf], outputs=[path_o5m]),
+        ]
+    if PIPED and FILTER_ENGINE != "native" and not SHARDS:
+        stages.append(Stage(f"{country}:filter_pbf", filter_pbf, inputs=[path_o5m], outputs=[path_streets],
+                            params={"profile": suffix}))
+    elif FILTER_ENGINE != "native" and not SHARDS:
+        stages += [
+            Stage(f"{country}:filter", osm_filter, inputs=[path_o5m], outputs=[path_filtered],
+                  params={"profile": suffix}),
+            Stage(f"{country}:convert_pbf", convert_pbf, inputs=[path_filtered], outputs=[path_streets]),
+        ]
+    if FAST_BUILD:
+        stages.append(Stage(f"{country}:database", database, inputs=[path_streets], outputs=[path_db],
+                            params={"routers": ROUTERS}))
+        built = [f"{country}:database"]
+    else:
+        stages.append(Stage(f"{country}:osm_net", osm_net, inputs=[path_streets], outputs=[path_db]))
+        stages.append(Stage(f"{country}:index", index, after=[f"{country}:osm_net"], locks=[path_db]))
+        # OS ROTEADORES SAO INDEPENDENTES ENTRE SI, MAS ESCREVEM NO MESMO BANCO SQLITE,
+        # QUE ACEITA UM UNICO ESCRITOR: O LOCK SERIALIZA SO ESTAS ETAPAS
+        for router, cost_args in ROUTERS.items():
+            stages.append(Stage(
+                f"{country}:{router}", network(router, cost_args),
+                after=[f"{country}:index"],
+                params=cost_args,
+                locks=[path_db],
+            ))
+        built = [f"{country}:{router}" for router in ROUTERS]
+
+    # ARQUIVOS DERIVADOS DO BANCO PRONTO (SO LEITURA), GRAVADOS AO LADO DELE
+    if SNAP_INDEX:
+        stages.append(Stage(f"{country}:snap", snap, inputs=[path_db], after=built, outputs=[snap_path(path_db)]))
+    if GRAPH_SNAPSHOT:
+        stages.append(Stage(f"{country}:graph", lambda: export_graph(path_db), inputs=[path_db], after=built,
+                            outputs=[graph_path(path_db)]))
+        for metric in CH_METRICS:
+            stages.append(Stage(f"{country}:ch_{metric}", contract(metric), inputs=[graph_path(path_db)],
+                                outputs=[ch_path(path_db, metric)]))
+        for metric in ALT_METRICS:
+            stages.append(Stage(f"{country}:alt_{metric}", landmarks(metric), inputs=[graph_path(path_db)],
+                                outputs=[alt_path(path_db, metric)], params={"landmarks": ALT_LANDMARKS}))
+    return stages
+
+
+if __name__ == "__main__":
+
+    STORE = ArtifactStore() if USE_ARTIFACTS else None
+    PLANNER = MemoryPlanner(budget_mb=MEMORY_BUDGET_MB, concurrency=MAX_WORKERS, use_statistics=PLAN_STATISTICS)
+    print(f"Orçamento de memória: {PLANNER.summary()}")
+
+    stages = []
+    for url, country in REGIONS:
+        stages.extend(region_stages(url, country, STORE, PLANNER))
+
+    PIPELINE = PipelineExecutor(stages, StageJournal(PATH_JOURNAL), max_workers=MAX_WORKERS)
+    # ETAPAS PASSADAS NA LINHA DE COMANDO SAO REEXECUTADAS (EX.: brazil:router_time)
+    PIPELINE.run(force=sys.argv[1:])
+    with open(PATH_REPORT, "w", encoding="utf-8") as file:
+        json.dump({"memory": PLANNER.summary(), "stages": PIPELINE.report}, file, ensure_ascii=False, indent=4)
+    if PIPELINE.failed:
+        raise SystemExit(f"Etapas com falha: {', '.join(PIPELINE.failed)}")
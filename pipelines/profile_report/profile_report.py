@@ -0,0 +1,34 @@
+from modules.osmtools.filter_profile import PROFILES
+from modules.osmtools.osm_filter import OSMfilter
+
+import json
+import sys
+import os
+
+# O5M EM data/processed/o5m USADO NA COMPARACAO (OU PASSADO NA LINHA DE COMANDO)
+INPUT_FILE      = "brazil-latest.osm.o5m"
+# None = FILTRO ORIGINAL (SO highway=, COM TODAS AS TAGS), COMO REFERENCIA
+PROFILES_RUN    = [None, *PROFILES]
+PATH_REPORT     = os.path.join("data","interim","benchmark","profiles.json")
+
+
+if __name__ == "__main__":
+
+    name = sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE
+    os.makedirs(os.path.dirname(PATH_REPORT), exist_ok=True)
+
+    report = {"input": name, "profiles": {}}
+    for profile in PROFILES_RUN:
+        OSMF = OSMfilter()
+        OSMF.profile = profile
+        OSMF.input_file = name
+        OSMF.run()
+        report["profiles"][profile or "streets"] = OSMF.report
+        # MANTEM SO O RELATORIO; CADA PERFIL GERA UM O5M DO TAMANHO DO FILTRADO
+        os.remove(OSMF._output_file)
+        ratio = OSMF.report["output_bytes"] / OSMF.report["input_bytes"]
+        print(f"{profile or 'streets'}: {OSMF.report['output_bytes'] / 1024**2:.1f} MB ({ratio:.1%} da entrada)")
+
+    with open(PATH_REPORT, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=4)
+    print(json.dumps(report, ensure_ascii=False, indent=4))
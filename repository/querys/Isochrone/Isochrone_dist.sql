@@ -3,7 +3,7 @@ WITH vars AS (
         -16.796131 AS lat_o, 	-- latitude de origem
         -49.279878 AS long_o, 	-- longitude de origem
 
-        2.0 AS Box_LatLong      -- Usado para realizar filtro, se diminir aumenta velocidade mas pode não localizar ponto
+        2.0 AS Box_LatLong      -- Janela da R*Tree em graus; a R*Tree deixa uma janela larga barata, menor pode não localizar ponto
 ),
 origem AS (
     SELECT node_id as Node_From
@@ -11,9 +11,12 @@ origem AS (
         SELECT node_id, 
                ST_Distance(ST_Point(long_o, lat_o), geometry) AS dist
         FROM roads_nodes, vars
-        WHERE
-                X(geometry) >= long_o   - Box_LatLong AND X(geometry) <= long_o + Box_LatLong
-            AND Y(geometry) >= lat_o    - Box_LatLong AND Y(geometry) <= lat_o  + Box_LatLong
+        WHERE roads_nodes.ROWID IN (
+            -- R*Tree de roads_nodes.geometry: só os nós dentro da janela são lidos
+            SELECT ROWID FROM SpatialIndex
+            WHERE f_table_name = 'roads_nodes' AND f_geometry_column = 'geometry'
+              AND search_frame = BuildMbr(long_o - Box_LatLong, lat_o - Box_LatLong, long_o + Box_LatLong, lat_o + Box_LatLong)
+        )
         ORDER BY dist ASC
         LIMIT 1
     )
@@ -1,8 +1,9 @@
--- Criando índices para otimizar consultas espaciais na roads_nodes
+-- Criando índices para otimizar as junções por nó na roads_nodes
 CREATE INDEX idx_roads_nodes_node_id ON roads_nodes(node_id);
-CREATE INDEX idx_roads_nodes_geometry ON roads_nodes(geometry);
 
--- Criando índices para otimizar consultas espaciais nas roads
-CREATE INDEX idx_roads_geometry ON roads(geometry);
+-- Criando índices para otimizar as junções por nó nas roads
 CREATE INDEX idx_roads_node_from ON roads(node_from);
-CREATE INDEX idx_roads_node_to ON roads(node_to);
\ No newline at end of file
+CREATE INDEX idx_roads_node_to ON roads(node_to);
+
+-- As geometrias usam R*Tree (CreateSpatialIndex), criadas por SpatialIndexManager
+-- (modules/osmtools/spatial_index.py): B-tree em coluna BLOB não ajuda em buscas espaciais
@@ -7,7 +7,7 @@ WITH vars AS (
         -16.803097 AS lat_d,  	-- latitude de destino
         -49.205362 AS long_d,   -- longitude de destino
 
-        0.5 AS Box_LatLong      -- Usado para realizar filtro, se diminir aumenta velocidade mas pode não localizar ponto
+        0.5 AS Box_LatLong      -- Janela da R*Tree em graus; a R*Tree deixa uma janela larga barata, menor pode não localizar ponto
 ),
 origem AS (
     SELECT node_id as Node_From
@@ -15,9 +15,12 @@ origem AS (
         SELECT node_id, 
                ST_Distance(ST_Point(long_o, lat_o), geometry) AS dist
         FROM roads_nodes, vars
-        WHERE
-                X(geometry) >= long_o   - Box_LatLong AND X(geometry) <= long_o + Box_LatLong
-            AND Y(geometry) >= lat_o    - Box_LatLong AND Y(geometry) <= lat_o  + Box_LatLong
+        WHERE roads_nodes.ROWID IN (
+            -- R*Tree de roads_nodes.geometry: só os nós dentro da janela são lidos
+            SELECT ROWID FROM SpatialIndex
+            WHERE f_table_name = 'roads_nodes' AND f_geometry_column = 'geometry'
+              AND search_frame = BuildMbr(long_o - Box_LatLong, lat_o - Box_LatLong, long_o + Box_LatLong, lat_o + Box_LatLong)
+        )
         ORDER BY dist ASC
         LIMIT 1
     )
@@ -28,9 +31,12 @@ destino AS (
         SELECT node_id, 
                ST_Distance(ST_Point(long_d, lat_d), geometry) AS dist
         FROM roads_nodes, vars
-        WHERE
-                X(geometry) >= long_d   - Box_LatLong AND X(geometry) <= long_d + Box_LatLong
-            AND Y(geometry) >= lat_d    - Box_LatLong AND Y(geometry) <= lat_d  + Box_LatLong
+        WHERE roads_nodes.ROWID IN (
+            -- R*Tree de roads_nodes.geometry: só os nós dentro da janela são lidos
+            SELECT ROWID FROM SpatialIndex
+            WHERE f_table_name = 'roads_nodes' AND f_geometry_column = 'geometry'
+              AND search_frame = BuildMbr(long_d - Box_LatLong, lat_d - Box_LatLong, long_d + Box_LatLong, lat_d + Box_LatLong)
+        )
         ORDER BY dist ASC
         LIMIT 1
     )
@@ -0,0 +1,186 @@
+from functools import partial
+from pathlib import Path
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import os
+import platform
+import re
+import shutil
+import sqlite3
+import stat
+import struct
+import subprocess
+import threading
+
+import numpy as np
+import pytest
+
+
+class _RangeHandler(SimpleHTTPRequestHandler):
+    """Static handler with ETag and single `Range` support, able to drop transfers."""
+
+    # Caminho -> numero de bytes enviados antes de derrubar a conexao (uma vez)
+    drop_after: dict = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _etag(self, path):
+        stat = os.stat(path)
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path) and self.headers.get("If-None-Match") == self._etag(path):
+            self.send_response(304)
+            self.end_headers()
+            return
+        match = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+        if not os.path.isfile(path) or not match:
+            return super().do_GET()
+        data = open(path, "rb").read()
+        start = int(match.group(1))
+        if start >= len(data):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(data)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(206)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+    def end_headers(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            self.send_header("ETag", self._etag(path))
+        super().end_headers()
+
+    def copyfile(self, source, outputfile):
+        limit = self.drop_after.pop(self.path, None)
+        if limit is None:
+            return super().copyfile(source, outputfile)
+        outputfile.write(source.read(limit))
+        outputfile.flush()
+        self.close_connection = True
+        self.connection.shutdown(2)
+
+
+@pytest.fixture
+def http_root(tmp_path):
+    """Directory served by the local HTTP stand-in for Geofabrik."""
+    root = tmp_path / "www"
+    root.mkdir()
+    return root
+
+
+@pytest.fixture
+def http_server(http_root):
+    """Serves `http_root` on localhost and yields the base URL."""
+    _RangeHandler.drop_after = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_RangeHandler, directory=str(http_root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    _RangeHandler.drop_after = {}
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def drop_transfer(http_server):
+    """Makes the next GET of a path send only the given number of bytes and hang up."""
+    def drop(path: str, after: int) -> None:
+        _RangeHandler.drop_after[path] = after
+    return drop
+
+
+@pytest.fixture
+def region_page():
+    """Builds a minimal Geofabrik-like region page listing the extract of a country."""
+    def build(country: str, date: str = "2025-01-01T20:21:00Z") -> str:
+        return (
+            "<html><body>"
+            f"<p>This file was last modified {date} and contains all OSM data.</p>"
+            f'<a href="{country}-latest.osm.pbf">{country}-latest.osm.pbf</a>'
+            f'<a href="{country}-latest.osm.pbf.md5">md5</a>'
+            "</body></html>"
+        )
+    return build
+
+
+@pytest.fixture
+def osmconvert_bin(tmp_path):
+    """Executable copy of the bundled Linux osmconvert; skips where it cannot run."""
+    source = Path(__file__).resolve().parents[1] / "modules/osmtools/bin/Linux/osmconvert/64bits/osmconvert64"
+    if platform.system() != "Linux" or platform.machine() not in ("x86_64", "AMD64"):
+        pytest.skip("bundled osmconvert only runs on Linux x86_64")
+    target = tmp_path / "bin" / "osmconvert64"
+    target.parent.mkdir()
+    shutil.copy(source, target)
+    target.chmod(target.stat().st_mode | stat.S_IEXEC)
+    if subprocess.run([str(target), "--help"], capture_output=True).returncode not in (0, 1):
+        pytest.skip("bundled osmconvert cannot run here")
+    return str(target)
+
+
+@pytest.fixture
+def grid_db():
+    """Builds a `make_router`-like database of a size x size street grid; returns its roads."""
+    def build(path: str, size: int = 12, seed: int = 3) -> list:
+        # GRADE size x size COM ~100 M ENTRE NOS, CUSTOS ALEATORIOS E ALGUMAS MAOS UNICAS
+        rng = np.random.default_rng(seed)
+        connection = sqlite3.connect(path)
+        connection.executescript(
+            "CREATE TABLE roads_nodes (node_id INTEGER PRIMARY KEY, geometry BLOB);"
+            "CREATE TABLE roads (id INTEGER PRIMARY KEY, node_from INTEGER, node_to INTEGER, "
+            "oneway_fromto INTEGER, oneway_tofrom INTEGER, length DOUBLE, cost DOUBLE, geometry BLOB);"
+        )
+        node = lambda i, j: 1000 + i * size + j
+        for i in range(size):
+            for j in range(size):
+                x, y = -49.3 + j * 0.001, -16.7 + i * 0.0009
+                connection.execute("INSERT INTO roads_nodes VALUES (?, ?)", (
+                    node(i, j), struct.pack("<BBi4dBi2dB", 0, 1, 4326, x, y, x, y, 0x7C, 1, x, y, 0xFE)))
+        roads = []
+        for i in range(size):
+            for j in range(size):
+                for di, dj in ((0, 1), (1, 0)):
+                    if i + di < size and j + dj < size:
+                        length = 100.0 * rng.uniform(1.0, 1.3)
+                        cost = length / rng.uniform(5, 25)
+                        oneway = rng.random() < 0.15
+                        roads.append((len(roads) + 1, node(i, j), node(i + di, j + dj), 1, 0 if oneway else 1, length, cost))
+        connection.executemany("INSERT INTO roads VALUES (?, ?, ?, ?, ?, ?, ?, NULL)", roads)
+        connection.commit()
+        connection.close()
+        return roads
+    return build
+
+
+@pytest.fixture
+def virtual_routing_db():
+    """
+    Builds a router database whose `router_time`/`router_dist` are virtual tables taking
+    `UPDATE ... SET Algorithm/Options/Delimiter`, like VirtualRouting (FTS5 stands in for
+    it without `mod_spatialite`); skips where this sqlite3 has no FTS5.
+    """
+    def build(path: str, lonlat: list = ()) -> str:
+        connection = sqlite3.connect(path)
+        try:
+            for table in ("router_time", "router_dist"):
+                connection.execute(f"CREATE VIRTUAL TABLE {table} USING fts5(Algorithm, Options, Delimiter)")
+        except sqlite3.OperationalError:
+            connection.close()
+            pytest.skip("this sqlite3 has no FTS5")
+        connection.execute("CREATE TABLE roads_nodes (node_id INTEGER PRIMARY KEY, geometry BLOB)")
+        connection.executemany(
+            "INSERT INTO roads_nodes VALUES (?, ?)",
+            ((i, struct.pack("<BBi4dBi2dB", 0, 1, 4326, x, y, x, y, 0x7C, 1, x, y, 0xFE))
+             for i, (x, y) in enumerate(lonlat, start=1)),
+        )
+        connection.commit()
+        connection.close()
+        return path
+    return build
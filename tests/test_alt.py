@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+from modules.routing.alt import Landmarks, _dijkstra, _solver, alt_path
+from modules.routing.graph import GraphRouter, GraphSnapshot, export_graph
+
+
+def test_alt_bounds_are_exact_lower_bounds_and_cut_settled_nodes(tmp_path, grid_db):
+    db = str(tmp_path / "streets.sqlite")
+    grid_db(db, size=20)
+    GRAPH = GraphSnapshot(export_graph(db))
+    ALT = Landmarks.build(GRAPH, metric="time", count=8)
+    assert len(ALT) == 8 and len(set(ALT.landmarks.tolist())) == 8
+    ALT = Landmarks.load(ALT.save(alt_path(db, "time")))
+    assert ALT.forward.shape == ALT.backward.shape == (len(GRAPH), 8)
+
+    ROUTER = GraphRouter(GRAPH, landmarks=[ALT])
+    with pytest.raises(ValueError):
+        ROUTER.shortest_path(1000, 1001, "length", "alt")
+
+    settled = {"astar": 0, "alt": 0}
+    rng = np.random.default_rng(2)
+    for source, target in rng.integers(1000, 1000 + 400, size=(30, 2)).tolist():
+        expected = ROUTER.shortest_path(source, target, "time")
+        # O LIMITE NUNCA PASSA DO CUSTO REAL ATE O DESTINO
+        bound = ALT.bound(GRAPH.index(source), GRAPH.index(target), active=None)
+        if expected["cost"] is not None:
+            assert bound(GRAPH.index(source)) <= expected["cost"] + 1e-9
+        for algorithm in settled:
+            result = ROUTER.shortest_path(source, target, "time", algorithm)
+            settled[algorithm] += result["settled"]
+            if expected["cost"] is None:
+                assert result["cost"] is None
+            else:
+                assert result["cost"] == pytest.approx(expected["cost"], rel=1e-6)
+    assert settled["alt"] < settled["astar"]
+    assert Landmarks.open(db, "time").metric == "time"
+
+
+def test_stale_landmarks_are_rebuilt_by_open_and_refused_by_the_router(tmp_path, grid_db):
+    db = str(tmp_path / "streets.sqlite")
+    grid_db(db, size=6)
+    GRAPH = GraphSnapshot(export_graph(db))
+    STALE = Landmarks.open(db, "time", count=4)
+    assert STALE.source == GRAPH.meta["source"]
+    assert Landmarks.load(alt_path(db, "time")).source == GRAPH.meta["source"]
+
+    # MESMA CONTAGEM DE NOS, OUTRO BANCO: A CONTAGEM SOZINHA NAO PEGARIA
+    stat = os.stat(db)
+    os.utime(db, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    GRAPH = GraphSnapshot(export_graph(db))
+    assert len(STALE.node_ids) == len(GRAPH)
+    with pytest.raises(ValueError):
+        GraphRouter(GRAPH, landmarks=[STALE])
+    ALT = Landmarks.open(db, "time", count=4)
+    assert ALT.source == GRAPH.meta["source"]
+    GraphRouter(GRAPH, landmarks=[ALT])
+
+
+def test_compiled_trees_keep_the_cheapest_parallel_arc_and_zero_weights():
+    pytest.importorskip("scipy")
+    # 0 -> 1 DUAS VEZES (5 E 2), 1 -> 2 COM PESO ZERO, 2 -> 0; 3 ISOLADO
+    csr = {
+        "offsets": np.array([0, 2, 3, 4, 4]),
+        "targets": np.array([1, 1, 2, 0]),
+        "time": np.array([5.0, 2.0, 0.0, 1.0]),
+    }
+    for source in range(4):
+        expected = _dijkstra(csr, "time", source, 4)
+        assert np.array_equal(_solver(csr, "time", 4)(source), expected)
+    assert _solver(csr, "time", 4)(0).tolist() == [0.0, 2.0, 2.0, np.inf]
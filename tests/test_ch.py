@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import pytest
+
+from modules.routing.ch import ContractionHierarchy, ch_path
+from modules.routing.graph import GraphRouter, GraphSnapshot, export_graph
+
+
+def test_contraction_hierarchy_matches_dijkstra_and_unpacks_roads(tmp_path, grid_db):
+    db = str(tmp_path / "streets.sqlite")
+    roads = grid_db(db, size=15)
+    GRAPH = GraphSnapshot(export_graph(db))
+    DIJKSTRA = GraphRouter(GRAPH)
+    length = {road[0]: road[5] for road in roads}
+    ends = {road[0]: (road[1], road[2], road[4]) for road in roads}
+
+    for metric in ("time", "length"):
+        CH = ContractionHierarchy.build(GRAPH, metric=metric)
+        assert CH.report["shortcuts"] > 0 and sorted(CH.rank.tolist()) == list(range(len(GRAPH)))
+        CH = ContractionHierarchy.load(CH.save(ch_path(db, metric)))
+        rng = np.random.default_rng(1)
+        for source, target in rng.integers(1000, 1000 + 225, size=(40, 2)).tolist():
+            expected = DIJKSTRA.shortest_path(source, target, metric)
+            result = CH.shortest_path(source, target)
+            if expected["cost"] is None:
+                assert result["cost"] is None
+                continue
+            assert result["cost"] == pytest.approx(expected["cost"], rel=1e-5)
+            # AS VIAS DESEMPACOTADAS FORMAM UM CAMINHO CONTINUO DE source ATE target
+            node = source
+            for edge in result["edges"]:
+                node_from, node_to, both = ends[edge]
+                assert node in (node_from, node_to) if both else node == node_from
+                node = node_to if node == node_from else node_from
+            assert node == target
+            if metric == "length":
+                assert sum(length[edge] for edge in result["edges"]) == pytest.approx(expected["cost"], rel=1e-5)
+    assert ContractionHierarchy.open(db, "time").metric == "time"
+
+
+def test_open_rebuilds_a_hierarchy_built_on_another_snapshot(tmp_path, grid_db):
+    db = str(tmp_path / "streets.sqlite")
+    grid_db(db, size=6)
+    GRAPH = GraphSnapshot(export_graph(db))
+    CH = ContractionHierarchy.open(db, "time")
+    assert CH.source == GRAPH.meta["source"]
+    assert ContractionHierarchy.load(ch_path(db, "time")).source == GRAPH.meta["source"]
+
+    # O BANCO MUDA E O SNAPSHOT E REEXPORTADO: O ARQUIVO ANTIGO NAO PODE SER REAPROVEITADO
+    stat = os.stat(db)
+    os.utime(db, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    GRAPH = GraphSnapshot(export_graph(db))
+    CH = ContractionHierarchy.open(db, "time")
+    assert CH.source == GRAPH.meta["source"] != {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    assert ContractionHierarchy.load(ch_path(db, "time")).source == GRAPH.meta["source"]
@@ -0,0 +1,65 @@
+import os
+import subprocess
+
+import pytest
+
+from modules.osmtools.filter_profile import FilterProfile, PROFILES
+from modules.osmtools.osm_filter import OSMfilter
+
+
+def test_profile_compiles_to_osmfilter_arguments(tmp_path):
+    profile = FilterProfile("bus", highways=["primary", "secondary"], tags=["name", "highway"], drop_tags=["note"])
+    assert profile.arguments() == [
+        "--keep=highway=primary =secondary",
+        "--keep-tags=all highway= name=",
+        "--drop-tags=note=",
+        "--drop-author",
+        "--drop-relations",
+    ]
+    path = profile.write(str(tmp_path / "params" / "bus.params"))
+    blocks = open(path, encoding="utf-8").read().strip().split("\n\n")
+    assert blocks[0] == "// osmfilter profile: bus"
+    assert blocks[1:] == profile.arguments()
+    with pytest.raises(ValueError):
+        FilterProfile("bad name")
+
+
+def test_osmfilter_profile_names_output_and_writes_parameter_file(tmp_path):
+    (tmp_path / "goias-latest.osm.o5m").write_bytes(b"")
+    OSMF = OSMfilter(folder_in_data=str(tmp_path))
+    OSMF.folder_params = str(tmp_path / "params")
+    OSMF.input_file = "goias-latest.osm.o5m"
+    assert OSMF._output_file.endswith("goias-latest.osm.filtered.streets.o5m")
+    assert OSMF._filter_args() == (["--keep=highway="], [])
+
+    OSMF.profile = "truck"
+    assert OSMF.profile is PROFILES["truck"]
+    assert OSMF._output_file.endswith("goias-latest.osm.filtered.truck.o5m")
+    args, inputs = OSMF._filter_args()
+    assert args == [f"--parameter-file={inputs[0]}"]
+    assert "hgv=" in open(inputs[0], encoding="utf-8").read()
+
+    with pytest.raises(ValueError):
+        OSMF.profile = "boat"
+    with pytest.raises(TypeError):
+        OSMF.profile = 42
+
+
+def test_iter_run_kills_osmfilter_after_the_timeout_and_drops_the_tee(tmp_path):
+    hung = tmp_path / "osmfilter"
+    hung.write_text("#!/bin/sh\nprintf filtered\nexec sleep 60\n")
+    hung.chmod(0o755)
+    (tmp_path / "goias-latest.osm.o5m").write_bytes(b"")
+    OSMF = OSMfilter(folder_in_data=str(tmp_path))
+    OSMF.file_bin = str(hung)
+    OSMF.timeout = 0.5
+    OSMF.input_file = "goias-latest.osm.o5m"
+    tee = str(tmp_path / "tee.o5m")
+
+    received = []
+    with pytest.raises(subprocess.TimeoutExpired):
+        for chunk in OSMF.iter_run(tee_path=tee):
+            received.append(chunk)
+    assert b"".join(received) == b"filtered"
+    assert OSMF.telemetry["timed_out"]
+    assert not os.path.exists(tee) and not os.path.exists(f"{tee}.part")
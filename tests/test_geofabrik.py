@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from modules.geofabrik import (
+    DateExtractor,
+    FileDownloader,
+    GeofabrikCatalog,
+    GeofabrikPage,
+    LinkExtractor,
+    MultiProtobufDownloader,
+    ProtobufDownloader,
+)
+
+
+def test_multi_region_download_reports_each_region(tmp_path, monkeypatch, http_root, http_server, region_page):
+    monkeypatch.chdir(tmp_path)
+    for country in ("paraguay", "uruguay"):
+        (http_root / f"{country}.html").write_text(region_page(country))
+        (http_root / f"{country}-latest.osm.pbf").write_bytes(country.encode() * 1000)
+    regions = [(f"{http_server}/{country}.html", country) for country in ("paraguay", "uruguay")]
+    regions.append((f"{http_server}/missing.html", "chile"))
+
+    multi = MultiProtobufDownloader(regions, max_workers=3, path_data=str(tmp_path / "data"))
+    report = multi.run()
+
+    assert list(report) == ["paraguay", "uruguay", "chile"]
+    assert report["paraguay"]["status"] == "downloaded"
+    assert open(report["uruguay"]["path"], "rb").read() == b"uruguay" * 1000
+    assert report["chile"]["status"] == "failed"
+    assert "404" in report["chile"]["error"]
+    # A segunda execucao nao baixa nada novamente
+    assert multi.run()["paraguay"]["status"] == "up-to-date"
+    assert len({id(d.fetcher) for d in multi.downloaders.values()}) == 1
+
+
+def test_interrupted_download_resumes_and_checks_md5(tmp_path, http_root, http_server, drop_transfer):
+    payload = os.urandom(300_000)
+    (http_root / "brazil-latest.osm.pbf").write_bytes(payload)
+    (http_root / "brazil-latest.osm.pbf.md5").write_text(
+        f"{hashlib.md5(payload).hexdigest()}  brazil-latest.osm.pbf\n"
+    )
+    drop_transfer("/brazil-latest.osm.pbf", 200_000)
+    url = f"{http_server}/brazil-latest.osm.pbf"
+    dest = str(tmp_path / "brazil-latest.osm.pbf")
+
+    downloader = FileDownloader(chunk_size=10_000, checkpoint_every=50_000, retries=0)
+    status, errors = downloader.download(url, dest, md5_url=f"{url}.md5")
+    assert not status and errors
+    assert os.path.getsize(f"{dest}.part") >= 150_000
+
+    status, path = downloader.download(url, dest, md5_url=f"{url}.md5")
+    assert status and path == dest
+    assert open(dest, "rb").read() == payload
+    assert not os.path.exists(f"{dest}.part") and not os.path.exists(f"{dest}.part.json")
+
+
+def test_complete_part_answered_with_416_is_finalized_or_restarted(tmp_path, http_root, http_server):
+    payload = os.urandom(50_000)
+    (http_root / "brazil-latest.osm.pbf").write_bytes(payload)
+    url = f"{http_server}/brazil-latest.osm.pbf"
+    dest = str(tmp_path / "brazil-latest.osm.pbf")
+    downloader = FileDownloader(chunk_size=10_000, retries=0)
+
+    # QUEDA ENTRE O ULTIMO BYTE E O os.replace: O Range bytes=50000- RECEBE 416
+    def interrupted(part: bytes) -> None:
+        open(f"{dest}.part", "wb").write(part)
+        checkpoint = {"url": url, "etag": None, "last_modified": None, "size": len(payload), "offset": len(part)}
+        json.dump(checkpoint, open(f"{dest}.part.json", "w"))
+
+    interrupted(payload)
+    status, path = downloader.download(url, dest, expected_md5=hashlib.md5(payload).hexdigest())
+    assert status and open(path, "rb").read() == payload
+    assert not os.path.exists(f"{dest}.part") and not os.path.exists(f"{dest}.part.json")
+
+    # PARTE DO MESMO TAMANHO MAS CORROMPIDA, OU MAIOR QUE O ARQUIVO: DESCARTA E BAIXA DE NOVO
+    for part in (b"x" * len(payload), payload + b"tail"):
+        os.remove(dest)
+        interrupted(part)
+        status, path = downloader.download(url, dest, expected_md5=hashlib.md5(payload).hexdigest())
+        assert status and open(path, "rb").read() == payload
+        assert not os.path.exists(f"{dest}.part") and not os.path.exists(f"{dest}.part.json")
+
+
+def test_corrupt_download_is_rejected(tmp_path, http_root, http_server):
+    (http_root / "brazil-latest.osm.pbf").write_bytes(b"corrupted")
+    (http_root / "brazil-latest.osm.pbf.md5").write_text(f"{'0' * 32}  brazil-latest.osm.pbf\n")
+    url = f"{http_server}/brazil-latest.osm.pbf"
+    dest = str(tmp_path / "brazil-latest.osm.pbf")
+
+    status, errors = FileDownloader().download(url, dest, md5_url=f"{url}.md5")
+
+    assert not status
+    assert "MD5" in errors[-1]
+    assert not os.path.exists(dest) and not os.path.exists(f"{dest}.part")
+
+
+def test_unchanged_page_short_circuits_without_parsing(tmp_path, monkeypatch, http_root, http_server, region_page):
+    monkeypatch.chdir(tmp_path)
+    (http_root / "brazil.html").write_text(region_page("brazil"))
+    (http_root / "brazil-latest.osm.pbf").write_bytes(b"pbf")
+
+    assert ProtobufDownloader(url=f"{http_server}/brazil.html").run()
+
+    downloader = ProtobufDownloader(url=f"{http_server}/brazil.html")
+    monkeypatch.setattr(downloader.dtextract, "extract", lambda html: pytest.fail("HTML parsed"))
+    assert downloader.run() == downloader.path_file
+    assert downloader.status == "up-to-date"
+
+    (http_root / "brazil.html").write_text(region_page("brazil", date="2025-02-01T20:21:00Z"))
+    downloader = ProtobufDownloader(url=f"{http_server}/brazil.html")
+    downloader.run()
+    assert downloader.status == "downloaded"
+
+
+def test_geofabrik_page_indexes_links_and_dates_in_one_pass():
+    html = (
+        "<html><body><p>Last modified <b>2025-03-04T21:22:23Z</b>; next 2025-03-05T21:22:23Z</p>"
+        '<a href="south-america/brazil.html">Brazil</a>'
+        '<a href="south-america/brazil-latest.osm.pbf">pbf</a>'
+        '<a href="south-america/brazil-latest.osm.pbf.md5">md5</a>'
+        '<a href="south-america/sao-paulo-latest.osm.pbf">pbf</a>'
+        "</body></html>"
+    )
+    page = GeofabrikPage(html, "https://download.geofabrik.de/south-america.html")
+
+    assert page.date == "2025-03-04T21:22:23Z"
+    assert page.timestamps == ["2025-03-04T21:22:23Z", "2025-03-05T21:22:23Z"]
+    assert page.extract("Brazil") == "https://download.geofabrik.de/south-america/brazil-latest.osm.pbf"
+    assert set(page.extracts) == {"brazil", "sao-paulo"}
+    assert page.extract("paulo").endswith("sao-paulo-latest.osm.pbf")
+    assert page.extract("chile") is None
+    assert DateExtractor().extract(page) == page.date
+    assert LinkExtractor("sao-paulo").extract(page, page.base_url) == page.extracts["sao-paulo"]
+    with pytest.raises(ValueError):
+        LinkExtractor("chile").extract(html, page.base_url)
+
+
+def _index(base_url):
+    def feature(region_id, parent, coordinates):
+        return {
+            "type": "Feature",
+            "properties": {
+                "id": region_id,
+                "parent": parent,
+                "name": region_id.title(),
+                "urls": {
+                    "pbf": f"{base_url}/{region_id}-latest.osm.pbf",
+                    "updates": f"{base_url}/{region_id}-updates",
+                },
+            },
+            "geometry": {"type": "MultiPolygon", "coordinates": coordinates},
+        }
+
+    square = [[[-50.0, -17.0], [-49.0, -17.0], [-49.0, -16.0], [-50.0, -17.0]]]
+    hole = [[-49.6, -16.6], [-49.4, -16.6], [-49.4, -16.4], [-49.6, -16.6]]
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            feature("south-america", None, [square]),
+            feature("centro-oeste", "brazil", [[square[0], hole]]),
+        ],
+    }
+
+
+def test_catalog_resolves_regions_and_writes_poly(tmp_path, http_root, http_server):
+    (http_root / "index-v1.json").write_text(json.dumps(_index(http_server)))
+    cache_path = str(tmp_path / "cache" / "index-v1.json")
+
+    catalog = GeofabrikCatalog(url=f"{http_server}/index-v1.json", cache_path=cache_path)
+    region = catalog.resolve("centro-oeste")
+    assert region["pbf"] == f"{http_server}/centro-oeste-latest.osm.pbf"
+    assert region["md5"] == f"{region['pbf']}.md5"
+    assert region["updates"] == f"{http_server}/centro-oeste-updates"
+    assert region["parent"] == "brazil"
+    with pytest.raises(KeyError):
+        catalog.resolve("atlantis")
+
+    # DENTRO DO TTL A COPIA LOCAL E USADA SEM ACESSAR O SERVIDOR
+    (http_root / "index-v1.json").unlink()
+    assert GeofabrikCatalog(url=f"{http_server}/index-v1.json", cache_path=cache_path).resolve("south-america")
+
+    poly = open(catalog.write_poly("centro-oeste", str(tmp_path / "co.poly"))).read().split("\n")
+    assert poly[0] == "centro-oeste"
+    assert poly[1] == "1" and "!2" in poly
+    assert poly[-3:] == ["END", "END", ""]
+
+
+def test_downloader_uses_catalog_instead_of_html(tmp_path, monkeypatch, http_root, http_server):
+    monkeypatch.chdir(tmp_path)
+    (http_root / "index-v1.json").write_text(json.dumps(_index(http_server)))
+    (http_root / "centro-oeste-latest.osm.pbf").write_bytes(b"pbf")
+    (http_root / "centro-oeste-latest.osm.pbf.md5").write_text(f"{hashlib.md5(b'pbf').hexdigest()}  x\n")
+    catalog = GeofabrikCatalog(url=f"{http_server}/index-v1.json", cache_path=str(tmp_path / "index.json"))
+
+    downloader = ProtobufDownloader(url="unused", country="centro-oeste", catalog=catalog)
+    monkeypatch.setattr(downloader.fetcher, "fetch", lambda url: pytest.fail("HTML fetched"))
+    assert open(downloader.run(), "rb").read() == b"pbf"
+    assert downloader.status == "downloaded"
+    downloader.run()
+    assert downloader.status == "up-to-date"
@@ -0,0 +1,57 @@
+import heapq
+import math
+
+import numpy as np
+import pytest
+
+from modules.routing.graph import GraphRouter, GraphSnapshot, export_graph, graph_path
+
+
+def _reference(roads, source, target, column):
+    adjacency = {}
+    for road in roads:
+        weight = road[5] if column == "length" else road[6]
+        adjacency.setdefault(road[1], []).append((road[2], weight))
+        if road[4]:
+            adjacency.setdefault(road[2], []).append((road[1], weight))
+    cost, heap = {source: 0.0}, [(0.0, source)]
+    while heap:
+        g, node = heapq.heappop(heap)
+        if node == target:
+            return g
+        if g > cost[node]:
+            continue
+        for head, weight in adjacency.get(node, []):
+            if g + weight < cost.get(head, math.inf):
+                cost[head] = g + weight
+                heapq.heappush(heap, (g + weight, head))
+    return None
+
+
+def test_snapshot_routes_match_a_plain_dijkstra(tmp_path, grid_db):
+    db = str(tmp_path / "streets.sqlite")
+    roads = grid_db(db)
+    folder = export_graph(db)
+    assert folder == graph_path(db)
+
+    GRAPH = GraphSnapshot(folder)
+    assert isinstance(GRAPH.fwd["targets"], np.memmap) and GRAPH.coords.dtype == np.int32
+    assert GRAPH.meta["arcs"] == sum(2 if road[4] else 1 for road in roads)
+    assert GRAPH.lonlat(GRAPH.index(1000)) == pytest.approx((-49.3, -16.7))
+
+    ROUTER = GraphRouter(GRAPH)
+    length = {road[0]: road[5] for road in roads}
+    rng = np.random.default_rng(0)
+    for source, target in rng.integers(1000, 1000 + 144, size=(25, 2)).tolist():
+        for metric in ("time", "length"):
+            expected = _reference(roads, source, target, metric)
+            for algorithm in ("bidijkstra", "astar"):
+                result = ROUTER.shortest_path(source, target, metric, algorithm)
+                if expected is None:
+                    assert result["cost"] is None
+                    continue
+                assert result["cost"] == pytest.approx(expected, rel=1e-5)
+                if metric == "length":
+                    assert sum(length[edge] for edge in result["edges"]) == pytest.approx(expected, rel=1e-5)
+    with pytest.raises(KeyError):
+        ROUTER.shortest_path(1, 1000)
@@ -0,0 +1,71 @@
+from functools import partial
+import csv
+import os
+import sqlite3
+import struct
+
+import numpy as np
+
+import modules.routing.matrix as matrix
+from modules.osmtools.spatialite_sql import SpatialiteSQL
+from modules.routing import TravelMatrix
+
+
+def _nodes_db(path, lonlat):
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE roads_nodes (node_id INTEGER PRIMARY KEY, geometry BLOB)")
+    connection.executemany(
+        "INSERT INTO roads_nodes VALUES (?, ?)",
+        ((i, struct.pack("<BBi4dBi2dB", 0, 1, 4326, x, y, x, y, 0x7C, 1, x, y, 0xFE))
+         for i, (x, y) in enumerate(lonlat, start=1)),
+    )
+    connection.commit()
+    connection.close()
+
+
+def test_matrix_routes_each_node_once_and_expands_repeated_points(tmp_path, monkeypatch):
+    db = str(tmp_path / "streets.sqlite")
+    _nodes_db(db, [(-49.0 - 0.01 * i, -16.7) for i in range(10)])
+    calls = []
+
+    # SEM mod_spatialite AQUI: O CUSTO ENTRE NOS E |a - b|, PARA CONFERIR A MONTAGEM DA MATRIZ
+    def block(origins, destinations, batch):
+        calls.append(origins.tolist())
+        return np.abs(origins[:, None] - destinations[None, :]).astype(float)
+
+    monkeypatch.setattr(matrix, "_init_worker", lambda *args: matrix._WORKER.update(sql=sqlite3.connect(":memory:")))
+    monkeypatch.setattr(matrix, "_origin_block", block)
+
+    MATRIX = TravelMatrix(db, max_workers=1)
+    # A TERCEIRA ORIGEM CAI NO MESMO NO DA PRIMEIRA
+    origins = [(-49.0, -16.7), (-49.05, -16.7), (-49.0001, -16.7)]
+    destinations = [(-49.09, -16.7), (-49.02, -16.7)]
+    costs = MATRIX.compute(origins, destinations)
+    assert costs.tolist() == [[9, 2], [4, 3], [9, 2]]
+    assert sorted(node for chunk in calls for node in chunk) == [1, 6]
+
+    path = MATRIX.write(origins, destinations, str(tmp_path / "out" / "matrix.csv"))
+    with open(path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert len(rows) == 6
+    assert {(row["origin"], row["destination"]): float(row["cost"]) for row in rows}[("1", "0")] == 4
+
+
+def test_matrix_workers_configure_virtual_routing_without_touching_the_file(tmp_path, monkeypatch, virtual_routing_db):
+    db = virtual_routing_db(str(tmp_path / "streets.sqlite"), [(-49.0 - 0.01 * i, -16.7) for i in range(3)])
+    before = os.stat(db)
+    settings = []
+
+    # O _init_worker REAL ABRE E CONFIGURA A CONEXAO; SO A CONSULTA DE ROTAS PRECISA DO mod_spatialite
+    def block(origins, destinations, batch):
+        settings.append(matrix._WORKER["sql"].query("PRAGMA journal_mode"))
+        return np.zeros((len(origins), len(destinations)))
+
+    monkeypatch.setattr(matrix, "SpatialiteSQL", partial(SpatialiteSQL, require_spatialite=False))
+    monkeypatch.setattr(matrix, "_origin_block", block)
+    costs = TravelMatrix(db, max_workers=1).compute([(-49.0, -16.7)], [(-49.01, -16.7), (-49.02, -16.7)])
+    assert costs.tolist() == [[0.0, 0.0]] and settings == [[("delete",)]]
+    assert "sql" not in matrix._WORKER
+    after = os.stat(db)
+    assert (after.st_size, after.st_mtime_ns) == (before.st_size, before.st_mtime_ns)
+    assert not os.path.exists(f"{db}-wal") and not os.path.exists(f"{db}-shm")
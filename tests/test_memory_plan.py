@@ -0,0 +1,36 @@
+from modules.osmtools.artifact_store import ArtifactStore
+from modules.osmtools.memory_plan import MemoryPlanner, MB
+
+
+def test_planner_fits_each_stage_in_its_share(tmp_path):
+    pbf = tmp_path / "region-latest.osm.pbf"
+    pbf.write_bytes(b"\0" * (8 * 1024 * 1024))
+
+    big = MemoryPlanner(budget_mb=64000, concurrency=2)
+    assert big.stage_mb == 32000
+    # A TABELA COBRE TODOS OS IDS DE NO, NO LIMITE ACEITO PELAS FERRAMENTAS
+    assert big.osmconvert(str(pbf))["hash_memory"] == int(MemoryPlanner.node_id_max / 8 / 0.9 / MB)
+    assert big.osmconvert(str(pbf))["max_objects"] == 1_000_000
+    assert big.spatialite(str(pbf)) == {"cache_size": 48 * MB // 4096, "in_memory": True}
+
+    small = MemoryPlanner(budget_mb=1000, concurrency=2)
+    assert small.osmconvert(str(pbf))["hash_memory"] == 300
+    assert small.osmfilter(str(pbf))["hash_memory"] == 400
+    assert small.split(10).osmconvert(str(pbf))["hash_memory"] == MemoryPlanner.hash_min_mb
+    assert small.split(10).spatialite(str(pbf)) == {"cache_size": 25 * MB // 4096, "in_memory": False}
+    assert small.osmconvert(None)["max_objects"] == 1_000_000
+
+
+def test_artifact_key_ignores_tuning_options(tmp_path):
+    binary = tmp_path / "tool"
+    binary.write_bytes(b"binary")
+    source = tmp_path / "in.pbf"
+    source.write_bytes(b"data")
+    store = ArtifactStore(root=str(tmp_path / "store"))
+
+    def key(*tuning):
+        args = [str(binary), str(source), "-o", "out.db", *tuning]
+        return store.key(str(binary), args, [str(source)], ["out.db"])
+
+    assert key("--hash-memory=300", "-cs", "2000") == key("--hash-memory=4000", "-cs", "90000") == key()
+    assert key("--drop-author") != key()
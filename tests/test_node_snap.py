@@ -0,0 +1,63 @@
+import sqlite3
+import struct
+import os
+
+import numpy as np
+import pytest
+
+from modules.osmtools.node_snap import NodeSnapIndex, point_blobs_xy, snap_path
+
+
+def _point(x, y, srid=4326):
+    # BLOB DE PONTO DO SPATIALITE (LITTLE ENDIAN)
+    return struct.pack("<BBi4dBi2dB", 0x00, 0x01, srid, x, y, x, y, 0x7C, 1, x, y, 0xFE)
+
+
+def _nodes_db(path, lonlat):
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE roads_nodes (node_id INTEGER PRIMARY KEY, geometry BLOB)")
+    connection.executemany(
+        "INSERT INTO roads_nodes VALUES (?, ?)",
+        ((10 * (i + 1), _point(x, y)) for i, (x, y) in enumerate(lonlat)),
+    )
+    connection.commit()
+    connection.close()
+
+
+def test_point_blobs_are_read_without_spatialite():
+    blobs = [_point(-49.27, -16.78), struct.pack(">BBi4dBi2dB", 0, 0, 4326, 1, 2, 1, 2, 0x7C, 1, 1.5, 2.5, 0xFE)]
+    assert point_blobs_xy(blobs).tolist() == [[-49.27, -16.78], [1.5, 2.5]]
+    with pytest.raises(ValueError):
+        point_blobs_xy([b"\x00" * 60])
+
+
+def test_nearest_matches_brute_force_and_index_persists_next_to_db(tmp_path):
+    rng = np.random.default_rng(7)
+    # UMA CIDADE DENSA E NOS ESPALHADOS EM VOLTA
+    lonlat = np.concatenate([
+        np.column_stack((rng.normal(-49.25, 0.02, 3000), rng.normal(-16.7, 0.02, 3000))),
+        np.column_stack((rng.uniform(-50.5, -48, 500), rng.uniform(-18, -15.5, 500))),
+    ])
+    db = str(tmp_path / "streets.sqlite")
+    _nodes_db(db, lonlat)
+
+    SNAP = NodeSnapIndex.open(db)
+    assert os.path.exists(snap_path(db)) and len(SNAP) == 3500
+    lons = np.r_[rng.uniform(-51, -47.5, 300), -60.0]
+    lats = np.r_[rng.uniform(-18.5, -15, 300), 5.0]
+    ids, meters = SNAP.nearest_many(lons, lats)
+    xy = np.column_stack((lonlat[:, 0] * SNAP.scale, lonlat[:, 1]))
+    for i, (lon, lat) in enumerate(zip(lons, lats)):
+        j = np.argmin(((xy - (lon * SNAP.scale, lat)) ** 2).sum(axis=1))
+        assert ids[i] == 10 * (j + 1)
+        assert SNAP.nearest(lon, lat) == (ids[i], pytest.approx(meters[i]))
+    # MUITO LONGE DA MALHA A BUSCA SO AMPLIA, NAO FALHA
+    assert meters[-1] > 1_000_000
+
+    # O INDICE GRAVADO E REUSADO ATE O BANCO MUDAR
+    LOADED = NodeSnapIndex.open(db)
+    assert np.array_equal(LOADED.node_ids, SNAP.node_ids) and LOADED.shape == SNAP.shape
+    assert np.array_equal(LOADED.nearest_many(lons, lats)[0], ids)
+    _nodes_db(str(tmp_path / "other.sqlite"), [(0.0, 0.0)])
+    os.replace(tmp_path / "other.sqlite", db)
+    assert len(NodeSnapIndex.open(db)) == 1
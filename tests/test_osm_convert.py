@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import subprocess
+
+import pytest
+
+from modules.geofabrik import GeofabrikCatalog, ProtobufDownloader
+from modules.osmtools.artifact_store import ArtifactStore
+from modules.osmtools.osm_convert import OSMConvert
+from modules.osmtools.osm_shard import OSMShard
+
+BASE_OSM = """<?xml version='1.0' encoding='UTF-8'?>
+<osm version="0.6">
+  <node id="1" version="1" lat="-16.70" lon="-49.20"/>
+  <node id="2" version="1" lat="-16.71" lon="-49.21"/>
+  <way id="10" version="1"><nd ref="1"/><nd ref="2"/><tag k="highway" v="primary"/></way>
+</osm>
+"""
+
+
+@pytest.fixture
+def pbf_bytes(tmp_path, osmconvert_bin):
+    (tmp_path / "base.osm").write_text(BASE_OSM)
+    subprocess.run([osmconvert_bin, str(tmp_path / "base.osm"), f"-o={tmp_path / 'base.pbf'}"], check=True)
+    return (tmp_path / "base.pbf").read_bytes()
+
+
+@pytest.fixture
+def converter(tmp_path, osmconvert_bin):
+    converter = OSMConvert(
+        base_path_in=str(tmp_path / "data" / "external"),
+        base_path_out=str(tmp_path / "data" / "processed"),
+        type_osm_in="pbf",
+        type_osm_out="o5m",
+    )
+    converter.file_bin = osmconvert_bin
+    converter.complete_ways = True
+    return converter
+
+
+def _stream_downloader(tmp_path, http_root, http_server, payload, md5):
+    index = {"features": [{"properties": {"id": "goias", "urls": {"pbf": f"{http_server}/goias-latest.osm.pbf"}}}]}
+    (http_root / "index.json").write_text(json.dumps(index))
+    (http_root / "goias-latest.osm.pbf").write_bytes(payload)
+    (http_root / "goias-latest.osm.pbf.md5").write_text(f"{md5}  goias-latest.osm.pbf\n")
+    catalog = GeofabrikCatalog(url=f"{http_server}/index.json", cache_path=str(tmp_path / "index.json"))
+    return ProtobufDownloader(country="goias", path_data=str(tmp_path / "data"), catalog=catalog)
+
+
+def test_stream_download_into_osmconvert(tmp_path, http_root, http_server, pbf_bytes, converter, osmconvert_bin, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    downloader = _stream_downloader(tmp_path, http_root, http_server, pbf_bytes, hashlib.md5(pbf_bytes).hexdigest())
+
+    output = downloader.run_stream(converter, keep_pbf=True)
+
+    assert output.endswith("goias-latest.osm.o5m")
+    osm = subprocess.run([osmconvert_bin, output], capture_output=True, text=True).stdout
+    assert 'way id="10"' in osm
+    assert open(downloader.path_file, "rb").read() == pbf_bytes
+    assert "--complete-ways" not in converter.args
+
+
+def test_stream_rejects_corrupt_download(tmp_path, http_root, http_server, pbf_bytes, converter, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    downloader = _stream_downloader(tmp_path, http_root, http_server, pbf_bytes, "0" * 32)
+
+    assert downloader.run_stream(converter) is None
+    assert downloader.status == "failed"
+    assert not (tmp_path / "data" / "processed" / "o5m" / "goias-latest.osm.o5m").exists()
+
+
+def test_stream_that_times_out_is_reported_as_failed(tmp_path, http_root, http_server, pbf_bytes, converter, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    downloader = _stream_downloader(tmp_path, http_root, http_server, pbf_bytes, hashlib.md5(pbf_bytes).hexdigest())
+    hung = tmp_path / "hung"
+    hung.write_text("#!/bin/sh\nexec sleep 60\n")
+    hung.chmod(0o755)
+    converter.file_bin = str(hung)
+    converter.timeout = 0.5
+
+    assert downloader.run_stream(converter) is None
+    assert downloader.status == "failed"
+    assert not os.listdir(tmp_path / "data" / "processed" / "o5m")
+
+
+def test_artifact_store_key_ignores_paths(tmp_path, osmconvert_bin):
+    store = ArtifactStore(root=str(tmp_path / "artifacts"))
+    (tmp_path / "a.pbf").write_bytes(b"same")
+    (tmp_path / "b.pbf").write_bytes(b"same")
+    key_a = store.key(osmconvert_bin, [osmconvert_bin, str(tmp_path / "a.pbf"), "-o=x.o5m"], [str(tmp_path / "a.pbf")], ["x.o5m"])
+    key_b = store.key(osmconvert_bin, [osmconvert_bin, str(tmp_path / "b.pbf"), "-o=y.o5m"], [str(tmp_path / "b.pbf")], ["y.o5m"])
+    key_flag = store.key(osmconvert_bin, [osmconvert_bin, str(tmp_path / "a.pbf"), "--drop-author", "-o=x.o5m"], [str(tmp_path / "a.pbf")], ["x.o5m"])
+
+    assert key_a == key_b
+    assert key_a != key_flag
+
+
+def test_artifact_store_reuses_osmconvert_output(tmp_path, pbf_bytes, converter, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "external" / "pbf").mkdir(parents=True, exist_ok=True)
+    (tmp_path / "data" / "external" / "pbf" / "goias-latest.osm.pbf").write_bytes(pbf_bytes)
+    store = ArtifactStore(root=str(tmp_path / "artifacts"))
+    converter.artifact_store = store
+    converter.verbose = False
+    converter.input_file = "goias-latest.osm.pbf"
+    converter.run()
+    output = converter._output_file
+    produced = open(output, "rb").read()
+    key = store.key(converter.file_bin, converter.args, [converter._input_file], [output])
+    os.remove(output)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("osmconvert should not run on a cache hit")
+    with monkeypatch.context() as patch:
+        patch.setattr(subprocess, "run", fail)
+        patch.setattr(subprocess, "Popen", fail)
+        assert converter.run()
+    assert open(output, "rb").read() == produced
+
+    # A NOVA EXECUCAO REESCREVE A SAIDA SEM TOCAR NO ARTEFATO HARDLINKADO
+    converter.drop_author = True
+    converter.drop_version = True
+    converter.run()
+    assert store.fetch(key, [str(tmp_path / "copy.o5m")])
+    assert (tmp_path / "copy.o5m").read_bytes() == produced
+
+
+def test_run_that_times_out_keeps_the_previous_output_and_drops_the_part(tmp_path, pbf_bytes, converter, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "external" / "pbf").mkdir(parents=True, exist_ok=True)
+    (tmp_path / "data" / "external" / "pbf" / "goias-latest.osm.pbf").write_bytes(pbf_bytes)
+    converter.input_file = "goias-latest.osm.pbf"
+    output = converter._output_file
+    (tmp_path / "stored.o5m").write_bytes(b"previous")
+    os.link(tmp_path / "stored.o5m", output)
+    hung = tmp_path / "hung"
+    hung.write_text('#!/bin/sh\nfor a; do case "$a" in -o=*) echo partial > "${a#-o=}";; esac; done\nexec sleep 60\n')
+    hung.chmod(0o755)
+    converter.file_bin = str(hung)
+    converter.timeout = 0.5
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        converter.run()
+    assert open(output, "rb").read() == b"previous"
+    assert (tmp_path / "stored.o5m").read_bytes() == b"previous"
+    assert not os.path.exists(f"{output}.part")
+
+
+WIDE_OSM = """<?xml version='1.0' encoding='UTF-8'?>
+<osm version="0.6">
+  <node id="1" version="1" lat="-16.70" lon="-49.90"/>
+  <node id="2" version="1" lat="-16.70" lon="-49.50"/>
+  <node id="3" version="1" lat="-16.70" lon="-49.10"/>
+  <node id="4" version="1" lat="-16.60" lon="-49.05"/>
+  <way id="10" version="1"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="primary"/></way>
+  <way id="11" version="1"><nd ref="3"/><nd ref="4"/><tag k="highway" v="residential"/></way>
+</osm>
+"""
+
+
+def test_sharded_preprocessing_merges_border_ways_once(tmp_path, osmconvert_bin):
+    (tmp_path / "external" / "pbf").mkdir(parents=True)
+    (tmp_path / "wide.osm").write_text(WIDE_OSM)
+    subprocess.run([osmconvert_bin, str(tmp_path / "wide.osm"), f"-o={tmp_path / 'external' / 'pbf' / 'wide.osm.pbf'}"], check=True)
+
+    shard = OSMShard(
+        "wide.osm.pbf",
+        shards=3,
+        max_workers=3,
+        base_path_in=str(tmp_path / "external"),
+        folder_work=str(tmp_path / "shards"),
+        output_file=str(tmp_path / "merged.pbf"),
+        apply_filter=False,
+    )
+    shard.file_bin = osmconvert_bin
+    tiles = shard.tiles()
+    assert len(tiles) == 3
+    assert tiles[0][0] < -49.90 and tiles[-1][2] > -49.05
+
+    output = shard.run()
+
+    assert len(shard.report) == 3
+    osm = subprocess.run([osmconvert_bin, output, "--out-osm"], capture_output=True, text=True).stdout
+    assert osm.count('<way id="10"') == 1
+    assert osm.count('<way id="11"') == 1
+    assert osm.count('<node id="3"') == 1
+    assert not os.path.exists(shard.folder_work)
+
+
+def test_run_stream_converts_piped_o5m_to_pbf(tmp_path, pbf_bytes, osmconvert_bin):
+    (tmp_path / "base.pbf").write_bytes(pbf_bytes)
+    subprocess.run([osmconvert_bin, str(tmp_path / "base.pbf"), f"-o={tmp_path / 'base.o5m'}"], check=True)
+    converter = OSMConvert(
+        base_path_in=str(tmp_path / "processed"),
+        base_path_out=str(tmp_path / "processed"),
+        type_osm_in="o5m",
+        type_osm_out="pbf",
+    )
+    converter.file_bin = osmconvert_bin
+    payload = (tmp_path / "base.o5m").read_bytes()
+
+    converter.run_stream((payload[i:i + 7] for i in range(0, len(payload), 7)), "base.osm.filtered.streets.o5m")
+
+    assert converter._output_file.endswith("base.osm.filtered.streets.pbf")
+    osm = subprocess.run([osmconvert_bin, converter._output_file], capture_output=True, text=True).stdout
+    assert 'way id="10"' in osm
+
+
+def test_writers_replace_a_hardlinked_output_instead_of_truncating_it(tmp_path, pbf_bytes, osmconvert_bin):
+    (tmp_path / "base.pbf").write_bytes(pbf_bytes)
+    subprocess.run([osmconvert_bin, str(tmp_path / "base.pbf"), f"-o={tmp_path / 'base.o5m'}"], check=True)
+    converter = OSMConvert(
+        base_path_in=str(tmp_path / "processed"),
+        base_path_out=str(tmp_path / "processed"),
+        type_osm_in="o5m",
+        type_osm_out="pbf",
+    )
+    converter.file_bin = osmconvert_bin
+    # SAIDA QUE E UM HARDLINK DE UM OBJETO DO CACHE DE ARTEFATOS
+    cached = tmp_path / "object.pbf"
+    cached.write_bytes(b"cached artifact")
+    output = tmp_path / "processed" / "pbf" / "base.pbf"
+    os.link(cached, output)
+
+    payload = (tmp_path / "base.o5m").read_bytes()
+    converter.run_stream([payload], "base.o5m")
+    assert cached.read_bytes() == b"cached artifact"
+    assert os.stat(output).st_nlink == 1
+
+    os.remove(output)
+    os.link(cached, output)
+    converter.merge([str(tmp_path / "base.pbf")], str(output))
+    assert cached.read_bytes() == b"cached artifact"
+    assert 'way id="10"' in subprocess.run([osmconvert_bin, str(output)], capture_output=True, text=True).stdout
+
+
+def test_every_osmconvert_call_is_killed_after_the_timeout(tmp_path, converter):
+    hung = tmp_path / "bin" / "hung"
+    hung.parent.mkdir(exist_ok=True)
+    hung.write_text("#!/bin/sh\nexec sleep 60\n")
+    hung.chmod(0o755)
+    converter.file_bin = str(hung)
+    converter.timeout = 0.5
+    (tmp_path / "data" / "external" / "pbf").mkdir(parents=True, exist_ok=True)
+    (tmp_path / "data" / "external" / "pbf" / "base.pbf").write_bytes(b"")
+    converter.input_file = "base.pbf"
+    output = str(tmp_path / "merged.pbf")
+
+    calls = [
+        lambda: converter.run_stream([b"data"], "base.pbf"),
+        converter.statistics,
+        lambda: converter.merge([converter.input_file], output),
+        lambda: converter.apply_changes([str(tmp_path / "day.osc")], output),
+    ]
+    for call in calls:
+        with pytest.raises(subprocess.TimeoutExpired):
+            call()
+        assert converter.telemetry["timed_out"]
+    assert not os.path.exists(f"{output}.part") and not os.path.exists(converter.output_path("base.pbf") + ".part")
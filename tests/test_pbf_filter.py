@@ -0,0 +1,44 @@
+import subprocess
+
+import numpy as np
+
+from modules.osmtools import pbf
+from modules.osmtools.pbf_filter import PBFHighwayFilter
+
+MIXED_OSM = """<?xml version='1.0' encoding='UTF-8'?>
+<osm version="0.6">
+  <node id="1" version="1" lat="-16.70" lon="-49.20"/>
+  <node id="2" version="1" lat="-16.71" lon="-49.10"><tag k="highway" v="traffic_signals"/></node>
+  <node id="3" version="1" lat="-16.72" lon="-49.00"/>
+  <node id="4" version="1" lat="-16.73" lon="-48.90"><tag k="amenity" v="cafe"/></node>
+  <node id="5" version="1" lat="-16.74" lon="-48.80"/>
+  <way id="10" version="1"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="primary"/></way>
+  <way id="11" version="1"><nd ref="4"/><nd ref="5"/><tag k="building" v="yes"/></way>
+  <relation id="20" version="1"><member type="way" ref="10" role=""/><tag k="type" v="route"/></relation>
+</osm>
+"""
+
+
+def test_packed_varints_roundtrip():
+    values = np.array([0, 1, 127, 128, 300, 2**35, 2**63 + 5], dtype=np.uint64)
+    encoded = pbf.encode_packed(values)
+    assert encoded == b"".join(pbf.encode_varint(int(value)) for value in values)
+    assert (pbf.decode_packed(encoded) == values).all()
+    signed = np.array([-5, 0, 7, -2**40], dtype=np.int64)
+    assert (pbf.zigzag_decode(pbf.zigzag_encode(signed)) == signed).all()
+
+
+def test_native_filter_keeps_highways_and_their_nodes(tmp_path, osmconvert_bin):
+    (tmp_path / "mixed.osm").write_text(MIXED_OSM)
+    subprocess.run([osmconvert_bin, str(tmp_path / "mixed.osm"), f"-o={tmp_path / 'mixed.pbf'}"], check=True)
+
+    engine = PBFHighwayFilter(str(tmp_path / "mixed.pbf"), str(tmp_path / "out.pbf"), max_workers=2, folder_work=str(tmp_path / "work"))
+    engine.run()
+
+    osm = subprocess.run([osmconvert_bin, str(tmp_path / "out.pbf")], capture_output=True, text=True, check=True).stdout
+    assert '<way id="10"' in osm and '<way id="11"' not in osm
+    assert all(f'<node id="{node}"' in osm for node in (1, 2, 3))
+    assert '<node id="4"' not in osm and '<node id="5"' not in osm
+    assert 'v="traffic_signals"' in osm
+    assert "<relation" not in osm
+    assert engine.report["ways"] == 1 and engine.report["nodes"] == 3
@@ -0,0 +1,245 @@
+import subprocess
+import threading
+import time
+import sys
+
+import pytest
+
+from modules.pipeline import PipelineExecutor, ProcessRunner, Stage, StageJournal
+
+
+def _writer(path, calls, name, fail=None):
+    def run():
+        calls.append(name)
+        if fail is not None and fail["on"]:
+            raise RuntimeError("boom")
+        path.write_text(name)
+    return run
+
+
+def _chain(tmp_path, calls, fail):
+    a, b, c = tmp_path / "a.txt", tmp_path / "b.txt", tmp_path / "c.txt"
+    return [
+        Stage("a", _writer(a, calls, "a"), outputs=[str(a)]),
+        Stage("b", _writer(b, calls, "b"), inputs=[str(a)], outputs=[str(b)]),
+        Stage("c", _writer(c, calls, "c", fail), inputs=[str(b)], outputs=[str(c)]),
+    ]
+
+
+def test_resume_at_failed_stage(tmp_path):
+    calls, fail = [], {"on": True}
+    journal_path = str(tmp_path / "journal.json")
+
+    executor = PipelineExecutor(_chain(tmp_path, calls, fail), StageJournal(journal_path))
+    report = executor.run()
+    assert [report[name]["status"] for name in "abc"] == ["done", "done", "failed"]
+    assert executor.failed == ["c"]
+
+    fail["on"] = False
+    calls.clear()
+    report = PipelineExecutor(_chain(tmp_path, calls, fail), StageJournal(journal_path)).run()
+    assert calls == ["c"]
+    assert [report[name]["status"] for name in "abc"] == ["skipped", "skipped", "done"]
+
+    # FORCAR UMA ETAPA REEXECUTA TUDO QUE DEPENDE DELA
+    calls.clear()
+    PipelineExecutor(_chain(tmp_path, calls, fail), StageJournal(journal_path)).run(force=["b"])
+    assert calls == ["b", "c"]
+
+
+def test_uncached_stage_always_runs_and_input_content_is_part_of_the_signature(tmp_path):
+    calls, version = [], {"value": "v1"}
+    source, derived = tmp_path / "source.txt", tmp_path / "derived.txt"
+    journal_path = str(tmp_path / "journal.json")
+
+    def fetch():
+        calls.append("fetch")
+        # COMO O ProtobufDownloader: SO REESCREVE QUANDO HA VERSAO NOVA
+        if not source.exists() or source.read_text() != version["value"]:
+            source.write_text(version["value"])
+
+    def stages():
+        return [
+            Stage("fetch", fetch, outputs=[str(source)], cache=False),
+            Stage("derive", _writer(derived, calls, "derive"), inputs=[str(source)], outputs=[str(derived)]),
+        ]
+
+    PipelineExecutor(stages(), StageJournal(journal_path)).run()
+    assert calls == ["fetch", "derive"]
+
+    calls.clear()
+    report = PipelineExecutor(stages(), StageJournal(journal_path)).run()
+    assert calls == ["fetch"] and report["derive"]["status"] == "skipped"
+
+    calls.clear()
+    version["value"] = "v2-longer"
+    PipelineExecutor(stages(), StageJournal(journal_path)).run()
+    assert calls == ["fetch", "derive"]
+
+    # ENTRADA ALTERADA FORA DO PIPELINE TAMBEM INVALIDA A ETAPA
+    calls.clear()
+    source.write_text("v2-longer-edited")
+    version["value"] = "v2-longer-edited"
+    PipelineExecutor(stages(), StageJournal(journal_path)).run()
+    assert calls == ["fetch", "derive"]
+
+
+def test_missing_output_and_blocked_downstream(tmp_path):
+    calls = []
+    stages = [
+        Stage("a", lambda: calls.append("a"), outputs=[str(tmp_path / "never.txt")]),
+        Stage("b", lambda: calls.append("b"), inputs=[str(tmp_path / "never.txt")]),
+        Stage("other", lambda: calls.append("other")),
+    ]
+    report = PipelineExecutor(stages, StageJournal(str(tmp_path / "journal.json"))).run()
+
+    assert report["a"]["status"] == "failed"
+    assert report["b"]["status"] == "blocked"
+    assert report["other"]["status"] == "done"
+    assert "b" not in calls
+
+
+def test_independent_stages_run_in_parallel_unless_locked(tmp_path):
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def work():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.2)
+        with lock:
+            active[0] -= 1
+
+    stages = [Stage("root", lambda: None), Stage("x", work, after=["root"]), Stage("y", work, after=["root"])]
+    PipelineExecutor(stages, StageJournal(str(tmp_path / "j1.json")), max_workers=2).run()
+    assert peak[0] == 2
+
+    peak[0] = 0
+    stages = [Stage("x", work, locks=["db"]), Stage("y", work, locks=["db"])]
+    PipelineExecutor(stages, StageJournal(str(tmp_path / "j2.json")), max_workers=2).run()
+    assert peak[0] == 1
+
+
+def test_rejects_cycles(tmp_path):
+    stages = [Stage("a", lambda: None, after=["b"]), Stage("b", lambda: None, after=["a"])]
+    with pytest.raises(ValueError):
+        PipelineExecutor(stages, StageJournal(str(tmp_path / "journal.json")))
+
+
+class _Lines:
+    def __init__(self):
+        self.info, self.warning = [], []
+
+
+def test_process_runner_streams_output_and_reports_per_stage(tmp_path):
+    lines   = _Lines()
+    logger  = type("Logger", (), {"info": lines.info.append, "warning": lines.warning.append})()
+    script  = "import sys, time\nprint('one', flush=True)\nprint('warn', file=sys.stderr, flush=True)\nx = bytearray(50 * 2**20)\ntime.sleep(0.3)\nprint('two')\n"
+
+    def run():
+        result = ProcessRunner("tool", interval=0.05, logger=logger).run([sys.executable, "-c", script])
+        assert result.stdout == "one\ntwo" and result.stderr == "warn"
+        (tmp_path / "out.txt").write_text("ok")
+
+    report = PipelineExecutor([Stage("s", run, outputs=[str(tmp_path / "out.txt")])], StageJournal(str(tmp_path / "j.json"))).run()
+    assert lines.info == ["[tool] one", "[tool] two"] and lines.warning == ["[tool] warn"]
+    [process] = report["s"]["processes"]
+    assert process["returncode"] == 0 and process["samples"] > 0
+    assert report["s"]["peak_rss_mb"] == process["peak_rss_mb"] >= 50
+    assert process["bound"] in ("cpu", "io")
+
+    with pytest.raises(subprocess.CalledProcessError):
+        ProcessRunner("tool", logger=logger).run([sys.executable, "-c", "raise SystemExit(3)"])
+
+
+def _spawn_tree(pid_file):
+    # PROCESSO QUE CRIA UM FILHO E DORME: O TIMEOUT/CANCELAMENTO PRECISA MATAR OS DOIS
+    child = f"import subprocess, sys, time\np = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\nopen({str(pid_file)!r}, 'w').write(str(p.pid))\ntime.sleep(60)\n"
+    return [sys.executable, "-c", child]
+
+
+def _wait_pid(pid_file):
+    for _ in range(100):
+        if pid_file.exists() and pid_file.read_text():
+            return int(pid_file.read_text())
+        time.sleep(0.05)
+    raise AssertionError("child not started")
+
+
+def _gone(pid):
+    import psutil
+    try:
+        return psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return True
+
+
+def test_process_runner_timeout_and_cancel_kill_the_tree(tmp_path):
+    import asyncio
+
+    pid_file = tmp_path / "sync.pid"
+    runner = ProcessRunner("hung", logger=type("L", (), {"info": print, "warning": print})())
+    with pytest.raises(subprocess.TimeoutExpired):
+        runner.run(_spawn_tree(pid_file), timeout=1.5)
+    assert runner.summary["timed_out"] and _gone(_wait_pid(pid_file))
+
+    async def scenario():
+        pid_file = tmp_path / "async.pid"
+        with pytest.raises(subprocess.TimeoutExpired):
+            await runner.run_async(_spawn_tree(pid_file), timeout=1.5)
+        assert _gone(_wait_pid(pid_file))
+
+        pid_file = tmp_path / "cancel.pid"
+        task = asyncio.create_task(runner.run_async(_spawn_tree(pid_file)))
+        pid = await asyncio.to_thread(_wait_pid, pid_file)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert _gone(pid)
+
+        # NO MAXIMO 2 AO MESMO TEMPO: 4 PROCESSOS DE 0.4s LEVAM 2 RODADAS
+        limit, t_start = asyncio.Semaphore(2), time.time()
+        sleep = [sys.executable, "-c", "import time; time.sleep(0.4)"]
+        results = await asyncio.gather(*(runner.run_async(sleep, limit=limit) for _ in range(4)))
+        assert all(result.returncode == 0 for result in results)
+        assert 0.8 <= time.time() - t_start < 2.5
+
+    asyncio.run(scenario())
+
+
+def test_process_runner_feeds_input_and_kills_the_tool_when_it_fails():
+    logger = type("L", (), {"info": lambda *a: None, "warning": lambda *a: None})()
+    echo = [sys.executable, "-c", "import sys; sys.stdout.write(sys.stdin.read().upper())"]
+    result = ProcessRunner("echo", logger=logger).run(echo, input=(b"ab", b"cd"))
+    assert result.stdout == "ABCD"
+
+    def broken():
+        yield b"ab"
+        raise ValueError("transfer broken")
+
+    # O PROCESSO ESPERA MAIS ENTRADA: SEM MATAR A ARVORE O run FICARIA PRESO
+    runner = ProcessRunner("echo", logger=logger)
+    with pytest.raises(ValueError):
+        runner.run(echo, input=broken(), timeout=30)
+    assert not runner.summary["timed_out"] and runner.summary["returncode"] != 0
+
+
+def test_process_runner_stream_yields_stdout_and_kills_the_tree_on_timeout_or_close(tmp_path):
+    logger = type("L", (), {"info": lambda *a: None, "warning": lambda *a: None})()
+    runner = ProcessRunner("pipe", logger=logger)
+    script = "import sys; sys.stdout.buffer.write(b'x' * 10000); print('warn', file=sys.stderr)"
+    assert b"".join(runner.stream([sys.executable, "-c", script], chunk_size=4096)) == b"x" * 10000
+    assert runner.summary["returncode"] == 0
+
+    pid_file = tmp_path / "stream.pid"
+    with pytest.raises(subprocess.TimeoutExpired):
+        list(runner.stream(_spawn_tree(pid_file), timeout=1.5))
+    assert runner.summary["timed_out"] and _gone(_wait_pid(pid_file))
+
+    # CONSUMIDOR QUE PARA NO MEIO: FECHAR O GERADOR MATA A FERRAMENTA
+    pid_file = tmp_path / "closed.pid"
+    endless = f"import os, sys, time\nopen({str(pid_file)!r}, 'w').write(str(os.getpid()))\nwhile True:\n    sys.stdout.buffer.write(b'x' * 4096); sys.stdout.flush(); time.sleep(0.01)\n"
+    chunks = runner.stream([sys.executable, "-c", endless], chunk_size=4096)
+    next(chunks)
+    chunks.close()
+    assert _gone(_wait_pid(pid_file))
@@ -0,0 +1,77 @@
+import gzip
+import subprocess
+
+import pytest
+
+from modules.geofabrik import ReplicationUpdater
+from modules.osmtools.osm_convert import OSMConvert
+
+BASE_OSM = """<?xml version='1.0' encoding='UTF-8'?>
+<osm version="0.6">
+  <node id="1" version="1" lat="-16.70" lon="-49.20"/>
+  <node id="2" version="1" lat="-16.71" lon="-49.21"/>
+  <way id="10" version="1"><nd ref="1"/><nd ref="2"/><tag k="highway" v="primary"/></way>
+</osm>
+"""
+
+DIFFS = {
+    2: '<osmChange version="0.6"><modify>'
+       '<node id="1" version="2" lat="-16.70" lon="-49.20"><tag k="name" v="Praca Civica"/></node>'
+       "</modify></osmChange>",
+    3: '<osmChange version="0.6"><create>'
+       '<node id="3" version="1" lat="-16.72" lon="-49.22"/>'
+       "</create></osmChange>",
+}
+
+
+def _state(sequence):
+    return f"#generated\nsequenceNumber={sequence}\ntimestamp=2025-01-0{sequence}T20\\:21\\:02Z\n"
+
+
+@pytest.fixture
+def updater(tmp_path, http_root, http_server, osmconvert_bin):
+    folder = tmp_path / "data" / "external" / "pbf"
+    folder.mkdir(parents=True)
+    (tmp_path / "base.osm").write_text(BASE_OSM)
+    path_file = folder / "brazil-latest.osm.pbf"
+    subprocess.run([osmconvert_bin, str(tmp_path / "base.osm"), f"-o={path_file}"], check=True)
+
+    updates = http_root / "brazil-updates"
+    (updates / "000" / "000").mkdir(parents=True)
+    (updates / "state.txt").write_text(_state(3))
+    for sequence, change in DIFFS.items():
+        (updates / "000" / "000" / f"{sequence:03d}.osc.gz").write_bytes(gzip.compress(change.encode()))
+
+    converter = OSMConvert(
+        base_path_in=str(tmp_path / "data" / "external"),
+        base_path_out=str(tmp_path / "data" / "external"),
+        type_osm_in="pbf",
+        type_osm_out="pbf",
+    )
+    converter.file_bin = osmconvert_bin
+    return ReplicationUpdater(f"{http_server}/brazil-updates", str(path_file), converter=converter)
+
+
+def test_sequence_path():
+    assert ReplicationUpdater.sequence_path(4318) == "000/004/318"
+
+
+def test_update_applies_only_missing_diffs(updater, osmconvert_bin):
+    updater.record_state({"sequence": 1, "timestamp": "2025-01-01T20:21:02Z"})
+
+    assert updater.update() == "updated"
+
+    osm = subprocess.run([osmconvert_bin, updater.path_file], capture_output=True, text=True).stdout
+    assert 'node id="3"' in osm
+    assert "Praca Civica" in osm
+    assert updater.local_state()["sequence"] == 3
+    assert updater.update() == "up-to-date"
+
+
+def test_broken_chain_requires_full_download(updater, http_root):
+    assert updater.update() is None  # sem estado local
+    updater.record_state({"sequence": 1, "timestamp": ""})
+    (http_root / "brazil-updates" / "000" / "000" / "002.osc.gz").unlink()
+
+    assert updater.update() is None
+    assert updater.local_state()["sequence"] == 1
@@ -0,0 +1,55 @@
+from functools import partial
+import os
+import sqlite3
+import struct
+
+import pytest
+
+import modules.routing.router as router
+from modules.osmtools.spatialite_sql import SpatialiteSQL
+from modules.routing import Router
+
+
+def _nodes_db(path):
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE roads_nodes (node_id INTEGER PRIMARY KEY, geometry BLOB)")
+    connection.executemany(
+        "INSERT INTO roads_nodes VALUES (?, ?)",
+        ((i, struct.pack("<BBi4dBi2dB", 0, 1, 4326, x, y, x, y, 0x7C, 1, x, y, 0xFE))
+         for i, (x, y) in enumerate([(-49.27, -16.78), (-49.20, -16.80)], start=1)),
+    )
+    connection.commit()
+    connection.close()
+
+
+def test_router_validates_arguments_and_pools_nothing_when_spatialite_is_missing(tmp_path):
+    db = str(tmp_path / "streets.sqlite")
+    _nodes_db(db)
+    with pytest.raises(ValueError):
+        Router(db, algorithm="bfs")
+
+    with Router(db, extension="mod_does_not_exist") as ROUTER:
+        assert ROUTER.snap.nearest(-49.2, -16.79)[0] == 2
+        with pytest.raises(ValueError, match="metric"):
+            ROUTER.route((-49.27, -16.78), (-49.20, -16.80), metric="fuel")
+        with pytest.raises(RuntimeError):
+            ROUTER.route((-49.27, -16.78), (-49.20, -16.80), metric="dist")
+        assert ROUTER.connections == 0
+
+
+def test_router_connections_take_the_virtual_routing_settings_without_touching_the_file(tmp_path, monkeypatch, virtual_routing_db):
+    db = virtual_routing_db(str(tmp_path / "streets.sqlite"))
+    before = os.stat(db)
+    # mode=ro RECUSA O UPDATE DA TABELA VIRTUAL QUE CONFIGURA O VirtualRouting
+    with SpatialiteSQL(db, require_spatialite=False, read_only=True) as SQL:
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            SQL.query("UPDATE router_time SET Algorithm = ?", ("A*",))
+
+    monkeypatch.setattr(router, "SpatialiteSQL", partial(SpatialiteSQL, require_spatialite=False))
+    with Router(db, snap_index=False) as ROUTER:
+        SQL = ROUTER._sql()
+        assert ROUTER.connections == 1
+        assert SQL.connect().execute("PRAGMA journal_mode").fetchone() == ("delete",)
+    after = os.stat(db)
+    assert (after.st_size, after.st_mtime_ns) == (before.st_size, before.st_mtime_ns)
+    assert not os.path.exists(f"{db}-wal") and not os.path.exists(f"{db}-shm")
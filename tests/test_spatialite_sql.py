@@ -0,0 +1,115 @@
+import os
+import sqlite3
+
+import pytest
+
+from modules.osmtools.spatialite_sql import SpatialiteSQL
+
+
+def _roads_db(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        "CREATE TABLE roads (id INTEGER PRIMARY KEY, node_from INTEGER, node_to INTEGER, geometry BLOB);"
+        "CREATE TABLE roads_nodes (node_id INTEGER PRIMARY KEY, geometry BLOB);"
+        "CREATE TABLE router_time (NodeFrom INTEGER, NodeTo INTEGER, Algorithm TEXT);"
+        "INSERT INTO router_time VALUES (1, 2, 'Dijkstra');"
+    )
+    connection.close()
+
+
+def test_repository_scripts_run_in_process_without_spatialite(tmp_path):
+    db = str(tmp_path / "streets.sqlite")
+    _roads_db(db)
+    with SpatialiteSQL(db, require_spatialite=False) as SQL:
+        SQL.script("index/index.sql")
+        SQL.script("router/update_router_astar.sql")
+        assert SQL.query("SELECT Algorithm FROM router_time") == [("A*",)]
+        assert SQL.connect().execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        indexes = {row[0] for row in SQL.query("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_roads_node_from", "idx_roads_nodes_node_id"} <= indexes
+        # GEOMETRIAS FICAM PARA AS R*TREES (MESMO NOME idx_<tabela>_<coluna> DO SPATIALITE)
+        assert not {"idx_roads_geometry", "idx_roads_nodes_geometry"} & indexes
+
+        # O SCRIPT INTEIRO E UMA TRANSACAO: O SEGUNDO INDICE JA EXISTE E NADA E APLICADO
+        script = tmp_path / "partial.sql"
+        script.write_text("UPDATE router_time SET Algorithm = 'x';\nCREATE INDEX idx_roads_node_to ON roads(node_to);")
+        with pytest.raises(sqlite3.OperationalError):
+            SQL.script(str(script))
+        assert SQL.query("SELECT Algorithm FROM router_time") == [("A*",)]
+
+        count = SQL.executemany("INSERT INTO roads_nodes (node_id) VALUES (?)", ((i,) for i in range(1, 1001)), batch=300)
+        assert count == 1000
+        assert SQL.query("SELECT count(*) FROM roads_nodes WHERE node_id > ?", (500,)) == [(500,)]
+        assert [report["script"] for report in SQL.report] == ["index/index.sql", "router/update_router_astar.sql"]
+
+
+def test_read_only_connection_leaves_the_published_database_untouched(tmp_path):
+    db = str(tmp_path / "streets.sqlite")
+    _roads_db(db)
+    before = os.stat(db)
+    with SpatialiteSQL(db, require_spatialite=False, read_only=True) as SQL:
+        assert SQL.query("SELECT count(*) FROM roads_nodes")[0][0] >= 0
+        assert SQL.connect().execute("PRAGMA journal_mode").fetchone() == ("delete",)
+        with pytest.raises(sqlite3.OperationalError):
+            SQL.query("INSERT INTO roads_nodes (node_id) VALUES (1)")
+    after = os.stat(db)
+    assert (after.st_size, after.st_mtime_ns) == (before.st_size, before.st_mtime_ns)
+    assert not os.path.exists(f"{db}-wal") and not os.path.exists(f"{db}-shm")
+    with pytest.raises(sqlite3.OperationalError):
+        SpatialiteSQL(str(tmp_path / "missing.sqlite"), require_spatialite=False, read_only=True).connect()
+
+
+def test_statements_split_keeps_semicolons_in_strings_and_drops_comments():
+    sql = "-- comentario\nSELECT 'a;b';\n\nUPDATE t SET x = 1;\n-- fim\nSELECT 1"
+    assert SpatialiteSQL.statements(sql) == ["-- comentario\nSELECT 'a;b';", "UPDATE t SET x = 1;", "-- fim\nSELECT 1"]
+
+
+def test_spatialite_required_but_missing_raises(tmp_path):
+    SQL = SpatialiteSQL(str(tmp_path / "x.sqlite"), extension="mod_does_not_exist")
+    with pytest.raises(RuntimeError):
+        SQL.connect()
+
+
+def test_publish_replaces_database_only_after_verification(tmp_path):
+    from modules.osmtools.spatialite import building_path, publish_database
+
+    live = str(tmp_path / "streets.sqlite")
+    _roads_db(live)
+    build = building_path(live)
+    connection = sqlite3.connect(build)
+    connection.execute("CREATE TABLE roads (id INTEGER PRIMARY KEY)")
+    connection.commit()
+
+    # TABELA VAZIA OU FALTANDO: O BANCO PUBLICADO CONTINUA O ANTERIOR
+    with pytest.raises(RuntimeError, match="Empty tables"):
+        publish_database(build, live, non_empty=["roads"])
+    with pytest.raises(RuntimeError, match="Missing tables"):
+        publish_database(build, live, tables=["table_router_time"])
+    assert "router_time" in {row[0] for row in sqlite3.connect(live).execute("SELECT name FROM sqlite_master")}
+
+    connection.execute("INSERT INTO roads VALUES (1)")
+    connection.execute("CREATE TABLE table_router_time (id INTEGER)")
+    connection.commit()
+    connection.close()
+    assert publish_database(build, live, tables=["table_router_time"], non_empty=["roads"]) == live
+    assert not (tmp_path / "streets.sqlite.building").exists()
+    assert sqlite3.connect(live).execute("SELECT count(*) FROM roads").fetchone() == (1,)
+
+
+def test_spatial_index_needs_spatialite_and_snapping_queries_use_rtree(tmp_path):
+    from modules.osmtools.spatial_index import SpatialIndexManager
+
+    db = str(tmp_path / "streets.sqlite")
+    _roads_db(db)
+    with pytest.raises(ValueError):
+        SpatialIndexManager(SpatialiteSQL(db, require_spatialite=False), box=2.0, max_box=1.0)
+    with SpatialiteSQL(db, require_spatialite=False) as SQL:
+        if not SQL.spatial:
+            with pytest.raises(RuntimeError, match="mod_spatialite"):
+                SpatialIndexManager(SQL).ensure()
+
+    for name in ("router/router_time.sql", "router/router_dist.sql", "Isochrone/Isochrone_time.sql"):
+        with open(f"repository/querys/{name}", encoding="utf-8") as file:
+            sql = file.read()
+        assert len(SpatialiteSQL.statements(sql)) == 1
+        assert "FROM SpatialIndex" in sql and "X(geometry) >=" not in sql